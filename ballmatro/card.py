@@ -1,6 +1,7 @@
 """Class that represents a card, and associated functions"""
-from dataclasses import dataclass
-from typing import List
+from dataclasses import FrozenInstanceError
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import re
 
 SUITS = ["♣", "♦", "♠", "♥"]
@@ -11,62 +12,81 @@ MODIFIERS = [
 ]
 JOKER = "🂿"
 
-@dataclass(frozen=True)
+CHIPS_PER_RANK = {"2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7, "8": 8, "9": 9, "10": 10, "J": 10, "Q": 10, "K": 10, "A": 11}
+MODIFIER_CHIPS = {"+": 30}  # Extra chips awarded by each modifier
+MODIFIER_MULTIPLIER = {"x": 4}  # Extra multiplier awarded by each modifier
+
+# Patterns used to validate card texts
+_RANK_PATTERN = re.compile(r"([2-9]|10|J|Q|K|A)")
+_CARD_PATTERN = re.compile(r"^(10|[2-9]|J|Q|K|A)[♣♦♠♥]([+x])?$")
+_JOKER_PATTERN = re.compile(r"^🂿[^:$]+(:[^:]+)?$")
+
 class Card:
-    """Class that represents a card"""
+    """Class that represents a card.
+
+    Cards are immutable, and the cards in CARDS and those of the known jokers are interned: building a Card from their
+    text always returns the same instance. Other cards, such as jokers in texts given by models, are built anew each
+    time, so that they do not accumulate in memory. All the properties of the card are computed when the card is built,
+    and stored in slots.
+
+    Non-joker cards also have an integer id in [0, 156) that identifies their rank, suit and modifier, in the form
+        id = suit_index + len(SUITS) * rank_index + len(SUITS) * len(RANKS) * modifier_index
+    where the modifier index is 0 for no modifier and 1 + the position in MODIFIERS otherwise. Joker cards have id None.
+    """
+    __slots__ = ("txt", "id", "suit", "rank", "rank_numeric", "modifier", "is_joker", "chips", "multiplier")
     txt: str  # Text representation of the card
+    id: int  # Integer id of the card, or None for jokers
+    suit: str  # Suit of the card, or None if the card has no suit
+    rank: str  # Rank of the card, or None if the card has no rank
+    rank_numeric: int  # Numeric value of the rank of the card, or None if the card has no rank
+    modifier: str  # Modifier of the card, or None if the card has no modifier
+    is_joker: bool  # True if the card is a joker, False otherwise
+    chips: int  # Chips added by the card when scored, including modifiers but before applying jokers
+    multiplier: int  # Multiplier added by the card when scored, including modifiers but before applying jokers
 
-    def __post_init__(self):
-        """Validate the card text representation"""
-        if not isinstance(self.txt, str) or len(self.txt) == 0:
+    def __new__(cls, txt: str):
+        """Return the interned card for the given text, or build and validate a new card if it is not interned"""
+        try:
+            return _INTERNED_CARDS[txt]
+        except (KeyError, TypeError):
+            pass
+        card = object.__new__(cls)
+        card._build(txt)
+        return card
+
+    def _build(self, txt: str):
+        """Validate the card text representation and compute the card properties"""
+        if not isinstance(txt, str) or len(txt) == 0:
             raise ValueError("Card text must be a non-empty string")
-        if self.suit is None and not self.is_joker:
+        is_joker = txt[0] == JOKER
+        suit = next((suit for suit in SUITS if suit in txt), None)
+        match = _RANK_PATTERN.match(txt)
+        rank = match.group(0) if match is not None else None
+        if suit is None and not is_joker:
             raise ValueError("Card must contain a suit or be a joker")
-        if self.rank is None and not self.is_joker:
+        if rank is None and not is_joker:
             raise ValueError("Card must contain a rank or be a joker")
         # For non-joker cards, check correct format with a regex
-        if not self.is_joker:
-            if not re.match(r"^(10|[2-9]|J|Q|K|A)[♣♦♠♥]([+x])?$", self.txt):
-                raise ValueError(f"Invalid card format: {self.txt}")
+        if not is_joker:
+            if not _CARD_PATTERN.match(txt):
+                raise ValueError(f"Invalid card format: {txt}")
         else:
             # For joker cards, check the format
-            if not re.match(r"^🂿[^:$]+(:[^:]+)?$", self.txt):
-                raise ValueError(f"Invalid joker format: {self.txt}")
+            if not _JOKER_PATTERN.match(txt):
+                raise ValueError(f"Invalid joker format: {txt}")
+        modifier = next((modifier for modifier in MODIFIERS if modifier in txt[-1]), None)
 
-    @property
-    def suit(self) -> str:
-        """Return the suit of the card, or None if the card has no suit"""
-        for suit in SUITS:
-            if suit in self.txt:
-                return suit
-        return None
+        setattr_ = object.__setattr__
+        setattr_(self, "txt", txt)
+        setattr_(self, "suit", suit)
+        setattr_(self, "rank", rank)
+        setattr_(self, "rank_numeric", RANKS.index(rank) if rank is not None else None)
+        setattr_(self, "modifier", modifier)
+        setattr_(self, "is_joker", is_joker)
+        setattr_(self, "chips", CHIPS_PER_RANK.get(rank, 0) + MODIFIER_CHIPS.get(modifier, 0))
+        setattr_(self, "multiplier", MODIFIER_MULTIPLIER.get(modifier, 0))
+        setattr_(self, "id", None if is_joker else _card_id(rank, suit, modifier))
 
-    @property
-    def rank(self) -> str:
-        """Return the rank of the card, or None if the card has no rank"""
-        match = re.match(r"([2-9]|10|J|Q|K|A)", self.txt)
-        if match is not None:
-            return match.group(0)
-        return None
-    
-    @property
-    def rank_numeric(self) -> int:
-        """Return the numeric value of the rank of the card, or None if the card has no rank"""
-        return RANKS.index(self.rank) if self.rank is not None else None
-
-    @property
-    def modifier(self) -> str:
-        """Return the modifier of the card, or None if the card has no modifier"""
-        for modifier in MODIFIERS:
-            if modifier in self.txt[-1]:
-                return modifier
-        return None
-    
-    @property
-    def is_joker(self) -> bool:
-        """Return True if the card is a joker, False otherwise"""
-        return self.txt[0] == JOKER
-    
     @property
     def joker_name(self) -> str:
         """Return the name of the joker card, or None if the card is not a joker"""
@@ -81,6 +101,16 @@ class Card:
             return self.txt[1:].split(":")[1].strip()
         return None
 
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __reduce__(self):
+        """Pickle cards by their text, so that unpickled interned cards are interned too"""
+        return (Card, (self.txt,))
+
     def __repr__(self) -> str:
         """Return a string representation of the card"""
         return self.txt
@@ -88,27 +118,99 @@ class Card:
     def __eq__(self, value):
         if not isinstance(value, Card):
             return NotImplemented
-        return self.txt == value.txt
+        return self is value or self.txt == value.txt
+
+    def __hash__(self):
+        return hash(self.txt)
 
     def __lt__(self, value):
         if not isinstance(value, Card):
             return NotImplemented
         return self.txt < value.txt
 
+def _card_id(rank: str, suit: str, modifier: str) -> int:
+    """Return the integer id of a non-joker card from its rank, suit and modifier"""
+    modifier_index = 0 if modifier is None else 1 + MODIFIERS.index(modifier)
+    return SUITS.index(suit) + len(SUITS) * RANKS.index(rank) + len(SUITS) * len(RANKS) * modifier_index
+
+# Table of interned cards, indexed by their text
+_INTERNED_CARDS: Dict[str, Card] = {}
+
+def intern_card(txt: str) -> Card:
+    """Return the card for the given text, interning it so that building a Card from that text returns the same instance.
+
+    Only a bounded set of cards should be interned, the non-joker cards and the cards of the known jokers.
+    """
+    card = Card(txt)
+    return _INTERNED_CARDS.setdefault(card.txt, card)
+
+# All non-joker cards, indexed by their id
+CARDS = tuple(
+    intern_card(f"{rank}{suit}{modifier}")
+    for modifier in [""] + MODIFIERS for rank in RANKS for suit in SUITS
+)
+
+class CardParseError(ValueError):
+    """Error in a list of cards in text form, with the reason and the position in the text where it was found.
+
+    Args:
+        reason (str): Description of the error.
+        txt (str): Text of the list of cards.
+        position (int): Index of the character in txt where the error was found.
+        index (int): Index in the list of the card that is not valid, or None if the list itself is not valid.
+    """
+
+    def __init__(self, reason: str, txt: str, position: int, index: Optional[int] = None):
+        super().__init__(f"{reason} (at position {position})")
+        self.reason = reason
+        self.txt = txt
+        self.position = position
+        self.index = index
+
 def parse_card_list(txt: str) -> List[Card]:
     """Transforms a list of cards in text form into a list of Card objects.
 
     Example input: "[♣2, ♠3, ♥4]"
     Example output: [Card("♣2"), Card("♠3"), Card("♥4")]
 
-    Raises a ValueError if the input is not a valid card list format, or if any card is invalid.
+    Raises a CardParseError, which is a ValueError, if the input is not a valid card list format, or if any card is
+    invalid. The list is parsed in a single pass, looking up each card text in the table of interned cards and only
+    building and validating cards that are not there yet.
     """
     # Remove opening and closing brackets
-    if not (txt.startswith("[") and txt.endswith("]")):
-        raise ValueError("Input must start with '[' and end with ']'")
-    txt = txt[1:-1]
+    if not txt.startswith("["):
+        raise CardParseError("Input must start with '[' and end with ']'", txt, 0)
+    if not txt.endswith("]"):
+        raise CardParseError("Input must start with '[' and end with ']'", txt, max(0, len(txt) - 1))
     # No cards border case
-    if len(txt) == 0:
+    if len(txt) == 2:
         return []
-    # Split by cards
-    return [Card(cardtxt.strip()) for cardtxt in txt.split(",")]
+    cards = []
+    position = 1  # Position of the text of the current card, including the spaces around it
+    for index, cardtxt in enumerate(txt[1:-1].split(",")):
+        card = _INTERNED_CARDS.get(cardtxt)
+        if card is None:
+            stripped = cardtxt.strip()
+            card = _INTERNED_CARDS.get(stripped)
+            if card is None:
+                try:
+                    card = Card(stripped)
+                except ValueError as e:
+                    start = position + len(cardtxt) - len(cardtxt.lstrip())
+                    raise CardParseError(str(e), txt, start, index) from None
+        cards.append(card)
+        position += len(cardtxt) + 1
+    return cards
+
+def parse_input_cards(txt: str) -> List[Card]:
+    """Transforms the input cards of a dataset row in text form into a list of Card objects, as parse_card_list.
+
+    Parsed inputs are cached, since the same inputs are parsed again for every model evaluated over a dataset. Plays
+    from models are seldom repeated, so they should be parsed with parse_card_list to keep them out of the cache.
+    """
+    return list(_parse_input_tuple(txt))
+
+@lru_cache(maxsize=2 ** 16)
+def _parse_input_tuple(txt: str) -> Tuple[Card, ...]:
+    """Cached parsing of input cards, as a tuple so that callers cannot modify the cached value"""
+    return tuple(parse_card_list(txt))
@@ -1,28 +1,91 @@
 """Functions to generate datasets for LLM training with ballmatro hands"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import random
 from datasets import Dataset
-from itertools import combinations_with_replacement
-from typing import List, Tuple, Generator, Dict, Any
+import pyarrow as pa
+import pyarrow.parquet as pq
+from itertools import combinations_with_replacement, islice, permutations
+from typing import Iterable, List, Tuple, Generator, Dict, Any, Union
 
 from ballmatro.card import Card, SUITS, RANKS, MODIFIERS
 from ballmatro.jokers.factory import JOKERS
-from ballmatro.optimizer import brute_force_optimize
+from ballmatro.optimizer import OPTIMIZERS, PlayDistribution, play_distribution
+from ballmatro.optimizer_cache import OptimizerCache
 from ballmatro.score import Score
 
-def exhaustive_generator(max_hand_size: int) -> Generator[Tuple[List[Card], Score], None, None]:
+def exhaustive_generator(max_hand_size: int, suit_representatives: bool = False) -> Generator[Tuple[List[Card], Score], None, None]:
     """Generator functions for a dataset with all possible hands of a given size
     and their optimal plays using brute force optimization.
     Args:
         max_hand_size (int): The size of the hands to generate.
+        suit_representatives (bool): If True, only the first hand of each orbit of hands related by a permutation of the
+            suits is generated. Scoring without suit dependent jokers is invariant to such permutations, so the optimal
+            plays of the rest of hands can be recovered with expand_suit_orbits.
     Returns:
         List[Tuple[List[Card], Score]]: A list of tuples, each containing a hand and its optimal play in the form of a Score object.
     """
-    # Generate all possible cards
-    cards = [Card(f"{rank}{suit}{modifier}") for suit in SUITS for rank in RANKS for modifier in [""] + MODIFIERS]
-    
     # Generate all combinations of the given size
-    for input in combinations_with_replacement(cards, max_hand_size):
-        yield list(input)
+    for input in combinations_with_replacement(range(len(EXHAUSTIVE_CARDS)), max_hand_size):
+        if suit_representatives and any(_relabel_suits(input, table) < input for table in _SUIT_PERMUTATION_TABLES):
+            continue
+        yield [EXHAUSTIVE_CARDS[i] for i in input]
+
+def suit_orbit(cards: List[Card]) -> List[List[Card]]:
+    """Returns all the distinct hands obtained by permuting the suits of the given hand, including the hand itself.
+
+    Jokers are kept first and in the same order, and the rest of cards are sorted in the order used by exhaustive_generator.
+    """
+    jokers = [card for card in cards if card.is_joker]
+    positions = [_EXHAUSTIVE_POSITIONS[card.id] for card in cards if not card.is_joker]
+    orbit = sorted(set(_relabel_suits(positions, table) for table in _SUIT_PERMUTATION_TABLES))
+    return [jokers + [EXHAUSTIVE_CARDS[i] for i in member] for member in orbit]
+
+def suit_orbit_size(cards: List[Card]) -> int:
+    """Number of distinct hands obtained by permuting the suits of the given hand.
+
+    Can be used as the weight of a suit representative, to account for all the hands it stands for.
+    """
+    return len(suit_orbit(cards))
+
+def expand_suit_orbits(generator: Generator[Tuple[List[Card], Score], None, None]) -> Generator[Tuple[List[Card], Score], None, None]:
+    """Wraps a generator of hands and their optimal plays to yield all the hands in their suit orbits, see suit_orbit.
+
+    The optimal play of each hand in the orbit is obtained by permuting the suits of the optimal play of the given hand,
+    which is only correct if the jokers in the hands do not depend on the suits (see is_suit_symmetric). When several plays
+    attain the optimal score, the play chosen for a hand might differ from the one an optimizer would choose for it.
+
+    If the generator also yields the PlayDistribution of each hand (see add_optimal_plays), the suits of its top plays are
+    permuted in the same way, so the first top play is still the optimal play. The histogram of scores is left unchanged.
+    """
+    for cards, score, *distribution in generator:
+        jokers = [card for card in cards if card.is_joker]
+        positions = [_EXHAUSTIVE_POSITIONS[card.id] for card in cards if not card.is_joker]
+        seen = set()
+        for table in _SUIT_PERMUTATION_TABLES:
+            member = _relabel_suits(positions, table)
+            if member in seen:
+                continue
+            seen.add(member)
+            hand = jokers + [EXHAUSTIVE_CARDS[i] for i in member]
+            if not distribution:
+                yield hand, _relabel_play(hand, score, table)
+                continue
+            top = [_relabel_play(hand, play, table) for play in distribution[0].top]
+            yield hand, top[0], PlayDistribution(top=top, histogram=distribution[0].histogram)
+
+def _relabel_play(hand: List[Card], score: Score, table: List[int]) -> Score:
+    """Scores over the given hand the play of a Score after permuting its suits"""
+    played = [_EXHAUSTIVE_POSITIONS[card.id] for card in score.played]
+    return Score(hand, [EXHAUSTIVE_CARDS[i] for i in _relabel_suits(played, table)])
+
+def is_suit_symmetric(max_joker_id: int) -> bool:
+    """Whether scoring is invariant to permutations of the suits when using jokers with ID up to max_joker_id (included)"""
+    return not any(joker.suit_dependent for joker in JOKERS[:max_joker_id + 1])
+
+def _relabel_suits(positions: Iterable[int], table: List[int]) -> Tuple[int, ...]:
+    """Permutes the suits of a hand given by its positions in EXHAUSTIVE_CARDS, and returns the sorted new positions"""
+    return tuple(sorted(table[i] for i in positions))
 
 def random_generator(max_hand_size: int, n: int, modifiers: List[str] = None, seed: int = 42) -> Generator[Tuple[List[Card], Score], None, None]:
     """Generator function for a dataset with random hands and their optimal plays.
@@ -63,50 +126,233 @@ def add_jokers(generator: Generator[List[Card], None, None], min_n_jokers: int,
         jokers = _random_jokers(min_n_jokers, max_n_jokers, max_joker_id)
         yield jokers + hand
 
-def add_optimal_plays(generator: Generator[List[Card], None, None]) -> Generator[Tuple[List[Card], Score], None, None]:
-    """Wraps a generator of hands to add optimal plays using brute force optimization."""
-    for hand in generator:
-        yield hand, brute_force_optimize(hand)
+def add_optimal_plays(generator: Generator[List[Card], None, None], optimizer: str = "brute-force", workers: int = 1, shard_size: int = 64, cache: OptimizerCache = None, top_k: int = 0) -> Generator[Tuple[List[Card], Score], None, None]:
+    """Wraps a generator of hands to add optimal plays.
+
+    Args:
+        generator (Generator[List[Card], None, None]): A generator that yields hands.
+        optimizer (str): Name of the optimizer to use, must be one of the keys in ballmatro.optimizer.OPTIMIZERS.
+        workers (int): Number of processes used to find the optimal plays. If 1, all work is done in the current process.
+        shard_size (int): Number of consecutive hands sent to a worker process at once. Ignored if workers is 1.
+        cache (OptimizerCache): Cache of optimal plays. Hands found in the cache are not optimized again, and the optimal
+            plays of the rest of hands are added to it. If None, every hand is optimized. With the cross-check optimizer,
+            hands are not looked up in the cache, so that every hand is checked.
+        top_k (int): If positive, the k best plays and the histogram of scores of each hand are computed with
+            play_distribution, and yielded as a third element of each tuple, which the dataset writers store as extra
+            columns when given DISTRIBUTION_SCHEMA. The optimal play is then the best play of the distribution, so the
+            optimizer is not used and the cache is only written, since every play of each hand is scored anyway.
+
+    When using several workers, hands are still drawn from the generator in the current process, and only the optimization
+    of each shard of hands runs in the workers. Results are yielded in the same order as the generator, so the output is
+    the same for any number of workers, including the random choices made while generating the hands.
+    """
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer: {optimizer}. Available optimizers: {list(OPTIMIZERS.keys())}")
+    if top_k < 0:
+        raise ValueError(f"Invalid number of top plays: {top_k}")
+
+    def lookup(hand: List[Card]) -> Score:
+        """Optimal play of a hand stored in the cache, or None if it must be computed"""
+        return cache.lookup(hand) if cache is not None and top_k == 0 and optimizer != "cross-check" else None
+
+    def result(hand: List[Card], optimized: Any) -> tuple:
+        """Stores a computed optimal play in the cache, and returns the tuple to yield"""
+        score = optimized[0] if top_k > 0 else optimized
+        if cache is not None:
+            cache.store(hand, score)
+        return (hand,) + (optimized if top_k > 0 else (score,))
+
+    if workers <= 1:
+        for hand in generator:
+            score = lookup(hand)
+            yield (hand, score) if score is not None else result(hand, _optimize_shard(optimizer, [hand], top_k)[0])
+        return
+
+    shards = _shards(generator, shard_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(shard: List[List[Card]]):
+            """Looks up the shard hands in the cache, and sends the rest to the workers"""
+            cached = [lookup(hand) for hand in shard]
+            misses = [hand for hand, score in zip(shard, cached) if score is None]
+            return shard, cached, executor.submit(_optimize_shard, optimizer, misses, top_k)
+
+        # Keep a bounded number of shards in flight, so that memory does not depend on the generator length
+        pending = deque(submit(shard) for shard in islice(shards, 2 * workers))
+        while pending:
+            shard, cached, future = pending.popleft()
+            for next_shard in islice(shards, 1):
+                pending.append(submit(next_shard))
+            optimized = iter(future.result())
+            for hand, score in zip(shard, cached):
+                yield (hand, score) if score is not None else result(hand, next(optimized))
+
+def _shards(generator: Iterable[Any], shard_size: int) -> Generator[List[Any], None, None]:
+    """Splits a generator into lists of at most shard_size consecutive elements"""
+    iterator = iter(generator)
+    while True:
+        shard = list(islice(iterator, shard_size))
+        if len(shard) == 0:
+            return
+        yield shard
+
+def _optimize_shard(optimizer: str, hands: List[List[Card]], top_k: int = 0) -> List[Union[Score, Tuple[Score, PlayDistribution]]]:
+    """Finds the optimal plays of a list of hands, or if top_k is positive their best play and PlayDistribution.
+
+    Runs in the worker processes of add_optimal_plays.
+    """
+    if top_k > 0:
+        return [(distribution.best, distribution) for distribution in (play_distribution(hand, top_k) for hand in hands)]
+    optimize = OPTIMIZERS[optimizer]
+    return [optimize(hand) for hand in hands]
+
+# All the cards, in the order used by exhaustive_generator
+EXHAUSTIVE_CARDS = [Card(f"{rank}{suit}{modifier}") for suit in SUITS for rank in RANKS for modifier in [""] + MODIFIERS]
+# Position of each card in EXHAUSTIVE_CARDS, indexed by card id
+_EXHAUSTIVE_POSITIONS = {card.id: i for i, card in enumerate(EXHAUSTIVE_CARDS)}
+# For each permutation of the suits, the position in EXHAUSTIVE_CARDS of each card after permuting its suit
+_SUIT_PERMUTATION_TABLES = [
+    [_EXHAUSTIVE_POSITIONS[card.id - card.id % len(SUITS) + permutation[card.id % len(SUITS)]] for card in EXHAUSTIVE_CARDS]
+    for permutation in permutations(range(len(SUITS)))
+]
 
 GENERATION_ALGORITHMS = {
     "exhaustive": exhaustive_generator,
     "random": random_generator,
 }
 
-def generator_to_dict(generator: Generator[Tuple[List[Card], Score], None, None]) -> Dict[str, List[Any]]:
+DATASET_SCHEMA = pa.schema([
+    ("input", pa.string()),
+    ("output", pa.string()),
+    ("score", pa.int64()),
+    ("hand", pa.string()),
+    ("chips", pa.int64()),
+    ("multiplier", pa.int64()),
+    ("remaining", pa.string()),
+])
+
+# Schema of datasets with the extra columns added by add_optimal_plays when given top_k
+DISTRIBUTION_SCHEMA = pa.schema(list(DATASET_SCHEMA) + [
+    ("top_outputs", pa.list_(pa.string())),  # Best plays, from best to worst
+    ("top_scores", pa.list_(pa.int64())),  # Scores of the best plays
+    ("histogram_scores", pa.list_(pa.int64())),  # Distinct scores attained by the possible plays, sorted
+    ("histogram_counts", pa.list_(pa.int64())),  # Number of plays attaining each of the scores above
+])
+
+def generator_to_dict(generator: Generator[Tuple[List[Card], Score], None, None], schema: pa.Schema = DATASET_SCHEMA) -> Dict[str, List[Any]]:
     """Convert a generator of tuples to a generator of dictionaries.
 
     Args:
         generator (Generator[Tuple[List[Card], Score]]): A generator that yields tuples of input cards and their corresponding Score.
+        schema (pa.Schema): Columns of the dataset. Use DISTRIBUTION_SCHEMA for generators of add_optimal_plays with top_k.
 
     Returns:
         Dict[str, List[Any]]: A dictionary where each key corresponds to a field in the Score object.
     """
-    # Get all the data into memory
-    data = list(generator)
-    # Create a dictionary with the data
-    dict_data = {
-        "input": [str(cards) for cards, _ in data],
-        "output": [str(score.played) for _, score in data],
-        "score": [score.score for _, score in data],
-        "hand": [score.hand.name for _, score in data],
-        "chips": [score.chips for _, score in data],
-        "multiplier": [score.multiplier for _, score in data],
-        "remaining": [str(score.remaining) for _, score in data],
-    }
+    dict_data = {field: [] for field in schema.names}
+    for item in generator:
+        row = _to_row(*item)
+        for field in schema.names:
+            dict_data[field].append(row[field])
     return dict_data
 
-def to_hf_dataset(generator: Generator[Tuple[List[Card], Score], None, None]) -> Dataset:
+def _to_row(cards: List[Card], score: Score, distribution: PlayDistribution = None) -> Dict[str, Any]:
+    """Convert an input and its optimal play, and optionally the distribution of its plays, into a row of the dataset"""
+    row = {
+        "input": str(cards),
+        "output": str(score.played),
+        "score": score.score,
+        "hand": score.hand.name,
+        "chips": score.chips,
+        "multiplier": score.multiplier,
+        "remaining": str(score.remaining),
+    }
+    if distribution is not None:
+        row["top_outputs"] = [str(top.played) for top in distribution.top]
+        row["top_scores"] = [top.score for top in distribution.top]
+        row["histogram_scores"] = list(distribution.histogram)
+        row["histogram_counts"] = list(distribution.histogram.values())
+    return row
+
+def generator_to_parquet(generator: Generator[Tuple[List[Card], Score], None, None], path: str, batch_size: int = 10000, schema: pa.Schema = DATASET_SCHEMA) -> int:
+    """Write a dataset generator to a Parquet file, without loading the whole dataset into memory.
+
+    Rows are written as row groups of at most batch_size rows, as they are produced by the generator.
+
+    Args:
+        generator (Generator[Tuple[List[Card], Score]]): A generator that yields tuples of input cards and their corresponding Score.
+        path (str): Path of the Parquet file to write.
+        batch_size (int): Maximum number of rows kept in memory before writing them to the file.
+        schema (pa.Schema): Columns of the dataset. Use DISTRIBUTION_SCHEMA for generators of add_optimal_plays with top_k.
+
+    Returns:
+        int: Number of rows written.
+    """
+    nrows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in _shards(generator, batch_size):
+            writer.write_table(pa.Table.from_pylist([_to_row(*item) for item in batch], schema=schema))
+            nrows += len(batch)
+    return nrows
+
+def generator_to_parquet_split(generator: Generator[Tuple[List[Card], Score], None, None], paths: List[str], fractions: List[float], seed: int = 42, batch_size: int = 10000, schema: pa.Schema = DATASET_SCHEMA) -> List[int]:
+    """Write a dataset generator to several Parquet files, randomly splitting the rows among them, without loading the whole dataset into memory.
+
+    Rows are read from the generator in batches of batch_size rows. Each batch is shuffled, and split among the files so that
+    the number of rows written to each file stays as close as possible to the requested fraction of all the rows read so far.
+
+    Args:
+        generator (Generator[Tuple[List[Card], Score]]): A generator that yields tuples of input cards and their corresponding Score.
+        paths (List[str]): Paths of the Parquet files to write, one per split.
+        fractions (List[float]): Fraction of the rows to write to each file. Must add up to 1.
+        seed (int): Random seed used for shuffling the rows.
+        batch_size (int): Maximum number of rows kept in memory before writing them to the files.
+        schema (pa.Schema): Columns of the dataset. Use DISTRIBUTION_SCHEMA for generators of add_optimal_plays with top_k.
+
+    Returns:
+        List[int]: Number of rows written to each file.
+
+    Example: generator_to_parquet_split(generator, ["train.parquet", "test.parquet"], [0.5, 0.5]) splits the dataset evenly
+    into a train and a test file.
+    """
+    if len(paths) != len(fractions):
+        raise ValueError("There must be one fraction for each output path")
+    if any(fraction < 0 for fraction in fractions) or abs(sum(fractions) - 1) > 1e-9:
+        raise ValueError(f"Split fractions must be non-negative and add up to 1, got {fractions}")
+    rng = random.Random(seed)
+    counts = [0] * len(paths)
+    writers = [pq.ParquetWriter(path, schema) for path in paths]
+    try:
+        for batch in _shards(generator, batch_size):
+            rows = [_to_row(*item) for item in batch]
+            rng.shuffle(rows)
+            # Number of rows each split should have after this batch
+            total = sum(counts) + len(rows)
+            targets = [round(total * fraction) for fraction in fractions[:-1]]
+            targets.append(total - sum(targets))
+            start = 0
+            for i, writer in enumerate(writers):
+                nrows = max(0, min(targets[i] - counts[i], len(rows) - start))
+                if nrows > 0:
+                    writer.write_table(pa.Table.from_pylist(rows[start:start + nrows], schema=schema))
+                start += nrows
+                counts[i] += nrows
+    finally:
+        for writer in writers:
+            writer.close()
+    return counts
+
+def to_hf_dataset(generator: Generator[Tuple[List[Card], Score], None, None], schema: pa.Schema = DATASET_SCHEMA) -> Dataset:
     """Convert a dataset generator to a Hugging Face dataset format.
     
     Args:
         generator (Generator[Tuple[List[Card], Score]]): A generator that yields tuples of input cards and their corresponding Score.
+        schema (pa.Schema): Columns of the dataset. Use DISTRIBUTION_SCHEMA for generators of add_optimal_plays with top_k.
     
     Returns:
         Dataset: A Hugging Face dataset containing the generated data.
     """
     # Create a Hugging Face dataset from the generator
-    return Dataset.from_dict(generator_to_dict(generator))
+    return Dataset.from_dict(generator_to_dict(generator, schema))
 
 def int2cards(i: int, modifiers: List[str] = None) -> List[Card]:
     """Map from the space of integers to the space of all possible lists of cards.
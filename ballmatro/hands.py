@@ -1,9 +1,11 @@
 """baLLMatro possible hands and functions to identify them"""
 from collections import Counter
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from itertools import combinations_with_replacement
+from typing import Dict, List, NamedTuple, Type
 
-from ballmatro.card import Card
+from ballmatro.card import Card, RANKS, SUITS
 from abc import ABC
 
 class PokerHand(ABC):
@@ -16,6 +18,17 @@ class PokerHand(ABC):
     @classmethod
     def check_ncards(cls, hand: List[Card]) -> bool:
         return len(hand) == cls.ncards
+
+    def value(self) -> "HandValue":
+        """Return the immutable value of this hand"""
+        return HandValue(type(self), self.chips, self.multiplier)
+
+    def with_value(self, chips: int, multiplier: int) -> "PokerHand":
+        """Return a new hand of the same type with the given chips and multiplier"""
+        hand = type(self)()
+        hand.chips = chips
+        hand.multiplier = multiplier
+        return hand
     
     @classmethod
     def check(cls, hand: List[Card]) -> bool:
@@ -27,6 +40,14 @@ class PokerHand(ABC):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for a specific hand"""
         raise NotImplementedError("This method should be overridden by subclasses")
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check whether the given cards could still be completed into this hand by adding more cards.
+
+        Used by optimizers to discard partial plays early. Must never return False for a subset of a valid hand.
+        """
+        return len(hand) <= cls.ncards
     
 @dataclass
 class StraightFlush(PokerHand):
@@ -40,7 +61,12 @@ class StraightFlush(PokerHand):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for a Straight Flush"""
         return Straight.check_specific(hand) and Flush.check_specific(hand)
-        
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form a Straight Flush"""
+        return Straight.check_partial(hand) and Flush.check_partial(hand)
+
 @dataclass
 class FourOfAKind(PokerHand):
     """Four of a Kind: Four cards of the same rank"""
@@ -53,7 +79,12 @@ class FourOfAKind(PokerHand):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for Four of a Kind"""
         return len(set([card.rank for card in hand])) == 1
-    
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form Four of a Kind"""
+        return len(hand) <= cls.ncards and len(set([card.rank for card in hand])) <= 1
+
 @dataclass
 class FullHouse(PokerHand):
     """Full House: Three cards of one rank and two cards of another rank"""
@@ -67,6 +98,12 @@ class FullHouse(PokerHand):
         """Check the hand for a Full House"""
         return set(Counter([card.rank for card in hand]).values()) == {3, 2}
 
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form a Full House"""
+        counts = Counter([card.rank for card in hand])
+        return len(hand) <= cls.ncards and len(counts) <= 2 and all(count <= 3 for count in counts.values())
+
 @dataclass
 class Flush(PokerHand):
     """Flush: Five cards of the same suit"""
@@ -79,7 +116,12 @@ class Flush(PokerHand):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for a Flush"""
         return len(set([card.suit for card in hand])) == 1
-    
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form a Flush"""
+        return len(hand) <= cls.ncards and len(set([card.suit for card in hand])) <= 1
+
 @dataclass
 class Straight(PokerHand):
     """Straight: Five cards in sequence"""
@@ -96,7 +138,15 @@ class Straight(PokerHand):
             if c2 - c1 != 1:
                 return False
         return True
-    
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form a Straight"""
+        ranks = [card.rank_numeric for card in hand]
+        if len(hand) > cls.ncards or len(set(ranks)) != len(ranks):
+            return False
+        return len(ranks) == 0 or max(ranks) - min(ranks) < cls.ncards
+
 @dataclass
 class ThreeOfAKind(PokerHand):
     """Three of a Kind: Three cards of the same rank"""
@@ -109,7 +159,12 @@ class ThreeOfAKind(PokerHand):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for Three of a Kind"""
         return len(set([card.rank for card in hand])) == 1
-    
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form Three of a Kind"""
+        return len(hand) <= cls.ncards and len(set([card.rank for card in hand])) <= 1
+
 @dataclass
 class TwoPair(PokerHand):
     """Two Pair: Two cards of one rank and two cards of another rank"""
@@ -123,6 +178,12 @@ class TwoPair(PokerHand):
         """Check the hand for Two Pair"""
         return set(Counter([card.rank for card in hand]).values()) == {2, 2}
 
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form Two Pair"""
+        counts = Counter([card.rank for card in hand])
+        return len(hand) <= cls.ncards and len(counts) <= 2 and all(count <= 2 for count in counts.values())
+
 @dataclass
 class Pair(PokerHand):
     """Pair: Two cards of the same rank"""
@@ -135,7 +196,12 @@ class Pair(PokerHand):
     def check_specific(cls, hand: List[Card]) -> bool:
         """Check the hand for a Pair"""
         return len(set([card.rank for card in hand])) == 1
-    
+
+    @classmethod
+    def check_partial(cls, hand: List[Card]) -> bool:
+        """Check if the cards could still form a Pair"""
+        return len(hand) <= cls.ncards and len(set([card.rank for card in hand])) <= 1
+
 @dataclass
 class HighCard(PokerHand):
     """High Card: The highest card in the hand"""
@@ -180,10 +246,85 @@ class InvalidPlay(PokerHand):
     name = "Invalid Play"
 
 POKER_HANDS = [StraightFlush, FourOfAKind, FullHouse, Flush, Straight, ThreeOfAKind, TwoPair, Pair, HighCard, EmptyHand]
+# All hand types a play can result in. The position of each hand type in this list is used as its id
+HAND_TYPES = POKER_HANDS + [NoPokerHand, InvalidPlay]
+
+class HandValue(NamedTuple):
+    """Immutable value of a played hand: its type, and its chips and multiplier after applying jokers"""
+    hand_type: Type[PokerHand]
+    chips: int
+    multiplier: int
 
-def find_hand(hand: List[Card]) -> PokerHand:
-    """Find which poker hand has been played. Returns the PokerHand object or None if no hand is found"""
+    def to_hand(self) -> PokerHand:
+        """Return the PokerHand object with this value"""
+        hand = self.hand_type()
+        if (hand.chips, hand.multiplier) != (self.chips, self.multiplier):
+            hand = hand.with_value(self.chips, self.multiplier)
+        return hand
+
+def find_hand(hand: List[Card], classifier: str = "lookup") -> PokerHand:
+    """Find which poker hand has been played. Returns the PokerHand object, or NoPokerHand if no hand is found.
+
+    The classifier argument selects the algorithm used, and must be one of the keys of HAND_CLASSIFIERS. All of them
+    produce the same results.
+    """
+    return HAND_CLASSIFIERS[classifier](hand)
+
+def find_hand_checks(hand: List[Card]) -> PokerHand:
+    """Find which poker hand has been played by running the checks of every poker hand in order of priority"""
     for poker_hand in POKER_HANDS:
         if poker_hand.check(hand):
             return poker_hand()
     return NoPokerHand()
+
+# One prime per rank, so that the product of the primes of a list of cards identifies the multiset of their ranks
+RANK_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+MAX_HAND_CARDS = max(poker_hand.ncards for poker_hand in POKER_HANDS)
+
+@lru_cache(maxsize=None)
+def _lookup_tables() -> List[Dict[int, Type[PokerHand]]]:
+    """Build the tables from rank prime products to poker hands used by find_hand_lookup.
+
+    Two tables are built: one for cards of different suits, and one for cards all of the same suit. Each table is filled by
+    classifying a representative of each multiset of ranks with find_hand_checks, so both classifiers always agree.
+    The tables are built the first time they are needed.
+    """
+    tables = [{}, {}]
+    for ncards in range(MAX_HAND_CARDS + 1):
+        for ranks in combinations_with_replacement(range(len(RANKS)), ncards):
+            product = 1
+            for rank in ranks:
+                product *= RANK_PRIMES[rank]
+            mixed_suits = [Card(RANKS[rank] + SUITS[i % len(SUITS)]) for i, rank in enumerate(ranks)]
+            same_suit = [Card(RANKS[rank] + SUITS[0]) for rank in ranks]
+            tables[0][product] = type(find_hand_checks(mixed_suits))
+            tables[1][product] = type(find_hand_checks(same_suit))
+    return tables
+
+def find_hand_lookup(hand: List[Card]) -> PokerHand:
+    """Find which poker hand has been played by looking up the multiset of ranks and whether all suits are equal in precomputed tables.
+
+    Hands containing jokers are delegated to find_hand_checks.
+    """
+    return find_hand_type(hand)()
+
+def find_hand_type(hand: List[Card]) -> Type[PokerHand]:
+    """Find the type of poker hand that has been played, without building a PokerHand object. See find_hand_lookup."""
+    if len(hand) > MAX_HAND_CARDS:
+        return NoPokerHand
+    product = 1
+    suit_mask = 0
+    for card in hand:
+        if card.is_joker:
+            return type(find_hand_checks(hand))
+        product *= RANK_PRIMES[card.rank_numeric]
+        suit_mask |= 1 << (card.id % len(SUITS))
+    # Suits only matter if all of them are the same (power of two mask)
+    mixed_suits_hands, same_suit_hands = _lookup_tables()
+    table = same_suit_hands if suit_mask & (suit_mask - 1) == 0 else mixed_suits_hands
+    return table[product]
+
+HAND_CLASSIFIERS = {
+    "lookup": find_hand_lookup,
+    "checks": find_hand_checks,
+}
@@ -1,6 +1,6 @@
 """Module to list all joker cards available, and a factory to create them from their names."""
 
-from ballmatro.card import Card
+from ballmatro.card import Card, intern_card
 from ballmatro.jokers.joker import Joker, BlankJoker
 from ballmatro.jokers.planets import Pluto, Mercury, Uranus, Venus, Saturn, Jupiter, Earth, Mars, Neptune
 from ballmatro.jokers.planets import PlutoPlus, MercuryPlus, UranusPlus, VenusPlus, SaturnPlus, JupiterPlus, MarsPlus, NeptunePlus, EarthPlus
@@ -134,6 +134,10 @@ JOKERS = [
 # Dictionary from joker names to their classes
 JOKER_CLASSES = {joker.name: joker for joker in JOKERS}
 
+# The cards of the known jokers are interned, as the non-joker cards
+for _joker in JOKERS:
+    intern_card(_joker().to_card().txt)
+
 def find_joker_name(name: str) -> Joker:
     """Factory function to find Joker class by its name and return an instance of it."""
     if name in JOKER_CLASSES:
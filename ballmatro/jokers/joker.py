@@ -1,7 +1,12 @@
 """Abstract class for joker cards"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Type
 
-from ballmatro.card import Card, JOKER
-from ballmatro.hands import PokerHand
+from ballmatro.card import CARDS, Card, JOKER
+from ballmatro.hands import HAND_TYPES, HandValue, PokerHand
+
+# Affine map (chips_factor, chips_offset, multiplier_factor, multiplier_offset) that leaves a card score unchanged
+IDENTITY_CARD_SCORE = (1, 0, 1, 0)
 
 
 class Joker:
@@ -11,6 +16,7 @@ class Joker:
     """
     name: str  # Name of the joker card
     description: str  # Description of the joker's effect
+    suit_dependent: bool = False  # Whether the joker effect depends on the suits of the cards
 
     def played_hand_callback(self, hand: PokerHand) -> PokerHand:
         """Callback that modifies the played hand when this joker is present.
@@ -40,6 +46,30 @@ class Joker:
         """
         return added_chips, added_multiplier
 
+    def compile_card_score(self) -> Optional[List[Tuple[int, int, int, int]]]:
+        """Compiles card_score_callback into a table of affine maps, indexed by card id.
+
+        Each entry (chips_factor, chips_offset, multiplier_factor, multiplier_offset) transforms the chips and multiplier
+        added by the card into added_chips * chips_factor + chips_offset and added_multiplier * multiplier_factor + multiplier_offset.
+
+        Returns None if the callback can't be expressed in this form, in which case the callback is used when scoring.
+        Jokers that do not override card_score_callback are compiled into the identity. Jokers overriding it should
+        also override this method, if possible.
+        """
+        if type(self).card_score_callback is Joker.card_score_callback:
+            return [IDENTITY_CARD_SCORE] * len(CARDS)
+        return None
+
+    def compile_played_cards(self) -> Optional[List[bool]]:
+        """Compiles played_cards_callback into a table, indexed by card id, of whether each played card is kept.
+
+        Returns None if the callback is not a filter of individual cards. Jokers that do not override played_cards_callback
+        keep every card. Jokers overriding it should also override this method, if possible.
+        """
+        if type(self).played_cards_callback is Joker.played_cards_callback:
+            return [True] * len(CARDS)
+        return None
+
     def played_cards_callback(self, played_cards: list[Card]) -> list[Card]:
         """Callback that modifies the played cards when this joker is present.
 
@@ -60,3 +90,63 @@ class BlankJoker(Joker):
     """A joker that does not have any effect at all."""
     name = "Blank"
     description = "Does nothing at all"
+
+def compiled_card_scores(jokers: List[Joker]) -> Optional[Tuple[Tuple[int, int], ...]]:
+    """Chips and multiplier added by each card after applying a list of jokers in order, indexed by card id.
+
+    Returns None if any of the jokers can't be compiled (see Joker.compile_card_score). Tables are cached per ordered list
+    of joker types, so they are built once and reused for every play scored with the same jokers.
+    """
+    return _compiled_card_scores(tuple(type(joker) for joker in jokers))
+
+@lru_cache(maxsize=1024)
+def _compiled_card_scores(joker_types: Tuple[type, ...]) -> Optional[Tuple[Tuple[int, int], ...]]:
+    """Composes the compiled card score tables of a list of joker types"""
+    scores = [(card.chips, card.multiplier) for card in CARDS]
+    for joker_type in joker_types:
+        table = joker_type().compile_card_score()
+        if table is None:
+            return None
+        scores = [
+            (chips * chips_factor + chips_offset, multiplier * multiplier_factor + multiplier_offset)
+            for (chips, multiplier), (chips_factor, chips_offset, multiplier_factor, multiplier_offset) in zip(scores, table)
+        ]
+    return tuple(scores)
+
+def compiled_hand_values(jokers: List[Joker]) -> Dict[Type[PokerHand], HandValue]:
+    """Value of each hand type after applying the played_hand_callback of a list of jokers in order.
+
+    Hand callbacks only depend on the hand they receive, so the values are computed once per ordered list of joker
+    types and cached, and scoring a play only needs a lookup instead of applying the callbacks.
+    """
+    return _compiled_hand_values(tuple(type(joker) for joker in jokers))
+
+@lru_cache(maxsize=1024)
+def _compiled_hand_values(joker_types: Tuple[type, ...]) -> Dict[Type[PokerHand], HandValue]:
+    """Applies the hand callbacks of a list of joker types to every hand type"""
+    jokers = [joker_type() for joker_type in joker_types]
+    values = {}
+    for hand_type in HAND_TYPES:
+        hand = hand_type()
+        for joker in jokers:
+            hand = joker.played_hand_callback(hand)
+        values[hand_type] = hand.value()
+    return values
+
+def compiled_played_cards(jokers: List[Joker]) -> Optional[Tuple[bool, ...]]:
+    """Whether each card is kept after applying the played_cards_callback of a list of jokers, indexed by card id.
+
+    Returns None if any of the jokers can't be compiled (see Joker.compile_played_cards).
+    """
+    return _compiled_played_cards(tuple(type(joker) for joker in jokers))
+
+@lru_cache(maxsize=1024)
+def _compiled_played_cards(joker_types: Tuple[type, ...]) -> Optional[Tuple[bool, ...]]:
+    """Composes the compiled played cards tables of a list of joker types"""
+    kept = [True] * len(CARDS)
+    for joker_type in joker_types:
+        table = joker_type().compile_played_cards()
+        if table is None:
+            return None
+        kept = [keep and joker_keeps for keep, joker_keeps in zip(kept, table)]
+    return tuple(kept)
@@ -1,7 +1,5 @@
 """Planet cards: jokers that modify the values of hands"""
 
-from copy import deepcopy
-
 from ballmatro.hands import PokerHand, HighCard, Pair, TwoPair, ThreeOfAKind, Straight, Flush, FullHouse, FourOfAKind, StraightFlush
 from ballmatro.jokers.joker import Joker
 
@@ -21,10 +19,7 @@ class PlanetCard(Joker):
     def played_hand_callback(self, hand: PokerHand) -> PokerHand:
         """Callback that modifies the played hand when this planet card is present."""
         if isinstance(hand, self.target_hand):
-            hand = deepcopy(hand)
-            hand.chips = hand.chips * self.product + self.adder
-            hand.multiplier = hand.multiplier * self.product + self.adder
-            return hand
+            return hand.with_value(hand.chips * self.product + self.adder, hand.multiplier * self.product + self.adder)
         return hand
 
 class Pluto(PlanetCard):
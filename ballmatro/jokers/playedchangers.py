@@ -1,7 +1,7 @@
 """Jokers that change the played cards"""
 
 from typing import List
-from ballmatro.card import Card
+from ballmatro.card import CARDS, Card
 from ballmatro.jokers.joker import Joker
 
 class BannedRankJoker(Joker):
@@ -11,6 +11,9 @@ class BannedRankJoker(Joker):
     def played_cards_callback(self, played_cards: list[Card]) -> list[Card]:
         return [card for card in played_cards if card.rank not in self.target_ranks]
 
+    def compile_played_cards(self) -> List[bool]:
+        return [card.rank not in self.target_ranks for card in CARDS]
+
 class BannedTwo(BannedRankJoker):
     """A joker that removes all rank 2 cards from the list of played cards"""
     name = "Banned Two"
@@ -110,10 +113,14 @@ class LandOfLetters(BannedRankJoker):
 class BannedSuitJoker(Joker):
     """Abstract Joker that removes from the played cards all those that belong to a specific suit."""
     target_suits: List[str]
+    suit_dependent = True
 
     def played_cards_callback(self, played_cards: list[Card]) -> list[Card]:
         return [card for card in played_cards if card.suit not in self.target_suits]
 
+    def compile_played_cards(self) -> List[bool]:
+        return [card.suit not in self.target_suits for card in CARDS]
+
 class BannedClub(BannedSuitJoker):
     """A joker that removes all club cards from the list of played cards"""
     name = "Banned Club"
@@ -1,8 +1,8 @@
 """Rank boosters jokers: modify the score provided by a card depending on the rank of the card played."""
 
-from typing import List
-from ballmatro.jokers.joker import Joker
-from ballmatro.card import Card
+from typing import List, Tuple
+from ballmatro.jokers.joker import IDENTITY_CARD_SCORE, Joker
+from ballmatro.card import CARDS, Card
 
 
 class DerankedJoker(Joker):
@@ -15,6 +15,9 @@ class DerankedJoker(Joker):
         else:            
             return added_chips, added_multiplier
 
+    def compile_card_score(self) -> List[Tuple[int, int, int, int]]:
+        return [(0, 1, 0, 0) if card.rank == self.target_rank else IDENTITY_CARD_SCORE for card in CARDS]
+
 class DerankedTwo(DerankedJoker):
     """A joker that changes the scoring of a rank 2 card to 1 chip and 0 multiplier, ignoring possible modifiers."""
     name = "Deranked Two"
@@ -103,6 +106,9 @@ class PowerRankJoker(Joker):
         else:
             return added_chips, added_multiplier
 
+    def compile_card_score(self) -> List[Tuple[int, int, int, int]]:
+        return [(2, 0, 2, 0) if card.rank in self.target_ranks else IDENTITY_CARD_SCORE for card in CARDS]
+
 class EmpoweredTwo(PowerRankJoker):
     """A joker that duplicates the chips and multiplier of a card if its rank is a 2."""
     name = "Empowered Two"
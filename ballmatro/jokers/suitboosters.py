@@ -1,13 +1,14 @@
 """Suit boosters jokers: modify the score provided by a card depending on the suit of the card played."""
 
-from typing import List
-from ballmatro.jokers.joker import Joker
-from ballmatro.card import Card
+from typing import List, Tuple
+from ballmatro.jokers.joker import IDENTITY_CARD_SCORE, Joker
+from ballmatro.card import CARDS, Card
 
 
 class DesuitedJoker(Joker):
     """A joker that changes the scoring of a suit card to 1 chip and 0 multiplier, ignoring possible modifiers."""
     target_suit: str
+    suit_dependent = True
 
     def card_score_callback(self, card: Card, chips: int, multiplier: int, added_chips: int = 0, added_multiplier: int = 0) -> tuple[int, int]:
         if card.suit == self.target_suit:
@@ -15,6 +16,9 @@ class DesuitedJoker(Joker):
         else:            
             return added_chips, added_multiplier
 
+    def compile_card_score(self) -> List[Tuple[int, int, int, int]]:
+        return [(0, 1, 0, 0) if card.suit == self.target_suit else IDENTITY_CARD_SCORE for card in CARDS]
+
 class DesuitedClub(DesuitedJoker):
     """A joker that changes the scoring of a club card to 1 chip and 0 multiplier, ignoring possible modifiers."""
     name = "Desuited Club"
@@ -42,6 +46,7 @@ class DesuitedHeart(DesuitedJoker):
 class PowerSuitJoker(Joker):
     """A joker that duplicates the chips and multiplier of a card if its suit is in a target set."""
     target_suits: List[str]
+    suit_dependent = True
 
     def card_score_callback(self, card: Card, chips: int, multiplier: int, added_chips: int = 0, added_multiplier: int = 0) -> tuple[int, int]:
         if card.suit in self.target_suits:
@@ -49,6 +54,9 @@ class PowerSuitJoker(Joker):
         else:
             return added_chips, added_multiplier
 
+    def compile_card_score(self) -> List[Tuple[int, int, int, int]]:
+        return [(2, 0, 2, 0) if card.suit in self.target_suits else IDENTITY_CARD_SCORE for card in CARDS]
+
 class EmpoweredClub(PowerSuitJoker):
     """A joker that duplicates the chips and multiplier of a card if its suit is a club."""
     name = "Empowered Club"
@@ -1,7 +1,13 @@
 """Tests for the Joker class"""
 
-from ballmatro.jokers.joker import BlankJoker
-from ballmatro.card import Card
+import random
+
+from ballmatro.jokers.factory import JOKERS
+from ballmatro.jokers.joker import BlankJoker, compiled_card_scores
+from ballmatro.card import CARDS, Card
+from ballmatro.hands import Pair
+from ballmatro.score import _score_cards
+from ballmatro.tests.helpers import RunningChipsJoker
 
 def test_joker_to_card():
     """Test the to_card method of the Joker class"""
@@ -12,3 +18,30 @@ def test_joker_to_card():
     assert card.is_joker, "Card should be identified as a joker"
     assert card.joker_name == "Blank", "Card joker name should match the joker's name"
     assert card.joker_rule == "Does nothing at all", "Card joker rule should match the joker's description"
+
+def test_compile_card_score_matches_callback():
+    """The compiled card score table of every joker gives the same card scores as its callback"""
+    for joker_class in JOKERS:
+        joker = joker_class()
+        table = compiled_card_scores([joker])
+        assert table is not None, f"{joker_class.name} should be compilable"
+        for card in CARDS:
+            assert table[card.id] == joker.card_score_callback(card, 0, 0, card.chips, card.multiplier)
+
+def test_compiled_card_scores_composition():
+    """Composed tables apply the jokers in order, as the callbacks do"""
+    random.seed(0)
+    for _ in range(50):
+        jokers = [joker_class() for joker_class in random.choices(JOKERS, k=random.randint(1, 4))]
+        table = compiled_card_scores(jokers)
+        for card in CARDS:
+            added_chips, added_multiplier = card.chips, card.multiplier
+            for joker in jokers:
+                added_chips, added_multiplier = joker.card_score_callback(card, 0, 0, added_chips, added_multiplier)
+            assert table[card.id] == (added_chips, added_multiplier)
+
+def test_uncompilable_joker_falls_back_to_callbacks():
+    jokers = [BlankJoker(), RunningChipsJoker()]
+    assert compiled_card_scores(jokers) is None
+    # Pair of 3s: 10 chips and 2 multiplier, and each card adds its 3 chips plus the chips scored so far
+    assert _score_cards(Pair().value(), [Card("3♥"), Card("3♦")], jokers) == (10 + 13 + 26, 2)
@@ -1,6 +1,8 @@
 import pytest
 from ballmatro.jokers import planets
 from ballmatro.hands import HighCard, Pair, TwoPair, ThreeOfAKind, Straight, Flush, FullHouse, FourOfAKind, StraightFlush
+from ballmatro.hands import HAND_TYPES, HandValue
+from ballmatro.jokers.joker import compiled_hand_values
 
 """Module for testing the planet joker cards."""
 @pytest.mark.parametrize(
@@ -87,3 +89,24 @@ def test_barren_planet():
     modified = planet.played_hand_callback(hand)
     assert modified.chips == 1
     assert modified.multiplier == 1
+
+def test_planet_does_not_modify_hand():
+    """Planets return a new hand with the modified values, leaving the given one unchanged"""
+    hand = Pair()
+    modified = planets.MercuryPlusPlus().played_hand_callback(hand)
+    assert modified is not hand
+    assert isinstance(modified, Pair)
+    assert (hand.chips, hand.multiplier) == (Pair.chips, Pair.multiplier)
+    assert (modified.chips, modified.multiplier) == (Pair.chips * 10, Pair.multiplier * 10)
+
+def test_compiled_hand_values_planets():
+    """Hand values precomposed for a list of planets match applying their callbacks in order"""
+    jokers = [planets.MarsPlus(), planets.PlutoShard(), planets.Pluto(), planets.MarsPlus()]
+    values = compiled_hand_values(jokers)
+    for hand_type in HAND_TYPES:
+        hand = hand_type()
+        for joker in jokers:
+            hand = joker.played_hand_callback(hand)
+        assert values[hand_type] == HandValue(hand_type, hand.chips, hand.multiplier)
+        assert values[hand_type].to_hand() == hand
+        assert (values[hand_type].to_hand().chips, values[hand_type].to_hand().multiplier) == (hand.chips, hand.multiplier)
@@ -1,21 +1,512 @@
 """Functions to find the best hand in a given set of cards"""
-from itertools import combinations
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import combinations, permutations, product
+import heapq
 import math
-from typing import List
+from typing import Callable, Dict, List, Tuple
 
-from ballmatro.card import Card
-from ballmatro.score import Score
+from ballmatro.card import CARDS, MODIFIERS, RANKS, SUITS, Card
+from ballmatro.hands import (
+    MAX_HAND_CARDS, POKER_HANDS, RANK_PRIMES, EmptyHand, Flush, FourOfAKind, FullHouse, HighCard, InvalidPlay, NoPokerHand, Pair,
+    PokerHand, Straight, StraightFlush, ThreeOfAKind, TwoPair, _lookup_tables, find_hand
+)
+from ballmatro.jokers.joker import compiled_card_scores, compiled_hand_values, compiled_played_cards
+from ballmatro.score import Score, ScoringContext
 
 def brute_force_optimize(cards: List[Card]) -> Score:
     """Find the best hand in a given set of cards using brute force"""
-    # Joker can't be played, so we keep them apart
+    # Joker can't be played, so we keep them apart, and score every play with the same jokers
     non_joker_cards = [card for card in cards if card.is_joker is False]
+    context = ScoringContext(cards)
 
     best_score = -math.inf
     for i in range(0, len(non_joker_cards) + 1):
         for hand in combinations(non_joker_cards, i):
-            score_info = Score(cards, list(hand))
-            if score_info.score > best_score:
-                best_score = score_info.score
-                best_result = score_info
-    return best_result
+            score = context.score(list(hand))
+            if score > best_score:
+                best_score = score
+                best_hand = hand
+    return Score(cards, list(best_hand), context)
+
+def branch_and_bound_optimize(cards: List[Card]) -> Score:
+    """Find the best hand in a given set of cards using branch and bound.
+
+    Candidate plays are grouped by the poker hand they could form. For each poker hand an upper bound of the score is computed
+    from the hand value (after jokers) and the best card contributions available, and the poker hands are explored from the
+    most to the least promising one. Within a poker hand, cards are added one at a time, and a branch is pruned as soon as the
+    partial play can't be completed into that poker hand or its upper bound can't beat the best play found so far.
+
+    The bounds add up the contribution of each card on its own, so jokers whose effects can't be compiled into tables, which
+    might depend on the chips scored so far or on the other played cards, fall back to brute force.
+
+    Returns the same Score as brute_force_optimize, including the choice among equally scoring plays.
+    """
+    context = ScoringContext(cards)
+    if context.card_scores is None or compiled_played_cards(context.jokers) is None:
+        return brute_force_optimize(cards)
+    # Scoring the empty play gives us the jokers in play, and an initial solution
+    best = Score(cards, [], context)
+    # Cards ignored by the jokers never improve a play, so the optimal play never contains them
+    candidates = [
+        i for i, card in enumerate(cards)
+        if not card.is_joker and len(_apply_played_cards_jokers([card], best.jokers)) > 0
+    ]
+    contributions = {i: best._score_card(cards[i], 0, 0) for i in candidates}
+
+    # Sort the poker hands by their upper bound, and explore them in order
+    bounds = []
+    for poker_hand in POKER_HANDS:
+        if poker_hand is EmptyHand or poker_hand.ncards > len(candidates):
+            continue
+        hand_chips, hand_multiplier = _hand_value(poker_hand, best.jokers)
+        bound = _upper_bound(hand_chips, hand_multiplier, [contributions[i] for i in candidates], poker_hand.ncards)
+        bounds.append((bound, poker_hand, hand_chips, hand_multiplier))
+    bounds.sort(key=lambda item: item[0], reverse=True)
+
+    best_score, best_key = best.score, (0, ())
+
+    def branch(poker_hand: PokerHand, chosen: Tuple[int, ...], start: int, chips: int, multiplier: int):
+        """Explores the plays of a poker hand that extend the chosen cards with candidates from position start onwards"""
+        nonlocal best_score, best_key
+        missing = poker_hand.ncards - len(chosen)
+        if missing == 0:
+            score = chips * multiplier
+            key = (len(chosen), chosen)
+            if (score > best_score or (score == best_score and key < best_key)) and isinstance(find_hand([cards[i] for i in chosen]), poker_hand):
+                best_score, best_key = score, key
+            return
+        for position in range(start, len(candidates) - missing + 1):
+            i = candidates[position]
+            if not poker_hand.check_partial([cards[j] for j in chosen + (i,)]):
+                continue
+            card_chips, card_multiplier = contributions[i]
+            # Bound the score reachable by completing the play with the best remaining candidates
+            remaining = [contributions[j] for j in candidates[position + 1:]]
+            if _upper_bound(chips + card_chips, multiplier + card_multiplier, remaining, missing - 1) < best_score:
+                continue
+            branch(poker_hand, chosen + (i,), position + 1, chips + card_chips, multiplier + card_multiplier)
+
+    for bound, poker_hand, hand_chips, hand_multiplier in bounds:
+        if bound < best_score:
+            break
+        branch(poker_hand, (), 0, hand_chips, hand_multiplier)
+
+    if best_key[0] == 0:
+        return best
+    return Score(cards, [cards[i] for i in best_key[1]], context)
+
+def _upper_bound(chips: int, multiplier: int, contributions: List[Tuple[int, int]], ncards: int) -> int:
+    """Upper bound of the score attained by adding ncards cards from the given contributions to the current chips and multiplier"""
+    if ncards <= 0:
+        return chips * multiplier
+    best_chips = sum(heapq.nlargest(ncards, [card_chips for card_chips, _ in contributions]))
+    best_multiplier = sum(heapq.nlargest(ncards, [card_multiplier for _, card_multiplier in contributions]))
+    return (chips + best_chips) * (multiplier + best_multiplier)
+
+def _hand_value(poker_hand: PokerHand, jokers: list) -> Tuple[int, int]:
+    """Chips and multiplier of a poker hand after applying the jokers"""
+    value = compiled_hand_values(jokers)[poker_hand]
+    return value.chips, value.multiplier
+
+def _apply_played_cards_jokers(played: List[Card], jokers: list) -> List[Card]:
+    """Applies the played cards callbacks of the jokers to a list of played cards"""
+    for joker in jokers:
+        played = joker.played_cards_callback(played)
+    return played
+
+def structural_optimize(cards: List[Card]) -> Score:
+    """Find the best hand in a given set of cards evaluating only the plays that can form a poker hand.
+
+    Returns the same Score as brute_force_optimize, including the choice among equally scoring plays. See structural_search.
+    """
+    return structural_search(cards)[0]
+
+def structural_search(cards: List[Card]) -> Tuple[Score, int]:
+    """Find the best hand in a given set of cards evaluating only the plays that can form a poker hand.
+
+    Candidate plays are built from groups of cards with the same rank (pairs, three and four of a kind, two pair, full
+    house), the same suit (flushes), and chains of consecutive ranks (straights), plus the single cards and the empty play.
+    Other plays form no poker hand and score 0. Cards removed by the jokers are left out of the candidates: a play
+    containing them scores the same as the play without them, and brute force always prefers the smaller play.
+
+    Returns the best Score, and the number of candidate plays evaluated, to be compared with the 2^n plays evaluated by
+    brute_force_optimize for n non-joker cards.
+    """
+    context = ScoringContext(cards)
+    non_joker_cards = [card for card in cards if not card.is_joker]
+    positions = [
+        i for i, card in enumerate(non_joker_cards)
+        if len(_apply_played_cards_jokers([card], context.jokers)) > 0
+    ]
+    candidates = _structural_candidates(non_joker_cards, positions)
+    best_key = (-context.score([]), 0, ())
+    for candidate in candidates:
+        key = (-context.score([non_joker_cards[i] for i in candidate]), len(candidate), candidate)
+        if key < best_key:
+            best_key = key
+    # The empty play was evaluated first
+    return Score(cards, [non_joker_cards[i] for i in best_key[2]], context), len(candidates) + 1
+
+def _structural_candidates(cards: List[Card], positions: List[int]) -> List[Tuple[int, ...]]:
+    """Sorted tuples of positions of the given cards that could form a poker hand, other than the empty hand"""
+    by_rank = {}
+    by_suit = {}
+    for i in positions:
+        by_rank.setdefault(cards[i].rank_numeric, []).append(i)
+        by_suit.setdefault(cards[i].suit, []).append(i)
+    candidates = set((i,) for i in positions)
+    # Pairs, three of a kind and four of a kind
+    for group in by_rank.values():
+        for size in range(2, 5):
+            candidates.update(combinations(group, size))
+    # Two pair and full house
+    for rank1, group1 in by_rank.items():
+        for rank2, group2 in by_rank.items():
+            if rank1 == rank2:
+                continue
+            if rank1 < rank2:
+                candidates.update(pair1 + pair2 for pair1 in combinations(group1, 2) for pair2 in combinations(group2, 2))
+            candidates.update(three + pair for three in combinations(group1, 3) for pair in combinations(group2, 2))
+    # Flushes, including straight flushes
+    for group in by_suit.values():
+        candidates.update(combinations(group, 5))
+    # Straights
+    for start in range(len(RANKS) - 4):
+        chain = [by_rank.get(rank, []) for rank in range(start, start + 5)]
+        candidates.update(product(*chain))
+    return sorted(set(tuple(sorted(candidate)) for candidate in candidates))
+
+def gray_code_optimize(cards: List[Card]) -> Score:
+    """Find the best hand in a given set of cards visiting every play in Gray code order.
+
+    Consecutive plays differ in a single card, so the product of the rank primes, the number of cards of each suit and the
+    sums of the chips and multipliers contributed by the cards are updated in constant time, and each play is classified
+    with the lookup tables of find_hand_type and scored without building it. Cards removed by the jokers are left out, as
+    in structural_search. Falls back to brute_force_optimize if the jokers can't be compiled.
+
+    Returns the same Score as brute_force_optimize, including the choice among equally scoring plays.
+    """
+    context = ScoringContext(cards)
+    jokers = context.jokers
+    card_scores = context.card_scores
+    kept_cards = compiled_played_cards(jokers)
+    if card_scores is None or kept_cards is None:
+        return brute_force_optimize(cards)
+    non_joker_cards = [card for card in cards if not card.is_joker]
+    positions = [i for i, card in enumerate(non_joker_cards) if kept_cards[card.id]]
+    primes = [RANK_PRIMES[non_joker_cards[i].rank_numeric] for i in positions]
+    suits = [non_joker_cards[i].id % len(SUITS) for i in positions]
+    contributions = [card_scores[non_joker_cards[i].id] for i in positions]
+    # Chips and multiplier of each hand type after the jokers, or None if the hand type does not score
+    hand_values = {}
+    for hand_type, value in context.hand_values.items():
+        scored = value.hand_type not in (NoPokerHand, InvalidPlay)
+        hand_values[hand_type] = (value.chips, value.multiplier) if scored else None
+    mixed_suits_hands, same_suit_hands = _lookup_tables()
+
+    chips, multiplier = hand_values[EmptyHand]
+    best_score, best_key = chips * multiplier, (0, ())
+    mask, ncards, product, nsuits = 0, 0, 1, 0
+    suit_counts = [0] * len(SUITS)
+    card_chips = card_multiplier = 0
+    for step in range(1, 2 ** len(positions)):
+        # Toggle the card given by the lowest set bit of the step
+        bit = (step & -step).bit_length() - 1
+        mask ^= 1 << bit
+        chips, multiplier = contributions[bit]
+        suit = suits[bit]
+        if mask >> bit & 1:
+            ncards += 1
+            product *= primes[bit]
+            card_chips += chips
+            card_multiplier += multiplier
+            suit_counts[suit] += 1
+            nsuits += suit_counts[suit] == 1
+        else:
+            ncards -= 1
+            product //= primes[bit]
+            card_chips -= chips
+            card_multiplier -= multiplier
+            suit_counts[suit] -= 1
+            nsuits -= suit_counts[suit] == 0
+        if ncards > MAX_HAND_CARDS:
+            continue
+        value = hand_values[(same_suit_hands if nsuits <= 1 else mixed_suits_hands)[product]]
+        score = 0 if value is None else (value[0] + card_chips) * (value[1] + card_multiplier)
+        # Among equally scoring plays, brute force finds first the smallest one, and then the first in lexicographic order
+        if score > best_score or (score == best_score and ncards <= best_key[0]):
+            key = (ncards, tuple(positions[i] for i in range(len(positions)) if mask >> i & 1))
+            if score > best_score or key < best_key:
+                best_score, best_key = score, key
+    return Score(cards, [non_joker_cards[i] for i in best_key[1]], context)
+
+def polynomial_optimize(cards: List[Card]) -> Score:
+    """Find the best hand in a given set of cards choosing the best cards of each poker hand from buckets of cards with the
+    same rank or suit, in polynomial time.
+
+    Only supports jokers that change the values of the poker hands, such as planets, so that the score of a play only
+    depends on its poker hand and on the chips and multipliers of its cards. Falls back to branch_and_bound_optimize for
+    other jokers. For each poker hand:
+    - Hands made of cards of the same rank (from high card to full house) take, from each rank, a number of cards of each
+      modifier. Cards of the same rank and modifier are interchangeable, so the first ones in the input are taken.
+    - Straights and straight flushes take a card of each rank of a window of five consecutive ranks.
+    - Flushes take the cards of a suit with the most chips, for each number of cards with a multiplier. If those cards form
+      a straight flush or a full house instead, the flushes of the suit are searched with branch and bound.
+
+    Returns the same Score as brute_force_optimize, including the choice among equally scoring plays.
+    """
+    context = ScoringContext(cards)
+    hand_values = _card_independent_hand_values(context)
+    if hand_values is None:
+        return branch_and_bound_optimize(cards)
+    non_joker_cards = [card for card in cards if not card.is_joker]
+    # Among equally scoring plays, brute force finds first the smallest one, and then the first in lexicographic order
+    best_key = (-context.score([]), 0, ())
+
+    def consider(score: int, positions: List[int]):
+        """Keeps a play, given by the positions of its cards, if it is better than the best play so far"""
+        nonlocal best_key
+        if -score <= best_key[0]:
+            best_key = min(best_key, (-score, len(positions), tuple(sorted(positions))))
+
+    # Positions of the cards of each rank and modifier, and of each card
+    by_class, by_card = {}, {}
+    for i, card in enumerate(non_joker_cards):
+        by_class.setdefault((card.rank_numeric, card.modifier), []).append(i)
+        by_card.setdefault(card.id, []).append(i)
+    modifiers = [None] + MODIFIERS
+
+    # High card, pair, three of a kind, four of a kind, two pair and full house
+    rank_options = []
+    for rank in range(len(RANKS)):
+        classes = [
+            (non_joker_cards[by_class[rank, modifier][0]], by_class[rank, modifier])
+            for modifier in modifiers if (rank, modifier) in by_class
+        ]
+        rank_options.append({size: _bucket_options(classes, size) for size in range(1, 5)})
+    for poker_hand, sizes in [(HighCard, (1,)), (Pair, (2,)), (ThreeOfAKind, (3,)), (FourOfAKind, (4,)), (TwoPair, (2, 2)), (FullHouse, (3, 2))]:
+        hand_chips, hand_multiplier = hand_values[poker_hand]
+        for ranks in permutations(range(len(RANKS)), len(sizes)):
+            if poker_hand is TwoPair and ranks[0] > ranks[1]:
+                continue
+            for parts in product(*[rank_options[rank][size] for rank, size in zip(ranks, sizes)]):
+                chips = hand_chips + sum(part[0] for part in parts)
+                multiplier = hand_multiplier + sum(part[1] for part in parts)
+                consider(chips * multiplier, [i for part in parts for i in part[2]])
+
+    # Straights take the first card of each rank and modifier, unless they are all of the same suit, in which case one of
+    # them is replaced by the first card of its rank and modifier in another suit
+    firsts = {}
+    for card_id, positions in by_card.items():
+        card = non_joker_cards[positions[0]]
+        firsts.setdefault((card.rank_numeric, card.modifier), []).append((positions[0], card_id % len(SUITS)))
+    straight_options = [
+        [(non_joker_cards[by_class[rank, modifier][0]], sorted(firsts[rank, modifier])) for modifier in modifiers if (rank, modifier) in firsts]
+        for rank in range(len(RANKS))
+    ]
+    hand_chips, hand_multiplier = hand_values[Straight]
+    for start in range(len(RANKS) - 4):
+        for parts in product(*straight_options[start:start + 5]):
+            chips = hand_chips + sum(card.chips for card, _ in parts)
+            multiplier = hand_multiplier + sum(card.multiplier for card, _ in parts)
+            first = [suited[0] for _, suited in parts]
+            if len(set(suit for _, suit in first)) > 1:
+                consider(chips * multiplier, [i for i, _ in first])
+                continue
+            for j, (_, suited) in enumerate(parts):
+                if len(suited) > 1:
+                    consider(chips * multiplier, [i for i, _ in first[:j] + suited[1:2] + first[j + 1:]])
+
+    # Straight flushes and flushes
+    mixed_suits_hands, same_suit_hands = _lookup_tables()
+    for suit in range(len(SUITS)):
+        hand_chips, hand_multiplier = hand_values[StraightFlush]
+        for start in range(len(RANKS) - 4):
+            options = []
+            for rank in range(start, start + 5):
+                classes = [
+                    (CARDS[card_id], by_card[card_id])
+                    for card_id in (suit + len(SUITS) * rank + len(SUITS) * len(RANKS) * i for i in range(len(modifiers)))
+                    if card_id in by_card
+                ]
+                options.append(_bucket_options(classes, 1))
+            for parts in product(*options):
+                chips = hand_chips + sum(part[0] for part in parts)
+                multiplier = hand_multiplier + sum(part[1] for part in parts)
+                consider(chips * multiplier, [part[2][0] for part in parts])
+
+        # Cards of the suit, keeping only the first MAX_HAND_CARDS copies of each card
+        suited = [
+            (non_joker_cards[i], i)
+            for card_id, positions in by_card.items() if card_id % len(SUITS) == suit
+            for i in positions[:MAX_HAND_CARDS]
+        ]
+        hand_chips, hand_multiplier = hand_values[Flush]
+        flush = _best_flush(suited, hand_chips, hand_multiplier, same_suit_hands)
+        if flush is not None:
+            consider(*flush)
+
+    return Score(cards, [non_joker_cards[i] for i in best_key[2]], context)
+
+def _card_independent_hand_values(context: ScoringContext) -> Dict[type, Tuple[int, int]]:
+    """Chips and multiplier of each poker hand after the jokers of a scoring context, or None if the jokers change how the
+    cards are scored or played, or if some poker hand does not score positive chips and multiplier"""
+    kept_cards = compiled_played_cards(context.jokers)
+    if context.card_scores != compiled_card_scores([]) or kept_cards is None or not all(kept_cards):
+        return None
+    hand_values = {}
+    for poker_hand in POKER_HANDS:
+        value = context.hand_values[poker_hand]
+        if value.hand_type in (NoPokerHand, InvalidPlay) or value.chips <= 0 or value.multiplier <= 0:
+            return None
+        hand_values[poker_hand] = (value.chips, value.multiplier)
+    return hand_values
+
+def _bucket_options(classes: List[Tuple[Card, List[int]]], ncards: int) -> List[Tuple[int, int, List[int]]]:
+    """Ways of taking ncards cards from classes of interchangeable cards, given by a card of the class and its positions.
+
+    Returns the chips, multiplier and positions of each way, taking the first positions of each class, and leaving out
+    the ways that get no more chips and no more multiplier than another way, which can't score more.
+    """
+    options = []
+    for counts in product(*[range(min(len(positions), ncards) + 1) for _, positions in classes]):
+        if sum(counts) == ncards:
+            options.append((
+                sum(card.chips * count for (card, _), count in zip(classes, counts)),
+                sum(card.multiplier * count for (card, _), count in zip(classes, counts)),
+                [i for (_, positions), count in zip(classes, counts) for i in positions[:count]],
+            ))
+    return [
+        option for option in options
+        if not any(other[:2] != option[:2] and other[0] >= option[0] and other[1] >= option[1] for other in options)
+    ]
+
+def _best_flush(suited: List[Tuple[Card, int]], hand_chips: int, hand_multiplier: int, same_suit_hands: Dict[int, type]) -> Tuple[int, List[int]]:
+    """Best flush made of the given cards of a suit, with their positions, as its score and positions, or None if none.
+
+    For each number of cards with a multiplier, the cards with the most chips are taken, the first ones among cards with
+    equal chips. If the best of those plays is not a flush (it is a straight flush or a full house), the flushes are
+    searched with branch and bound in the order of brute force, so the first best flush found is the one it prefers.
+    """
+    groups = {}
+    for card, i in suited:
+        groups.setdefault(card.multiplier, []).append((-card.chips, i, card))
+    groups = [sorted(group) for group in groups.values()]
+    best = None
+    for counts in product(*[range(min(len(group), MAX_HAND_CARDS) + 1) for group in groups]):
+        if sum(counts) != MAX_HAND_CARDS:
+            continue
+        taken = [card for group, count in zip(groups, counts) for card in group[:count]]
+        score = (hand_chips + sum(card.chips for _, _, card in taken)) * (hand_multiplier + sum(card.multiplier for _, _, card in taken))
+        key = (-score, sorted(i for _, i, _ in taken))
+        if best is None or key < best[0]:
+            best = (key, taken)
+    if best is None:
+        return None
+    if same_suit_hands[math.prod(RANK_PRIMES[card.rank_numeric] for _, _, card in best[1])] is Flush:
+        return -best[0][0], best[0][1]
+
+    items = sorted((i, card) for card, i in suited)
+    best_score, best_positions = 0, None
+
+    def branch(chosen: Tuple[int, ...], start: int, chips: int, multiplier: int, product: int):
+        """Explores the flushes that extend the chosen cards with cards from position start onwards"""
+        nonlocal best_score, best_positions
+        missing = MAX_HAND_CARDS - len(chosen)
+        if missing == 0:
+            if chips * multiplier > best_score and same_suit_hands[product] is Flush:
+                best_score, best_positions = chips * multiplier, list(chosen)
+            return
+        for j in range(start, len(items) - missing + 1):
+            i, card = items[j]
+            # Plays found later come later in the order of brute force, so they must score strictly more
+            remaining = [(other.chips, other.multiplier) for _, other in items[j + 1:]]
+            if _upper_bound(chips + card.chips, multiplier + card.multiplier, remaining, missing - 1) <= best_score:
+                continue
+            branch(chosen + (i,), j + 1, chips + card.chips, multiplier + card.multiplier, product * RANK_PRIMES[card.rank_numeric])
+
+    branch((), 0, hand_chips, hand_multiplier, 1)
+    return None if best_positions is None else (best_score, best_positions)
+
+@dataclass
+class PlayDistribution:
+    """Best plays and distribution of the scores of all the possible plays of a given set of cards"""
+    top: List[Score]  # Best plays, from best to worst. Equally scoring plays are sorted in the order brute force finds them
+    histogram: Dict[int, int]  # Number of plays attaining each score, sorted by score, including the empty play
+
+    @property
+    def best(self) -> Score:
+        """Optimal play, the same one brute_force_optimize returns"""
+        return self.top[0]
+
+    @property
+    def nplays(self) -> int:
+        """Number of possible plays"""
+        return sum(self.histogram.values())
+
+    @property
+    def noptimal(self) -> int:
+        """Number of plays that attain the optimal score"""
+        return self.histogram[self.best.score]
+
+    def percentile(self, score: int) -> float:
+        """Fraction of the possible plays that score at most the given score, 1.0 for the optimal score"""
+        scores = list(self.histogram)
+        counts = list(self.histogram.values())
+        return sum(counts[:bisect_right(scores, score)]) / self.nplays
+
+def play_distribution(cards: List[Card], k: int = 5) -> PlayDistribution:
+    """Find the k best plays in a given set of cards, and the histogram of the scores of all the plays, in a single pass.
+
+    Plays are enumerated as in brute_force_optimize, so the first of the top plays is the optimal play brute force returns.
+    If several plays tie with the k-th best one, only those found first are kept, and the histogram gives how many there are.
+    Only the top plays are built as Score objects, the rest are scored through a ScoringContext of the input.
+    """
+    if k < 1:
+        raise ValueError(f"At least one top play must be requested, got k={k}")
+    non_joker_cards = [card for card in cards if not card.is_joker]
+    context = ScoringContext(cards)
+    histogram = {}
+    # Min-heap of the k best plays, keyed by score and then by reverse enumeration order
+    heap = []
+    index = 0
+    for size in range(len(non_joker_cards) + 1):
+        for play in combinations(non_joker_cards, size):
+            score = context.score(list(play))
+            histogram[score] = histogram.get(score, 0) + 1
+            item = (score, -index, play)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+            index += 1
+    top = [Score(cards, list(play), context) for _, _, play in sorted(heap, reverse=True)]
+    return PlayDistribution(top=top, histogram=dict(sorted(histogram.items())))
+
+def cross_check_optimize(cards: List[Card], optimizer: Callable[[List[Card]], Score] = branch_and_bound_optimize) -> Score:
+    """Runs both the brute force and the given optimizer, and checks they produce the same result.
+
+    Raises a ValueError if the results differ. Returns the brute force result otherwise.
+    """
+    expected = brute_force_optimize(cards)
+    result = optimizer(cards)
+    if result.asdict() != expected.asdict():
+        raise ValueError(f"Optimizer {optimizer.__name__} disagrees with brute force for {cards}: {result} != {expected}")
+    return expected
+
+OPTIMIZERS = {
+    "brute-force": brute_force_optimize,
+    "branch-and-bound": branch_and_bound_optimize,
+    "cross-check": cross_check_optimize,
+    "structural": structural_optimize,
+    "gray-code": gray_code_optimize,
+    "polynomial": polynomial_optimize,
+}
+
+# The vectorized optimizer is only available if NumPy is installed
+try:
+    from ballmatro.vectorized import vectorized_optimize
+    OPTIMIZERS["vectorized"] = vectorized_optimize
+except ImportError:
+    pass
@@ -0,0 +1,133 @@
+"""Persistent cache of optimal plays, shared among all the inputs with the same cards and jokers"""
+from collections import Counter, OrderedDict
+import sqlite3
+from typing import Callable, List, Optional
+
+from ballmatro.card import Card
+from ballmatro.optimizer import brute_force_optimize, cross_check_optimize
+from ballmatro.score import Score, scoring_fingerprint
+
+def canonical_key(cards: List[Card]) -> str:
+    """Canonical form of a list of input cards, used as the cache key.
+
+    The score of a play does not depend on the order of the non-joker cards, so these are represented by their sorted ids.
+    Jokers are applied in the order they appear in the input, so they are kept in that order.
+    """
+    ids = sorted(card.id for card in cards if not card.is_joker)
+    jokers = [card.txt for card in cards if card.is_joker]
+    return ",".join(str(id) for id in ids) + "|" + "|".join(jokers)
+
+class OptimizerCache:
+    """Cache of optimal plays, with an in-process LRU layer and an optional on-disk SQLite store.
+
+    Inputs with the same canonical_key share the same cached optimal play, which is mapped back onto the order of the cards
+    in each input. The score is always the optimal one, but when several plays attain the optimal score, the play returned
+    for a reordering of a cached input might be a different one than the one the optimizer would choose for it.
+
+    Args:
+        path (str): SQLite file where the optimal plays are stored across runs. If None, only the in-process layer is used.
+        maxsize (int): Maximum number of optimal plays kept in the in-process LRU layer.
+        optimizer (Callable[[List[Card]], Score]): Optimizer used for the inputs not found in the cache.
+        commit_every (int): Number of new optimal plays to accumulate before committing them to the SQLite store.
+    """
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 100000, optimizer: Callable[[List[Card]], Score] = brute_force_optimize, commit_every: int = 1000):
+        self.path = path
+        self.maxsize = maxsize
+        self.optimizer = optimizer
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._uncommitted = 0
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS optimal_plays (key TEXT PRIMARY KEY, played TEXT NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = self._db.execute("SELECT value FROM metadata WHERE name = 'scoring_fingerprint'").fetchone()
+            if row is None or row[0] != scoring_fingerprint():
+                # Plays optimized with other scoring rules might not be optimal anymore
+                self._db.execute("DELETE FROM optimal_plays")
+                self._db.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES ('scoring_fingerprint', ?)", (scoring_fingerprint(),))
+                self._db.commit()
+
+    def optimize(self, cards: List[Card]) -> Score:
+        """Return the optimal play for the given cards, running the optimizer only if the input is not cached"""
+        score = self.lookup(cards) if self.optimizer is not cross_check_optimize else None
+        if score is None:
+            score = self.optimizer(cards)
+            self.store(cards, score)
+        return score
+
+    __call__ = optimize
+
+    def lookup(self, cards: List[Card]) -> Optional[Score]:
+        """Return the optimal play for the given cards if it is cached, or None otherwise"""
+        key = canonical_key(cards)
+        played = self._lru.get(key)
+        if played is not None:
+            self._lru.move_to_end(key)
+        elif self._db is not None:
+            row = self._db.execute("SELECT played FROM optimal_plays WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                played = [Card(txt) for txt in row[0].split(",")] if row[0] else []
+                self._remember(key, played)
+        if played is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Score(cards, _in_input_order(cards, played))
+
+    def store(self, cards: List[Card], score: Score):
+        """Store the optimal play for the given cards"""
+        key = canonical_key(cards)
+        played = list(score.played)
+        self._remember(key, played)
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO optimal_plays (key, played) VALUES (?, ?)", (key, ",".join(card.txt for card in played)))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.commit()
+
+    def commit(self):
+        """Write the pending optimal plays to the SQLite store"""
+        if self._db is not None:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """Commit the pending optimal plays and close the SQLite store"""
+        if self._db is not None:
+            self.commit()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of optimal plays in the cache, including those only in the SQLite store"""
+        if self._db is not None:
+            return self._db.execute("SELECT COUNT(*) FROM optimal_plays").fetchone()[0]
+        return len(self._lru)
+
+    def _remember(self, key: str, played: List[Card]):
+        """Add an optimal play to the in-process LRU layer, evicting the least recently used one if full"""
+        self._lru[key] = played
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+def _in_input_order(cards: List[Card], played: List[Card]) -> List[Card]:
+    """Return the played cards in the order they appear in the input, as the optimizers do"""
+    missing = Counter(played)
+    ordered = []
+    for card in cards:
+        if missing[card] > 0:
+            ordered.append(card)
+            missing[card] -= 1
+    return ordered
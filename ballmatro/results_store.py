@@ -0,0 +1,177 @@
+"""Columnar store of benchmark results, with a manifest of the totals of each run"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Lists of cards, with each card text dictionary encoded
+CARD_LIST = pa.list_(pa.dictionary(pa.int16(), pa.string()))
+
+# Schema of the results of each run, with one row per hand
+RESULTS_SCHEMA = pa.schema([
+    ("input", CARD_LIST),  # Input cards, or null if the input was not a list of cards
+    ("input_text", pa.string()),  # Raw input, only if it was not a list of cards
+    ("played", CARD_LIST),  # Played cards, or null if the response was not a list of cards
+    ("played_text", pa.string()),  # Raw response, only if it was not a list of cards
+    ("remaining", CARD_LIST),  # Remaining cards, or null if there were none or the play was invalid
+    ("hand", pa.dictionary(pa.int8(), pa.string())),
+    ("chips", pa.int64()),
+    ("multiplier", pa.int64()),
+    ("score", pa.int64()),
+    ("normalized_score", pa.float64()),
+])
+
+# Schema of the manifest, with one row per run
+MANIFEST_SCHEMA = pa.schema([
+    ("level", pa.string()),
+    ("model", pa.string()),
+    ("file", pa.string()),  # Name of the results file of the run, relative to the store
+    ("hands", pa.int64()),  # Number of hands in the run
+    ("total_score", pa.int64()),
+    ("total_normalized_score", pa.float64()),
+    ("invalid_hands", pa.int64()),
+    ("normalized_invalid_hands", pa.float64()),
+    ("scoring_fingerprint", pa.string()),  # Fingerprint of the scoring rules the run was processed with, if recorded
+])
+
+MANIFEST_FILE = "manifest.parquet"
+
+class ResultsStore:
+    """Directory of benchmark results, with a Parquet file per run and a manifest with the totals of all runs.
+
+    Runs are identified by their level and model, and are written from the dictionaries produced by ScoreDataset.asdict.
+    Summary rows can be read from the manifest alone, and the results of each hand only from the runs requested.
+
+    Args:
+        path (str): Directory of the store. It is created if it does not exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def write(self, level: str, model: str, results: Dict[str, Any]):
+        """Write the results of a run, in the format of ScoreDataset.asdict, replacing any previous run of the model in the level.
+
+        The scoring fingerprint recorded in the results by reoptimize_results.py, if any, is kept in the manifest.
+        """
+        if len(results["scores"]) != len(results["normalized_scores"]):
+            raise ValueError("Results must have a normalized score for each score")
+        file = f"{level}_{model}.parquet"
+        rows = [_to_row(score, normalized) for score, normalized in zip(results["scores"], results["normalized_scores"])]
+        _write_atomically(pa.Table.from_pylist(rows, schema=RESULTS_SCHEMA), self.path / file)
+        summary = {
+            "level": level,
+            "model": model,
+            "file": file,
+            "hands": len(rows),
+            "total_score": results["total_score"],
+            "total_normalized_score": results["total_normalized_score"],
+            "invalid_hands": results["invalid_hands"],
+            "normalized_invalid_hands": results["normalized_invalid_hands"],
+            "scoring_fingerprint": results.get("scoring_fingerprint"),
+        }
+        manifest = [row for row in self.manifest().to_pylist() if (row["level"], row["model"]) != (level, model)]
+        manifest = sorted(manifest + [summary], key=lambda row: (row["level"], row["model"]))
+        _write_atomically(pa.Table.from_pylist(manifest, schema=MANIFEST_SCHEMA), self.path / MANIFEST_FILE)
+
+    def manifest(self, levels: List[str] = None, models: List[str] = None) -> pa.Table:
+        """Summary rows of the runs in the store, optionally only for the given levels and models"""
+        if not (self.path / MANIFEST_FILE).exists():
+            return MANIFEST_SCHEMA.empty_table()
+        return pq.read_table(self.path / MANIFEST_FILE, filters=_filters(levels, models))
+
+    def hands(self, levels: List[str] = None, models: List[str] = None, columns: List[str] = None) -> pa.Table:
+        """Results of each hand of the runs of the given levels and models, with the level and model of each row.
+
+        Only the results files of the selected runs are read, and of them only the given columns, or all if None.
+        """
+        tables = []
+        for run in self.manifest(levels, models).to_pylist():
+            table = pq.read_table(self.path / run["file"], columns=columns)
+            table = table.append_column("level", pa.array([run["level"]] * len(table), pa.string()).dictionary_encode())
+            table = table.append_column("model", pa.array([run["model"]] * len(table), pa.string()).dictionary_encode())
+            tables.append(table)
+        if len(tables) == 0:
+            return None
+        return pa.concat_tables(tables)
+
+    def read(self, level: str, model: str) -> Dict[str, Any]:
+        """Results of a run, in the format of ScoreDataset.asdict"""
+        manifest = self.manifest([level], [model]).to_pylist()
+        if len(manifest) == 0:
+            raise ValueError(f"No results for model {model} in level {level}")
+        summary = manifest[0]
+        rows = pq.read_table(self.path / summary["file"]).to_pylist()
+        results = {
+            "total_score": summary["total_score"],
+            "total_normalized_score": summary["total_normalized_score"],
+            "invalid_hands": summary["invalid_hands"],
+            "normalized_invalid_hands": summary["normalized_invalid_hands"],
+            "scores": [_from_row(row) for row in rows],
+            "normalized_scores": [row["normalized_score"] for row in rows],
+        }
+        if summary.get("scoring_fingerprint") is not None:
+            results["scoring_fingerprint"] = summary["scoring_fingerprint"]
+        return results
+
+def convert_json_results(paths: Iterable[str], store: ResultsStore) -> int:
+    """Add JSON benchmark results files to a store, returning the number of runs converted.
+
+    Files must be named as level_model.json, as in the benchmarks folder, and contain the output of ScoreDataset.asdict.
+    """
+    nruns = 0
+    for path in paths:
+        name = Path(path).stem
+        if "_" not in name:
+            raise ValueError(f"Results file {path} must be named as level_model.json")
+        level, model = name.split("_", 1)
+        with open(path, "r", encoding="utf-8") as f:
+            store.write(level, model, json.load(f))
+        nruns += 1
+    return nruns
+
+def _to_row(score: Dict[str, Any], normalized_score: float) -> Dict[str, Any]:
+    """Convert a score in the format of Score.asdict into a row of a results file"""
+    return {
+        "input": score["input"] if isinstance(score["input"], list) else None,
+        "input_text": score["input"] if isinstance(score["input"], str) else None,
+        "played": score["played"] if isinstance(score["played"], list) else None,
+        "played_text": score["played"] if isinstance(score["played"], str) else None,
+        "remaining": score["remaining"],
+        "hand": score["hand"],
+        "chips": score["chips"],
+        "multiplier": score["multiplier"],
+        "score": score["score"],
+        "normalized_score": normalized_score,
+    }
+
+def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a row of a results file back into a score in the format of Score.asdict"""
+    return {
+        "input": row["input"] if row["input_text"] is None else row["input_text"],
+        "played": row["played"] if row["played_text"] is None else row["played_text"],
+        "remaining": row["remaining"],
+        "hand": row["hand"],
+        "chips": row["chips"],
+        "multiplier": row["multiplier"],
+        "score": row["score"],
+    }
+
+def _filters(levels: List[str] = None, models: List[str] = None) -> List[tuple]:
+    """Parquet filters selecting the given levels and models, or None to select everything"""
+    filters = []
+    if levels is not None:
+        filters.append(("level", "in", list(levels)))
+    if models is not None:
+        filters.append(("model", "in", list(models)))
+    return filters or None
+
+def _write_atomically(table: pa.Table, path: Path):
+    """Write a table to a Parquet file, replacing it only once it has been fully written"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
@@ -1,16 +1,20 @@
 """Functions to score ballmatro hands"""
-from dataclasses import dataclass
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import InitVar, dataclass, field
 from datasets import Dataset
-from typing import List, Tuple, Union
+from functools import lru_cache
+import hashlib
+from pathlib import Path
+from itertools import zip_longest
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Type, Union
 
 
-from ballmatro.card import Card, parse_card_list
-from ballmatro.hands import find_hand, NoPokerHand, InvalidPlay
+from ballmatro.card import Card, CHIPS_PER_RANK, parse_card_list, parse_input_cards  # noqa: F401
+from ballmatro.hands import HAND_TYPES, HandValue, PokerHand, find_hand_type, NoPokerHand, InvalidPlay
 from ballmatro.jokers.factory import find_joker_card
-from ballmatro.jokers.joker import Joker
-
-
-CHIPS_PER_RANK = {"2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7, "8": 8, "9": 9, "10": 10, "J": 10, "Q": 10, "K": 10, "A": 11}
+from ballmatro.jokers.joker import Joker, compiled_card_scores, compiled_hand_values
 
 
 @dataclass
@@ -25,26 +29,23 @@ class Score:
     """
     input: Union[List[Card], str]  # Cards that were available for play
     played: Union[List[Card], str]  # Cards played in the hand
+    context: InitVar["ScoringContext"] = None  # Scoring context of the input, to reuse its jokers instead of finding them again
 
-    def __post_init__(self):
+    def __post_init__(self, context: "ScoringContext" = None):
         try:
             # Parse the input and played cards
-            if isinstance(self.input, str):
-                self.input = parse_card_list(self.input)
-            if isinstance(self.played, str):
-                self.played = parse_card_list(self.played)
+            self.input = _parse_cards(self.input, parse_input_cards)
+            self.played = _parse_cards(self.played)
             # Find cards that were not played
             self.remaining = self._remaining_cards(self.input, self.played)
             # Find jokers in the remaining cards
-            self.jokers = self._find_jokers()
-            # Apply the jokers to the played cards
-            for joker in self.jokers:
-                self.played = joker.played_cards_callback(self.played)
-            # Find the hand that was played
-            self.hand = find_hand(self.played)
-            # Apply the jokers to the hand if any
-            for joker in self.jokers:
-                self.hand = joker.played_hand_callback(self.hand)
+            if context is not None and not any(card.is_joker for card in self.played):
+                self.jokers = context.jokers
+            else:
+                self.jokers = self._find_jokers()
+            # Apply the jokers to the played cards, find the hand that was played, and apply the jokers to the hand
+            self.played, value = _play_hand(self.played, self.jokers)
+            self.hand = value.to_hand()
         except ValueError:
             self.remaining = None
             self.hand = InvalidPlay()
@@ -57,14 +58,7 @@ class Score:
     
     def _remaining_cards(self, available: List[Card], played: List[Card]) -> List[Card]:
         """Returns the remaining (not played) cards after playing a hand"""
-        remaining = available.copy()
-        for card in played:
-            # Check if the card is available
-            if card not in remaining:
-                raise ValueError(f"Impossible play: card {card} not in available cards")
-            # Remove the card from the remaining cards
-            remaining.remove(card)
-        return remaining
+        return _remaining_cards(available, played)
 
     def _find_jokers(self) -> List[Joker]:
         """Find jokers in the remaining cards"""
@@ -76,18 +70,10 @@ class Score:
         A score of 0 is attained when the hand is not recognized or the list of played cards contains cards that are not available.
         """
         # Check if the played cards were really available
-        if self.remaining is None or isinstance(self.hand, (NoPokerHand, InvalidPlay)):
-            self.chips = 0
-            self.multiplier = 0
-            self.score = 0
-            return
-
-        # Start scoring using the chips and multiplier of the hand type
-        self.chips, self.multiplier = self.hand.chips, self.hand.multiplier
-        # Now iterate over the cards in the order played, and score each card individually
-        for card in self.played:
-            self.chips, self.multiplier = self._score_card(card, self.chips, self.multiplier)
-
+        if self.remaining is None:
+            self.chips, self.multiplier = 0, 0
+        else:
+            self.chips, self.multiplier = _score_cards(self.hand.value(), self.played, self.jokers)
         self.score = self.chips * self.multiplier
 
     def asdict(self) -> dict:
@@ -104,26 +90,213 @@ class Score:
 
     def _score_card(self, card: Card, chips: int, multiplier: int) -> Tuple[int, int]:
         """Applies the scoring of a single card to the current chips and multiplier"""
-        # Add the chips of the card rank to the current chips
-        extra_chips = CHIPS_PER_RANK.get(card.rank, 0)
-        extra_multiplier = 0
-        # Apply modifiers
-        if card.modifier == "+":
-            extra_chips += 30
-        elif card.modifier == "x":
-            extra_multiplier += 4
-        # Apply jokers to the card score
+        return _score_card(card, self.jokers, chips, multiplier, compiled_card_scores(self.jokers))
+
+class ScoringContext:
+    """Jokers and compiled joker effects of an input, found once to score many plays over that input.
+
+    Jokers can't be played, so every play without joker cards is scored with all the jokers of the input, and the values
+    of the poker hands and the card scores compiled for them are looked up once for all the plays. The number of copies
+    of each card in the input is also counted once, so checking that a play is available takes time proportional to the
+    number of played cards.
+    """
+
+    def __init__(self, input: Union[List[Card], str]):
+        self.input = _parse_cards(input, parse_input_cards)
+        self.counts = dict(Counter(self.input))
+        self.jokers = [find_joker_card(card) for card in self.input if card.is_joker]
+        self.hand_values = compiled_hand_values(self.jokers)
+        self.card_scores = compiled_card_scores(self.jokers)
+
+    def play(self, played: List[Card]) -> Tuple[List[Card], HandValue, int, int]:
+        """Score a play over the input, returning the played cards after applying the jokers, the value of the hand they
+        form, and their chips and multiplier.
+
+        Raises a ValueError if the played cards are not available in the input.
+        """
+        played_counts = self._played_counts(played)
+        if any(card.is_joker for card in played):
+            # Played jokers are not active, so the play is scored with the jokers that remain
+            jokers = []
+            for card in self.input:
+                if card.is_joker:
+                    if played_counts.get(card, 0) > 0:
+                        played_counts[card] -= 1
+                    else:
+                        jokers.append(find_joker_card(card))
+            played, hand = _play_hand(played, jokers)
+            return (played, hand) + _score_cards(hand, played, jokers)
         for joker in self.jokers:
-            extra_chips, extra_multiplier = joker.card_score_callback(card, chips, multiplier, extra_chips, extra_multiplier)
-        # Return the new chips and multiplier
+            played = joker.played_cards_callback(played)
+        hand = self.hand_values[find_hand_type(played)]
+        return (played, hand) + _score_cards(hand, played, self.jokers, self.card_scores)
+
+    def _played_counts(self, played: List[Card]) -> Dict[Card, int]:
+        """Number of copies of each played card, raising a ValueError if there are not as many copies in the input"""
+        played_counts = {}
+        for card in played:
+            count = played_counts.get(card, 0) + 1
+            if count > self.counts.get(card, 0):
+                raise ValueError(f"Impossible play: card {card} not in available cards")
+            played_counts[card] = count
+        return played_counts
+
+    def score(self, played: List[Card]) -> int:
+        """Score of a play over the input, 0 if the play is not possible"""
+        try:
+            _, _, chips, multiplier = self.play(played)
+        except ValueError:
+            return 0
+        return chips * multiplier
+
+def _parse_cards(cards: Union[List[Card], str], parse: Callable[[str], List[Card]] = parse_card_list) -> List[Card]:
+    """Parses a list of cards in text form with the given parser, or returns it unchanged if it is already a list of
+    cards. Inputs of datasets are parsed with the cached parse_input_cards, and plays with parse_card_list."""
+    if isinstance(cards, str):
+        return parse(cards)
+    return cards
+
+def _remaining_cards(available: List[Card], played: List[Card]) -> List[Card]:
+    """Returns the remaining (not played) cards after playing a hand"""
+    remaining = available.copy()
+    for card in played:
+        # Check if the card is available
+        if card not in remaining:
+            raise ValueError(f"Impossible play: card {card} not in available cards")
+        # Remove the card from the remaining cards
+        remaining.remove(card)
+    return remaining
+
+def _play_hand(played: List[Card], jokers: List[Joker]) -> Tuple[List[Card], HandValue]:
+    """Applies the jokers to the played cards, and finds the value of the poker hand they form after applying the jokers to it.
+
+    Returns the played cards after the jokers were applied, and the hand value.
+    """
+    for joker in jokers:
+        played = joker.played_cards_callback(played)
+    return played, compiled_hand_values(jokers)[find_hand_type(played)]
+
+def _score_cards(hand: HandValue, played: List[Card], jokers: List[Joker], card_scores: Tuple[Tuple[int, int], ...] = None) -> Tuple[int, int]:
+    """Computes the chips and multiplier of a poker hand formed by the played cards, with the given jokers.
+
+    If given, card_scores is the table of card scores compiled for the jokers, which is compiled here otherwise.
+    """
+    if hand.hand_type in (NoPokerHand, InvalidPlay):
+        return 0, 0
+    # Start scoring using the chips and multiplier of the hand type
+    chips, multiplier = hand.chips, hand.multiplier
+    # Now iterate over the cards in the order played, and score each card individually
+    if card_scores is None:
+        card_scores = compiled_card_scores(jokers)
+    for card in played:
+        chips, multiplier = _score_card(card, jokers, chips, multiplier, card_scores)
+    return chips, multiplier
+
+def _score_card(card: Card, jokers: List[Joker], chips: int, multiplier: int, card_scores: Tuple[Tuple[int, int], ...] = None) -> Tuple[int, int]:
+    """Applies the scoring of a single card to the current chips and multiplier.
+
+    If given, card_scores is the table of card scores compiled for the jokers (see compiled_card_scores), which replaces
+    calling the jokers callbacks for non-joker cards.
+    """
+    if card_scores is not None and card.id is not None:
+        extra_chips, extra_multiplier = card_scores[card.id]
         return chips + extra_chips, multiplier + extra_multiplier
+    # Add the chips of the card rank and modifiers to the current chips and multiplier
+    extra_chips, extra_multiplier = card.chips, card.multiplier
+    # Apply jokers to the card score
+    for joker in jokers:
+        extra_chips, extra_multiplier = joker.card_score_callback(card, chips, multiplier, extra_chips, extra_multiplier)
+    # Return the new chips and multiplier
+    return chips + extra_chips, multiplier + extra_multiplier
+
+@lru_cache(maxsize=None)
+def scoring_fingerprint() -> str:
+    """Hash of the source code of the scoring rules and the optimizers: cards, poker hands, jokers, scoring and optimization.
+
+    Results stored along with the current fingerprint are known to be scored and normalized as they would be now.
+    """
+    package = Path(__file__).parent
+    files = [package / "card.py", package / "hands.py", package / "score.py", package / "optimizer.py"] + sorted((package / "jokers").glob("*.py"))
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(file.name.encode("utf-8"))
+        digest.update(file.read_bytes())
+    return digest.hexdigest()[:16]
+
+@dataclass
+class ScoreBatch:
+    """Scores of a batch of plays, stored as columns"""
+    chips: array = field(default_factory=lambda: array("q"))  # Final chips of each play
+    multiplier: array = field(default_factory=lambda: array("q"))  # Final multiplier of each play
+    score: array = field(default_factory=lambda: array("q"))  # Score of each play
+    hand_id: array = field(default_factory=lambda: array("b"))  # Index in HAND_TYPES of the poker hand of each play
+    invalid: array = field(default_factory=lambda: array("b"))  # 1 if the play was invalid or formed no poker hand, 0 otherwise
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+    def hand(self, i: int) -> Type[PokerHand]:
+        """Return the poker hand class of the i-th play"""
+        return HAND_TYPES[self.hand_id[i]]
+
+def score_batch(inputs: List[Union[List[Card], str]], plays: List[Union[List[Card], str]]) -> ScoreBatch:
+    """Scores a batch of plays, each one over its corresponding input cards.
+
+    Produces the same chips, multipliers, scores and poker hands as building a Score for each play, but stores them as
+    columns, without keeping any per play object. Plays over input texts repeated in the batch share a ScoringContext,
+    so each input is only parsed once.
+    """
+    if len(inputs) != len(plays):
+        raise ValueError("Inputs and plays must have the same length")
+    batch = ScoreBatch()
+    contexts: Dict[str, ScoringContext] = {}
+    for input, played in zip(inputs, plays):
+        try:
+            if isinstance(input, str):
+                if input not in contexts:
+                    contexts[input] = ScoringContext(input)
+                context = contexts[input]
+            else:
+                context = ScoringContext(input)
+            _, hand, chips, multiplier = context.play(_parse_cards(played))
+        except ValueError:
+            hand = InvalidPlay().value()
+            chips, multiplier = 0, 0
+        batch.chips.append(chips)
+        batch.multiplier.append(multiplier)
+        batch.score.append(chips * multiplier)
+        batch.hand_id.append(HAND_TYPES.index(hand.hand_type))
+        batch.invalid.append(hand.hand_type in (NoPokerHand, InvalidPlay))
+    return batch
+
+class LazyScores(Sequence):
+    """Sequence of the Score objects of a batch of plays, where each Score is only built when it is first accessed"""
+
+    def __init__(self, inputs: List[Union[List[Card], str]], plays: List[Union[List[Card], str]]):
+        self.inputs = inputs
+        self.plays = plays
+        self._scores: Dict[int, Score] = {}
+
+    def __len__(self) -> int:
+        return len(self.plays)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Score, List[Score]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Score index out of range")
+        if i not in self._scores:
+            self._scores[i] = Score(self.inputs[i], self.plays[i])
+        return self._scores[i]
 
 @dataclass
 class ScoreDataset:
     """Class that represents the scores obtained over a whole Ballmatro dataset"""
     dataset: Dataset  # Dataset containing the hands and optimal plays
     plays: List[Union[str, List[Card]]]  # List of plays (hands) carried out for the dataset
-    scores: List[Score] = None  # Detailed Score objects for each play
+    scores: Sequence = None  # Detailed Score objects for each play, built lazily when accessed
     total_score: int = 0  # Total score of the plays over the whole dataset
     normalized_score: float = 0.0  # Normalized score [0,1] of the plays over the whole dataset
     invalid_hands: int = 0  # Number of invalid hands played
@@ -134,14 +307,16 @@ class ScoreDataset:
         if len(self.dataset) != len(self.plays):
             raise ValueError("Dataset and plays must have the same length")
         # Score the plays
-        self.scores = [Score(input, played) for input, played in zip(self.dataset["input"], self.plays)]
+        inputs = self.dataset["input"]
+        self.batch = score_batch(inputs, self.plays)
+        self.scores = LazyScores(inputs, self.plays)
         # Compute normalized scores
-        self.normalized_scores = [score.score / reference_score for score, reference_score in zip(self.scores, self.dataset["score"])]
+        self.normalized_scores = [score / reference_score for score, reference_score in zip(self.batch.score, self.dataset["score"])]
         # Compute statistics
-        self.total_score = sum(score.score for score in self.scores)
+        self.total_score = sum(self.batch.score)
         self.total_normalized_score = sum(self.normalized_scores) / len(self.normalized_scores)
-        self.invalid_hands = sum(1 for score in self.scores if isinstance(score.hand, (NoPokerHand, InvalidPlay)))
-        self.normalized_invalid_hands = self.invalid_hands / len(self.scores)
+        self.invalid_hands = sum(self.batch.invalid)
+        self.normalized_invalid_hands = self.invalid_hands / len(self.batch)
 
     def __repr__(self):
         """Return a string representation of the score info"""
@@ -157,3 +332,76 @@ class ScoreDataset:
             "scores": [score.asdict() for score in self.scores],
             "normalized_scores": self.normalized_scores,
         }
+
+@dataclass
+class StreamingScoreDataset:
+    """Class that represents the scores obtained over a Ballmatro dataset, scored one row at a time.
+
+    Rows are either the rows of a Dataset or IterableDataset, with their "input" and reference "score", together with the
+    corresponding plays, or (input, reference score, play) tuples if no plays are given. The statistics of ScoreDataset
+    are updated as each row is scored, and the results of each row are passed to the sink, if given, instead of being
+    kept, so memory does not grow with the number of rows. ScoreDataset.asdict can be rebuilt from the rows passed to
+    the sink with streamed_asdict.
+    """
+    rows: Iterable[Any]  # Rows of the dataset, or (input, reference score, play) tuples
+    plays: Iterable[Union[str, List[Card]]] = None  # Plays carried out for each row of the dataset, if not in the rows
+    sink: Callable[[Dict[str, Any]], None] = None  # Receives the Score.asdict of each play, with its "normalized_score"
+    total_score: int = 0  # Total score of the plays over the whole dataset
+    total_normalized_score: float = 0.0  # Normalized score [0,1] of the plays over the whole dataset
+    invalid_hands: int = 0  # Number of invalid hands played
+    normalized_invalid_hands: float = 0.0  # Fraction of invalid hands played [0,1]
+    nrows: int = 0  # Number of rows scored
+
+    def __post_init__(self):
+        sum_normalized_scores = 0.0
+        for input, reference_score, played in self._rows():
+            score = Score(input, played)
+            normalized_score = score.score / reference_score
+            self.nrows += 1
+            self.total_score += score.score
+            sum_normalized_scores += normalized_score
+            self.invalid_hands += isinstance(score.hand, (NoPokerHand, InvalidPlay))
+            if self.sink is not None:
+                self.sink({**score.asdict(), "normalized_score": normalized_score})
+        if self.nrows > 0:
+            self.total_normalized_score = sum_normalized_scores / self.nrows
+            self.normalized_invalid_hands = self.invalid_hands / self.nrows
+
+    def __repr__(self):
+        """Return a string representation of the score info"""
+        return f"StreamingScoreDataset(total_score={self.total_score}, total_normalized_score={self.total_normalized_score}, invalid_hands={self.invalid_hands}, normalized_invalid_hands={self.normalized_invalid_hands})"
+
+    def _rows(self) -> Iterable[Tuple[Union[str, List[Card]], int, Union[str, List[Card]]]]:
+        """Iterates over the input, reference score and play of each row"""
+        if self.plays is None:
+            for row in self.rows:
+                if isinstance(row, dict):
+                    raise ValueError("Plays must be given for rows of a dataset")
+                yield row
+            return
+        missing = object()
+        for row, played in zip_longest(self.rows, self.plays, fillvalue=missing):
+            if row is missing or played is missing:
+                raise ValueError("Dataset and plays must have the same length")
+            yield row["input"], row["score"], played
+
+def streamed_asdict(rows: Iterable[Dict[str, Any]]) -> dict:
+    """Rebuild the output of ScoreDataset.asdict from the rows passed to the sink of a StreamingScoreDataset.
+
+    Without rows, the totals are zero, as those of a StreamingScoreDataset over no rows.
+    """
+    scores, normalized_scores = [], []
+    for row in rows:
+        row = dict(row)
+        normalized_scores.append(row.pop("normalized_score"))
+        scores.append(row)
+    invalid_hands = sum(score["hand"] in (NoPokerHand.name, InvalidPlay.name) for score in scores)
+    nrows = max(len(scores), 1)
+    return {
+        "total_score": sum(score["score"] for score in scores),
+        "total_normalized_score": sum(normalized_scores) / nrows,
+        "invalid_hands": invalid_hands,
+        "normalized_invalid_hands": invalid_hands / nrows,
+        "scores": scores,
+        "normalized_scores": normalized_scores,
+    }
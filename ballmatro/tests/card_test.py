@@ -1,5 +1,13 @@
 """Tests for the card module."""
-from ballmatro.card import Card, parse_card_list
+import copy
+from dataclasses import FrozenInstanceError
+import pickle
+
+import pytest
+
+from ballmatro.card import Card, CardParseError, CARDS, MODIFIERS, RANKS, SUITS, parse_card_list, parse_input_cards
+from ballmatro.generators import _int2card
+from ballmatro.jokers.factory import JOKERS
 
 def test_card_suit():
     card = Card("10♠")
@@ -68,3 +76,76 @@ def test_parse_card_list_single_card():
 def test_parse_card_list_empty():
     cards = parse_card_list("[]")
     assert cards == []
+
+def test_parse_input_cards_cached():
+    """Repeated inputs are parsed once, but each call returns its own list, as parse_card_list"""
+    cards = parse_input_cards("[2♣,🂿 Blank: Does nothing at all]")
+    cards.append(Card("3♠"))
+    assert parse_input_cards("[2♣,🂿 Blank: Does nothing at all]") == [Card("2♣"), Card("🂿 Blank: Does nothing at all")]
+    assert parse_input_cards("[2♣, 3♠]") == parse_card_list("[2♣, 3♠]")
+
+@pytest.mark.parametrize("txt, reason, position, index", [
+    ("2♣,3♠]", "Input must start with '[' and end with ']'", 0, None),
+    ("[2♣,3♠", "Input must start with '[' and end with ']'", 5, None),
+    ("[2♣, 3x, 4♥]", "Card must contain a suit or be a joker", 5, 1),
+    ("[2♣,3♠,22♠]", "Invalid card format: 22♠", 7, 2),
+    ("[2♣,,4♥]", "Card text must be a non-empty string", 4, 1),
+])
+@pytest.mark.parametrize("parse", [parse_card_list, parse_input_cards])
+def test_parse_card_list_errors(txt, reason, position, index, parse):
+    """Errors report their reason and where they were found"""
+    with pytest.raises(CardParseError) as excinfo:
+        parse(txt)
+    assert isinstance(excinfo.value, ValueError)
+    assert (excinfo.value.reason, excinfo.value.txt, excinfo.value.position, excinfo.value.index) == (reason, txt, position, index)
+
+def test_card_interned():
+    assert Card("A♠x") is Card("A♠x")
+    assert Card(txt="10♦") is Card("10♦")
+    joker = JOKERS[1]().to_card().txt
+    assert Card(joker) is Card(joker)
+
+def test_unknown_joker_not_interned():
+    """Cards of unknown jokers are equal, but built anew each time"""
+    joker = "🂿 Double Double: Cards with rank 2 provide double chips"
+    assert Card(joker) is not Card(joker)
+    assert Card(joker) == Card(joker)
+    assert parse_card_list(f"[{joker}]") == [Card(joker)]
+
+def test_card_frozen():
+    card = Card("A♠x")
+    with pytest.raises(FrozenInstanceError):
+        card.txt = "2♠"
+    with pytest.raises(AttributeError):
+        card.other = 1
+
+def test_card_pickle_roundtrip():
+    card = Card("Q♥+")
+    assert pickle.loads(pickle.dumps(card)) is card
+    assert copy.deepcopy([card])[0] is card
+
+def test_card_ids():
+    assert len(CARDS) == len(SUITS) * len(RANKS) * (len(MODIFIERS) + 1)
+    for i, card in enumerate(CARDS):
+        assert card.id == i
+        assert card is _int2card(i, [""] + MODIFIERS)
+        assert Card(card.txt) is card
+    assert Card("🂿 Blank: Does nothing at all").id is None
+
+def test_card_chips():
+    assert (Card("2♣").chips, Card("2♣").multiplier) == (2, 0)
+    assert (Card("A♠+").chips, Card("A♠+").multiplier) == (41, 0)
+    assert (Card("K♠x").chips, Card("K♠x").multiplier) == (10, 4)
+    assert (Card("🂿 Blank: Does nothing at all").chips, Card("🂿 Blank: Does nothing at all").multiplier) == (0, 0)
+
+def test_card_invalid_formats():
+    for txt, message in [
+        (5, "Card text must be a non-empty string"),
+        ("2", "Card must contain a suit or be a joker"),
+        ("Z♠", "Card must contain a rank or be a joker"),
+        ("22♠", "Invalid card format: 22♠"),
+        ("🂿 A: B: C", "Invalid joker format: 🂿 A: B: C"),
+    ]:
+        with pytest.raises(ValueError) as excinfo:
+            Card(txt)
+        assert str(excinfo.value) == message
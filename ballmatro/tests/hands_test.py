@@ -1,5 +1,9 @@
-from ballmatro.card import Card
+from itertools import chain, combinations_with_replacement
+
+from ballmatro.card import Card, RANKS, SUITS
+from ballmatro.generators import exhaustive_generator
 from ballmatro.hands import StraightFlush, FourOfAKind, FullHouse, Flush, Straight, ThreeOfAKind, TwoPair, Pair, HighCard, EmptyHand, NoPokerHand, find_hand
+from ballmatro.hands import HandValue, find_hand_checks, find_hand_lookup, find_hand_type
 
 def test_straight_flush():
     cards = [Card('10♥'), Card('J♥'), Card('Q♥'), Card('K♥'), Card('A♥')]
@@ -49,3 +53,51 @@ def test_find_hand():
     assert find_hand([Card('A♥')]) == HighCard()
     assert find_hand([]) == EmptyHand()
     assert find_hand([Card("🂿 Double Double: Cards with rank 2 provide double chips")]) == NoPokerHand()
+
+def _suit_patterns(ncards):
+    """All the ways of assigning suits to ncards cards, up to relabelling of the suits"""
+    def extend(pattern):
+        if len(pattern) == ncards:
+            yield pattern
+            return
+        for suit in range(min(len(SUITS), max(pattern, default=-1) + 2)):
+            yield from extend(pattern + [suit])
+    yield from extend([])
+
+def test_find_hand_lookup_agrees_with_checks_exhaustive():
+    """The lookup classifier agrees with the checks classifier for all hands of up to 5 cards.
+
+    Poker hands only depend on the ranks of the cards and whether their suits are all the same, so all hands are covered
+    by enumerating all multisets of ranks combined with all suit assignments up to a relabelling of the suits.
+    """
+    for ncards in range(6):
+        patterns = list(_suit_patterns(ncards))
+        for ranks in combinations_with_replacement(RANKS, ncards):
+            for pattern in patterns:
+                hand = [Card(rank + SUITS[suit]) for rank, suit in zip(ranks, pattern)]
+                assert type(find_hand_lookup(hand)) is type(find_hand_checks(hand)), hand
+
+def test_find_hand_lookup_agrees_with_checks_generator():
+    """The lookup classifier agrees with the checks classifier for all hands of the exhaustive generator up to 2 cards"""
+    for hand in chain(exhaustive_generator(1), exhaustive_generator(2)):
+        assert type(find_hand(hand)) is type(find_hand(hand, classifier="checks")), hand
+
+def test_find_hand_lookup_jokers_and_large_hands():
+    """The lookup classifier handles jokers and hands with more than 5 cards"""
+    joker = Card("🂿 Double Double: Cards with rank 2 provide double chips")
+    for hand in [[joker], [joker, joker], [joker, Card('2♥')], [Card('2♥')] * 6, [Card('2♥'), Card('3♥'), Card('4♥'), Card('5♥'), Card('6♥'), Card('7♥')]]:
+        assert type(find_hand_lookup(hand)) is type(find_hand_checks(hand)), hand
+
+def test_find_hand_type():
+    assert find_hand_type([Card('10♥'), Card('J♥'), Card('Q♥'), Card('K♥'), Card('A♥')]) is StraightFlush
+    assert find_hand_type([Card('2♥'), Card('2♦')]) is Pair
+    assert find_hand_type([Card('2♥'), Card('3♦')]) is NoPokerHand
+    assert find_hand_type([]) is EmptyHand
+
+def test_hand_value():
+    value = Pair().value()
+    assert value == HandValue(Pair, Pair.chips, Pair.multiplier)
+    assert isinstance(value.to_hand(), Pair)
+    boosted = HandValue(Pair, 100, 20).to_hand()
+    assert (boosted.chips, boosted.multiplier) == (100, 20)
+    assert (Pair.chips, Pair.multiplier) != (100, 20)
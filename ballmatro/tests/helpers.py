@@ -0,0 +1,13 @@
+"""Helpers shared by the tests"""
+
+from ballmatro.card import Card
+from ballmatro.jokers.joker import Joker
+
+
+class RunningChipsJoker(Joker):
+    """A joker whose card effect depends on the chips scored so far, so it can't be compiled"""
+    name = "Running Chips"
+    description = "Cards give as many extra chips as the chips scored so far"
+
+    def card_score_callback(self, card: Card, chips: int, multiplier: int, added_chips: int = 0, added_multiplier: int = 0) -> tuple[int, int]:
+        return added_chips + chips, added_multiplier
@@ -1,7 +1,14 @@
+import pyarrow.parquet as pq
+import pytest
+
 from ballmatro.card import Card, RANKS, SUITS, MODIFIERS
-from ballmatro.generators import exhaustive_generator, random_generator, add_optimal_plays, to_hf_dataset, generator_to_dict, int2cards, _random_jokers
+from ballmatro.generators import exhaustive_generator, random_generator, add_jokers, add_optimal_plays, to_hf_dataset, generator_to_dict, generator_to_parquet, generator_to_parquet_split, int2cards, _random_jokers
+from ballmatro.generators import DISTRIBUTION_SCHEMA, expand_suit_orbits, is_suit_symmetric, suit_orbit, suit_orbit_size
+from ballmatro.optimizer import brute_force_optimize, play_distribution
+from ballmatro.optimizer_cache import OptimizerCache
 from ballmatro.score import Score
 from ballmatro.hands import NoPokerHand
+from ballmatro.jokers.factory import JOKERS
 
 def test_exhaustive_generator_size1():
     # Use a small hand size for tractable test
@@ -31,6 +38,16 @@ def test_exhaustive_generator_size2():
     # Check no invalid hands
     assert all(result.hand != NoPokerHand for _, result in results)
 
+def test_add_optimal_plays_optimizers():
+    hands = list(random_generator(max_hand_size=6, n=30, seed=1))
+    brute_force = [score.asdict() for _, score in add_optimal_plays(hands)]
+    branch_and_bound = [score.asdict() for _, score in add_optimal_plays(hands, optimizer="branch-and-bound")]
+    assert brute_force == branch_and_bound
+
+def test_add_optimal_plays_unknown_optimizer():
+    with pytest.raises(ValueError):
+        list(add_optimal_plays([[Card("2♣")]], optimizer="unknown"))
+
 def test_random_generator_size4():
     results = list(random_generator(max_hand_size=4, n=100))
     assert len(results) == 100
@@ -156,3 +173,109 @@ def test_generate_jokers():
         assert len(jokers) <= 3
         for joker_card in jokers:
             assert joker_card.is_joker, "Generated card should be a joker"
+
+def test_add_optimal_plays_workers():
+    """Parallel optimization produces the same hands and plays, in the same order, as the serial run"""
+    def run(workers):
+        hands = add_jokers(random_generator(max_hand_size=6, n=40, seed=3), 0, 2, len(JOKERS) - 1)
+        return [(str(hand), score.asdict()) for hand, score in add_optimal_plays(hands, "branch-and-bound", workers=workers, shard_size=3)]
+    serial = run(1)
+    assert len(serial) == 40
+    assert run(2) == serial
+    assert run(3) == serial
+
+def test_generator_to_parquet(tmp_path):
+    path = str(tmp_path / "dataset.parquet")
+    nrows = generator_to_parquet(add_optimal_plays(exhaustive_generator(1)), path, batch_size=10)
+    assert nrows == 156
+    assert pq.read_table(path).to_pydict() == generator_to_dict(add_optimal_plays(exhaustive_generator(1)))
+    # Row groups are bounded by the batch size
+    assert pq.ParquetFile(path).metadata.num_row_groups == 16
+
+def test_generator_to_parquet_distributions(tmp_path):
+    """Top plays and histograms of scores are stored as extra columns"""
+    path = str(tmp_path / "dataset.parquet")
+    generator = add_optimal_plays(random_generator(max_hand_size=4, n=20, seed=5), top_k=3)
+    nrows = generator_to_parquet(generator, path, batch_size=8, schema=DISTRIBUTION_SCHEMA)
+    assert nrows == 20
+    data = pq.read_table(path).to_pydict()
+    assert data == generator_to_dict(add_optimal_plays(random_generator(max_hand_size=4, n=20, seed=5), top_k=3), DISTRIBUTION_SCHEMA)
+    for output, score, top_outputs, top_scores, counts in zip(data["output"], data["score"], data["top_outputs"], data["top_scores"], data["histogram_counts"]):
+        assert top_outputs[0] == output
+        assert top_scores[0] == score
+        assert top_scores == sorted(top_scores, reverse=True)
+        assert sum(counts) >= len(top_scores)
+    # The default schema leaves the extra columns out
+    dataset = to_hf_dataset(add_optimal_plays(random_generator(max_hand_size=4, n=20, seed=5), top_k=3))
+    assert "top_outputs" not in dataset.column_names
+
+def test_generator_to_parquet_split(tmp_path):
+    paths = [str(tmp_path / "train.parquet"), str(tmp_path / "test.parquet")]
+    counts = generator_to_parquet_split(add_optimal_plays(exhaustive_generator(1)), paths, [0.5, 0.5], seed=1, batch_size=25)
+    assert counts == [78, 78]
+    train, test = [pq.read_table(path).to_pydict() for path in paths]
+    expected = generator_to_dict(add_optimal_plays(exhaustive_generator(1)))
+    # The splits are a partition of the whole dataset
+    assert sorted(train["input"] + test["input"]) == sorted(expected["input"])
+    # The split is reproducible with the same seed
+    paths2 = [str(tmp_path / "train2.parquet"), str(tmp_path / "test2.parquet")]
+    generator_to_parquet_split(add_optimal_plays(exhaustive_generator(1)), paths2, [0.5, 0.5], seed=1, batch_size=25)
+    assert pq.read_table(paths2[0]).to_pydict() == train
+
+def test_generator_to_parquet_split_invalid_fractions(tmp_path):
+    with pytest.raises(ValueError):
+        generator_to_parquet_split([], [str(tmp_path / "a.parquet")], [0.5])
+
+def test_suit_orbit():
+    assert suit_orbit([Card("A♣")]) == [[Card("A♣")], [Card("A♦")], [Card("A♠")], [Card("A♥")]]
+    assert suit_orbit_size([Card("2♥"), Card("2♠")]) == 6
+    assert suit_orbit_size([Card("2♥"), Card("3♠"), Card("4♦"), Card("5♣")]) == 24
+    joker = Card(f"🂿 {JOKERS[0].name}: {JOKERS[0].description}")
+    assert all(hand[0] == joker for hand in suit_orbit([joker, Card("2♥")]))
+
+def test_exhaustive_suit_representatives():
+    """Suit representatives cover every hand exactly once when expanded into their orbits"""
+    representatives = list(exhaustive_generator(2, suit_representatives=True))
+    assert sum(suit_orbit_size(hand) for hand in representatives) == len(list(exhaustive_generator(2)))
+    expanded = [hand for representative in representatives for hand in suit_orbit(representative)]
+    assert sorted(map(str, expanded)) == sorted(map(str, exhaustive_generator(2)))
+
+def test_expand_suit_orbits_matches_optimizer():
+    representatives = list(exhaustive_generator(3, suit_representatives=True))[::50]
+    for hand, score in expand_suit_orbits(add_optimal_plays(representatives)):
+        expected = brute_force_optimize(hand)
+        assert score.score == expected.score
+        assert score.hand.name == expected.hand.name
+
+def test_expand_suit_orbits_with_jokers():
+    hands = list(add_jokers(exhaustive_generator(2, suit_representatives=True), 1, 2, 40))[::20]
+    for hand, score in expand_suit_orbits(add_optimal_plays(hands)):
+        assert score.score == brute_force_optimize(hand).score
+
+def test_add_optimal_plays_distributions(tmp_path):
+    """The optimal play is the best play of the distribution, also with suit orbits, workers and cached hands"""
+    representatives = list(exhaustive_generator(2, suit_representatives=True))[::10]
+    expected = list(expand_suit_orbits(add_optimal_plays(representatives, top_k=3)))
+    for hand, score, distribution in expected:
+        assert score.asdict() == distribution.best.asdict()
+        assert distribution.histogram == play_distribution(hand, 3).histogram
+    with OptimizerCache(str(tmp_path / "cache.sqlite")) as cache:
+        list(add_optimal_plays(representatives, cache=cache))
+        for workers in [1, 2]:
+            results = list(expand_suit_orbits(add_optimal_plays(representatives, workers=workers, shard_size=4, cache=cache, top_k=3)))
+            assert [[score.asdict() for score in (score, *distribution.top)] for _, score, distribution in results] == [
+                [score.asdict() for score in (score, *distribution.top)] for _, score, distribution in expected
+            ]
+    with pytest.raises(ValueError):
+        next(add_optimal_plays(representatives, top_k=-1))
+
+def test_add_optimal_plays_distributions_columns():
+    """The output column is always the first of the top outputs, even among equally scoring plays"""
+    data = generator_to_dict(expand_suit_orbits(add_optimal_plays(exhaustive_generator(2, suit_representatives=True), top_k=3)), DISTRIBUTION_SCHEMA)
+    assert len(data["output"]) == 12246
+    assert all(top_outputs[0] == output for output, top_outputs in zip(data["output"], data["top_outputs"]))
+    assert all(top_scores[0] == score for score, top_scores in zip(data["score"], data["top_scores"]))
+
+def test_is_suit_symmetric():
+    assert is_suit_symmetric(0)
+    assert not is_suit_symmetric(len(JOKERS) - 1)
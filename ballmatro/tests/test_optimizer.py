@@ -1,8 +1,13 @@
+import random
+
 import pytest
 
-from ballmatro.card import Card
-from ballmatro.optimizer import brute_force_optimize
+from ballmatro.card import CARDS, Card, parse_card_list
+from ballmatro.generators import add_jokers, random_generator
+from ballmatro.jokers.factory import JOKER_CLASSES, JOKERS, find_joker_name
+from ballmatro.optimizer import brute_force_optimize, branch_and_bound_optimize, cross_check_optimize, gray_code_optimize, play_distribution, polynomial_optimize, structural_optimize, structural_search
 from ballmatro.score import Score
+from ballmatro.tests.helpers import RunningChipsJoker
 
 test_data = [
     (
@@ -72,3 +77,167 @@ def test_brute_force_optimize(cards, expected_score_info):
     assert opt.multiplier == expected_score_info.multiplier
     assert sorted(opt.input) == sorted(expected_score_info.input)
     assert sorted(opt.played) == sorted(expected_score_info.played)
+
+@pytest.mark.parametrize("cards, expected_score_info", test_data)
+def test_branch_and_bound_optimize(cards, expected_score_info):
+    """The branch and bound optimizer finds the same best hand as the brute force optimizer"""
+    opt = branch_and_bound_optimize(cards)
+    assert opt.asdict() == brute_force_optimize(cards).asdict()
+    assert opt.score == expected_score_info.score
+
+def test_branch_and_bound_optimize_ties():
+    """Among equally scoring plays, the branch and bound optimizer chooses the same play as brute force"""
+    cards = [Card('3♠'), Card('3♣'), Card('3♥'), Card('3♦')]
+    cards_jokers = [Card("🂿 Barren Mars: Sets the chips and multiplier of the Four of a Kind hand to 1")] + cards
+    for hand in [cards, cards_jokers, list(reversed(cards_jokers))]:
+        assert branch_and_bound_optimize(hand).asdict() == brute_force_optimize(hand).asdict()
+
+def test_branch_and_bound_optimize_uncompilable_jokers(monkeypatch):
+    """Jokers whose card scores depend on the chips scored so far fall back to brute force"""
+    monkeypatch.setitem(JOKER_CLASSES, RunningChipsJoker.name, RunningChipsJoker)
+    joker = RunningChipsJoker().to_card()
+    for hand in random_generator(max_hand_size=7, n=30, seed=3):
+        cards = [joker] + hand
+        assert branch_and_bound_optimize(cards).asdict() == brute_force_optimize(cards).asdict()
+
+def test_cross_check_optimize_random():
+    """The branch and bound optimizer agrees with brute force on random hands with jokers"""
+    for hand in add_jokers(random_generator(max_hand_size=8, n=50, seed=7), 0, 3, len(JOKERS) - 1):
+        cross_check_optimize(hand)
+
+def test_cross_check_optimize_disagreement():
+    """The cross check raises an error when the optimizers disagree"""
+    with pytest.raises(ValueError):
+        cross_check_optimize([Card('2♥'), Card('2♦')], optimizer=lambda cards: Score(cards, []))
+
+@pytest.mark.parametrize("cards, expected_score_info", test_data)
+def test_structural_optimize(cards, expected_score_info):
+    """The structural optimizer finds the same best hand as the brute force optimizer"""
+    opt = structural_optimize(cards)
+    assert opt.asdict() == brute_force_optimize(cards).asdict()
+    assert opt.score == expected_score_info.score
+
+def test_structural_optimize_random_with_jokers():
+    """The structural optimizer finds the same plays as brute force, evaluating fewer candidates"""
+    hands = add_jokers(random_generator(max_hand_size=9, n=150, seed=11), 0, 3, len(JOKERS) - 1)
+    for hand in hands:
+        score, evaluated = structural_search(hand)
+        assert score.asdict() == brute_force_optimize(hand).asdict()
+        assert evaluated <= 2 ** len([card for card in hand if not card.is_joker])
+
+def test_structural_search_counts():
+    # 8 cards with a full house, a flush and a straight available
+    cards = [Card("2♥"), Card("2♦"), Card("2♠"), Card("3♥"), Card("3♦"), Card("4♥"), Card("5♥"), Card("6♥")]
+    score, evaluated = structural_search(cards)
+    assert score.asdict() == brute_force_optimize(cards).asdict()
+    assert evaluated < 2 ** len(cards) // 2
+
+def test_structural_search_banned_cards():
+    """Cards removed by jokers are never part of the candidates"""
+    banned = Card("🂿 Banned Two: Played cards with rank 2 will be ignored in poker hand determination and scoring")
+    cards = [banned, Card("2♥"), Card("2♦"), Card("3♥"), Card("3♦")]
+    score, evaluated = structural_search(cards)
+    assert score.asdict() == brute_force_optimize(cards).asdict()
+    assert score.played == [Card("3♥"), Card("3♦")]
+    # Empty play, two single cards and a pair
+    assert evaluated == 4
+
+def test_play_distribution():
+    """The top plays and the histogram of scores match scoring every play"""
+    cards = [Card('2♥'), Card('2♦'), Card('3♥')]
+    distribution = play_distribution(cards, k=3)
+    assert [score.played for score in distribution.top] == [[Card('2♥'), Card('2♦')], [Card('3♥')], [Card('2♥')]]
+    # Empty play scores 1, and three plays form no poker hand
+    assert distribution.histogram == {0: 3, 1: 1, 7: 2, 8: 1, 28: 1}
+    assert distribution.nplays == 8
+    assert distribution.noptimal == 1
+    assert distribution.percentile(28) == 1.0
+    assert distribution.percentile(7) == 6 / 8
+    assert distribution.percentile(-1) == 0.0
+
+def test_play_distribution_random_with_jokers():
+    """The best play is the brute force one, and the top plays are the best scoring ones"""
+    hands = add_jokers(random_generator(max_hand_size=6, n=50, seed=3), 0, 2, len(JOKERS) - 1)
+    for hand in hands:
+        distribution = play_distribution(hand, k=4)
+        assert distribution.best.asdict() == brute_force_optimize(hand).asdict()
+        scores = sorted((score for score, count in distribution.histogram.items() for _ in range(count)), reverse=True)
+        assert [score.score for score in distribution.top] == scores[:4]
+        assert distribution.nplays == 2 ** len([card for card in hand if not card.is_joker])
+
+def test_play_distribution_ties():
+    """Equally scoring plays are kept in the order brute force finds them"""
+    cards = [Card('3♠'), Card('3♣'), Card('3♥')]
+    distribution = play_distribution(cards, k=4)
+    assert [score.played for score in distribution.top] == [
+        [Card('3♠'), Card('3♣'), Card('3♥')], [Card('3♠'), Card('3♣')], [Card('3♠'), Card('3♥')], [Card('3♣'), Card('3♥')]
+    ]
+    assert distribution.noptimal == 1
+    with pytest.raises(ValueError):
+        play_distribution(cards, k=0)
+
+@pytest.mark.parametrize("cards, expected_score_info", test_data)
+def test_gray_code_optimize(cards, expected_score_info):
+    """The Gray code optimizer finds the same best hand as the brute force optimizer"""
+    opt = gray_code_optimize(cards)
+    assert opt.asdict() == brute_force_optimize(cards).asdict()
+    assert opt.score == expected_score_info.score
+
+def test_gray_code_optimize_random_with_jokers():
+    hands = add_jokers(random_generator(max_hand_size=9, n=150, seed=21), 0, 3, len(JOKERS) - 1)
+    for hand in hands:
+        assert gray_code_optimize(hand).asdict() == brute_force_optimize(hand).asdict()
+
+def test_gray_code_optimize_banned_cards():
+    """Cards removed by banned rank and banned suit jokers are never played"""
+    banned_two = Card("🂿 Banned Two: Played cards with rank 2 will be ignored in poker hand determination and scoring")
+    banned_heart = find_joker_name("Banned Heart").to_card()
+    cards = [Card("2♥"), Card("2♦"), Card("2♠"), Card("3♥"), Card("3♦"), Card("3♠"), Card("5♥"), Card("9♥")]
+    for jokers in [[banned_two], [banned_heart], [banned_two, banned_heart]]:
+        assert gray_code_optimize(jokers + cards).asdict() == brute_force_optimize(jokers + cards).asdict()
+    assert all(card.suit != "♥" for card in gray_code_optimize([banned_heart] + cards).played)
+
+def test_gray_code_optimize_uncompilable_jokers(monkeypatch):
+    """Jokers that can't be compiled fall back to brute force"""
+    monkeypatch.setattr("ballmatro.optimizer.compiled_played_cards", lambda jokers: None)
+    cards = [Card("🂿 Banned Two: Played cards with rank 2 will be ignored in poker hand determination and scoring"), Card("2♥"), Card("3♦"), Card("3♠")]
+    assert gray_code_optimize(cards).asdict() == brute_force_optimize(cards).asdict()
+
+@pytest.mark.parametrize("cards, expected_score_info", test_data)
+def test_polynomial_optimize(cards, expected_score_info):
+    """The polynomial optimizer finds the same best hand as the brute force optimizer"""
+    opt = polynomial_optimize(cards)
+    assert opt.asdict() == brute_force_optimize(cards).asdict()
+    assert opt.score == expected_score_info.score
+
+def test_polynomial_optimize_random_with_planets():
+    """Jokers that only change the values of the poker hands are supported, and the rest fall back to branch and bound"""
+    for max_joker_id in [46, len(JOKERS) - 1]:
+        hands = add_jokers(random_generator(max_hand_size=9, n=150, seed=24), 0, 3, max_joker_id)
+        for hand in hands:
+            assert polynomial_optimize(hand).asdict() == gray_code_optimize(hand).asdict()
+
+JUPITER = "🂿 Jupiter: Multiplies by 2 the chips and multiplier of the Flush hand"
+SATURN = "🂿 Saturn: Multiplies by 2 the chips and multiplier of the Straight hand"
+
+@pytest.mark.parametrize("cards, hand", [
+    ("[A♠,K♠,Q♠,J♠,10♠,2♠,3♥]", "Straight Flush"),  # The best five spades are a straight flush
+    ("[K♠,K♠,K♠,A♠,A♠,2♠,3♠]", "Full House"),  # The best five spades are a full house
+    (f"[{JUPITER},{JUPITER},A♠x,K♠,Q♠+,J♠,10♠,9♠,2♠,2♠]", "Flush"),
+    (f"[{JUPITER},K♠,K♠,K♠,A♠,A♠,K♠,2♠,2♥]", "Flush"),
+    (f"[{SATURN},{SATURN},2♥,3♥,4♦,5♠,6♥,2♥,3♥,4♥,5♥,6♦]", "Straight"),  # The first cards of each rank are all hearts
+])
+def test_polynomial_optimize_suits(cards, hand):
+    """Flushes and straights that are not made of the best cards of each suit or rank are found"""
+    cards = parse_card_list(cards)
+    opt = polynomial_optimize(cards)
+    assert opt.asdict() == gray_code_optimize(cards).asdict()
+    assert opt.hand.name == hand
+
+def test_polynomial_optimize_large_hands():
+    """Hands too large for brute force agree with branch and bound"""
+    rng = random.Random(24)
+    for ncards in [12, 16, 20]:
+        cards = rng.sample(CARDS, ncards)
+        assert polynomial_optimize(cards).asdict() == branch_and_bound_optimize(cards).asdict()
+    assert polynomial_optimize(list(CARDS)).hand.name == "Straight Flush"
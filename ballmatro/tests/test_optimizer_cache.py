@@ -0,0 +1,90 @@
+import random
+
+from ballmatro.card import Card
+from ballmatro.generators import add_jokers, add_optimal_plays, random_generator
+from ballmatro.jokers.factory import JOKERS
+from ballmatro.optimizer import brute_force_optimize, cross_check_optimize
+from ballmatro.optimizer_cache import OptimizerCache, canonical_key
+
+
+def test_canonical_key_ignores_card_order():
+    joker = Card("🂿 Pluto: Multiplies by 2 the chips and multiplier of the High Card hand")
+    assert canonical_key([Card("2♥"), joker, Card("A♠")]) == canonical_key([Card("A♠"), Card("2♥"), joker])
+
+def test_canonical_key_keeps_joker_order():
+    pluto = Card("🂿 Pluto: Multiplies by 2 the chips and multiplier of the High Card hand")
+    shard = Card(f"🂿 {JOKERS[-1].name}: {JOKERS[-1].description}")
+    assert canonical_key([pluto, shard, Card("A♠")]) != canonical_key([shard, pluto, Card("A♠")])
+
+def test_cache_hits_reordered_input():
+    cache = OptimizerCache()
+    cards = [Card("2♥"), Card("3♦"), Card("2♠"), Card("A♣")]
+    assert cache.optimize(cards).asdict() == brute_force_optimize(cards).asdict()
+    assert (cache.hits, cache.misses) == (0, 1)
+    reordered = [Card("A♣"), Card("2♠"), Card("3♦"), Card("2♥")]
+    score = cache.optimize(reordered)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert score.played == [Card("2♠"), Card("2♥")]
+    assert score.asdict() == brute_force_optimize(reordered).asdict()
+
+def test_cache_lru_eviction():
+    cache = OptimizerCache(maxsize=1)
+    cache.optimize([Card("2♥")])
+    cache.optimize([Card("3♥")])
+    assert len(cache) == 1
+    assert cache.lookup([Card("2♥")]) is None
+    assert cache.lookup([Card("3♥")]) is not None
+
+def test_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cards = [Card("2♥"), Card("2♦"), Card("K♠")]
+    with OptimizerCache(path) as cache:
+        expected = cache.optimize(cards)
+    with OptimizerCache(path, optimizer=None) as cache:
+        assert len(cache) == 1
+        assert cache.optimize(list(reversed(cards))).score == expected.score
+        assert cache.hits == 1
+
+def test_cache_scores_match_brute_force():
+    """Cached optimal plays have the optimal score, for random hands with jokers and repeated inputs"""
+    hands = list(add_jokers(random_generator(max_hand_size=5, n=100, seed=3), 0, 2, len(JOKERS) - 1))
+    random.seed(3)
+    for hand in list(hands):
+        jokers = [card for card in hand if card.is_joker]
+        cards = [card for card in hand if not card.is_joker]
+        hands.append(jokers + random.sample(cards, len(cards)))
+    cache = OptimizerCache()
+    for hand, score in add_optimal_plays(hands, cache=cache):
+        assert score.score == brute_force_optimize(hand).score
+    assert cache.hits >= 100
+    assert cache.hits + cache.misses == 200
+
+def test_cache_with_workers():
+    hands = list(random_generator(max_hand_size=4, n=30, seed=5)) * 2
+    cached = [score.asdict() for _, score in add_optimal_plays(hands, workers=2, shard_size=8, cache=OptimizerCache())]
+    assert cached == [score.asdict() for _, score in add_optimal_plays(hands)]
+
+def test_cache_cleared_when_scoring_changes(tmp_path, monkeypatch):
+    """Plays stored with other scoring rules are discarded when the store is opened"""
+    path = str(tmp_path / "cache.sqlite")
+    cards = [Card("2♥"), Card("2♦"), Card("K♠")]
+    with OptimizerCache(path) as cache:
+        cache.optimize(cards)
+    with OptimizerCache(path) as cache:
+        assert len(cache) == 1
+    monkeypatch.setattr("ballmatro.optimizer_cache.scoring_fingerprint", lambda: "changed rules")
+    with OptimizerCache(path) as cache:
+        assert len(cache) == 0
+        assert cache.lookup(cards) is None
+
+def test_cache_not_looked_up_when_cross_checking():
+    """Every hand is checked by the cross-check optimizer, even if it is cached"""
+    hands = list(random_generator(max_hand_size=4, n=10, seed=7))
+    cache = OptimizerCache()
+    list(add_optimal_plays(hands, cache=cache))
+    list(add_optimal_plays(hands, optimizer="cross-check", cache=cache))
+    assert cache.hits == 0
+    cache = OptimizerCache(optimizer=cross_check_optimize)
+    cache.optimize(hands[0])
+    cache.optimize(hands[0])
+    assert cache.hits == 0
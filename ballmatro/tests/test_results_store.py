@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+from datasets import Dataset
+
+from ballmatro.results_store import ResultsStore, convert_json_results
+from ballmatro.score import ScoreDataset, scoring_fingerprint
+
+BENCHMARKS_FOLDER = Path(__file__).parents[2] / "benchmarks"
+
+@pytest.fixture
+def results():
+    dataset = Dataset.from_dict({"input": ["[3♥,3♦,A♠]", "[2♥]", "[4♣,5♣]"], "score": [32, 7, 9]})
+    return ScoreDataset(dataset, ["[3♥,3♦]", "[2♥,2♥]", "not a list of cards"]).asdict()
+
+def test_results_store_roundtrip(tmp_path, results):
+    """Runs are read back in the same format they were written"""
+    store = ResultsStore(str(tmp_path))
+    store.write("level1", "model-a", results)
+    assert store.read("level1", "model-a") == results
+    with pytest.raises(ValueError):
+        store.read("level1", "model-b")
+
+def test_results_store_scoring_fingerprint(tmp_path, results):
+    """The scoring fingerprint of reprocessed results is kept in the manifest"""
+    store = ResultsStore(str(tmp_path))
+    store.write("level1", "model-a", {**results, "scoring_fingerprint": scoring_fingerprint()})
+    assert store.read("level1", "model-a") == {**results, "scoring_fingerprint": scoring_fingerprint()}
+    assert store.manifest().column("scoring_fingerprint").to_pylist() == [scoring_fingerprint()]
+
+def test_results_store_manifest(tmp_path, results):
+    """The manifest holds the totals of each run, and rewriting a run replaces its row"""
+    store = ResultsStore(str(tmp_path))
+    assert store.manifest().num_rows == 0
+    for level in ["level1", "level2"]:
+        for model in ["model-a", "model-b"]:
+            store.write(level, model, results)
+    store.write("level1", "model-a", results)
+    manifest = store.manifest()
+    assert manifest.column("level").to_pylist() == ["level1", "level1", "level2", "level2"]
+    assert manifest.column("hands").to_pylist() == [3] * 4
+    assert manifest.column("total_score").to_pylist() == [results["total_score"]] * 4
+    summary = store.manifest(levels=["level2"], models=["model-b"]).to_pylist()
+    assert [(row["level"], row["model"]) for row in summary] == [("level2", "model-b")]
+
+def test_results_store_hands(tmp_path, results):
+    """Only the selected runs and columns are loaded, with dictionary encoded cards"""
+    store = ResultsStore(str(tmp_path))
+    store.write("level1", "model-a", results)
+    store.write("level1", "model-b", results)
+    store.write("level2", "model-a", results)
+    hands = store.hands(models=["model-a"], columns=["input", "score"])
+    assert hands.column_names == ["input", "score", "level", "model"]
+    assert hands.column("level").to_pylist() == ["level1"] * 3 + ["level2"] * 3
+    assert hands.column("score").to_pylist() == [score["score"] for score in results["scores"]] * 2
+    assert pa.types.is_dictionary(hands.schema.field("input").type.value_type)
+    assert store.hands(levels=["level3"]) is None
+
+def test_convert_json_results(tmp_path):
+    """Benchmark JSON files are converted without losing information"""
+    paths = sorted(BENCHMARKS_FOLDER.glob("level1_*.json"))[:3]
+    store = ResultsStore(str(tmp_path / "store"))
+    assert convert_json_results(paths, store) == 3
+    for path in paths:
+        level, model = path.stem.split("_", 1)
+        with open(path, "r", encoding="utf-8") as f:
+            assert store.read(level, model) == json.load(f)
+    (tmp_path / "results.json").write_text("{}")
+    with pytest.raises(ValueError):
+        convert_json_results([str(tmp_path / "results.json")], store)
@@ -1,7 +1,9 @@
-from ballmatro.card import Card
-from ballmatro.hands import InvalidPlay, EmptyHand, NoPokerHand
-from ballmatro.score import Score, ScoreDataset
+from ballmatro.card import Card, parse_card_list
+from ballmatro.jokers.planets import Pluto
+from ballmatro.hands import HAND_TYPES, InvalidPlay, EmptyHand, NoPokerHand
+from ballmatro.score import Score, ScoreDataset, ScoringContext, StreamingScoreDataset, score_batch, scoring_fingerprint, streamed_asdict
 from datasets import Dataset
+import pytest
 
 ### Score Tests
 
@@ -206,6 +208,42 @@ def test_score_asdict_invalid_format_backticks_plaintext():
     assert score_dict["multiplier"] == 0
     assert score_dict["score"] == 0
 
+### Batch scoring Tests
+
+def test_score_batch_matches_score():
+    inputs = [
+        "[3♥,3♦,A♠]",
+        "[3♥,3♦,A♠]",
+        "[2♥,3♦,A♠]",
+        "[3♥,3♦]",
+        "[2♥,2♦,2♠,🂿 Pluto: Multiplies by 2 the chips and multiplier of the High Card hand]",
+        "[A♥x,K♥+,Q♥,J♥,10♥,🂿 Banned Red: All cards of red suits (♦, ♥) are not scored]",
+        "[3♥,3♦",
+    ]
+    plays = [
+        "[3♥,3♦]",
+        [Card("A♠")],
+        "[2♥,A♠]",
+        "[A♠]",
+        "[2♥]",
+        "[A♥x,K♥+,Q♥,J♥,10♥]",
+        "[3♥]",
+    ]
+    batch = score_batch(inputs, plays)
+    assert len(batch) == len(inputs)
+    for i, (input, played) in enumerate(zip(inputs, plays)):
+        score = Score(input, played)
+        assert batch.chips[i] == score.chips
+        assert batch.multiplier[i] == score.multiplier
+        assert batch.score[i] == score.score
+        assert batch.hand(i) is type(score.hand)
+        assert HAND_TYPES[batch.hand_id[i]] is type(score.hand)
+        assert batch.invalid[i] == isinstance(score.hand, (NoPokerHand, InvalidPlay))
+
+def test_score_batch_length_mismatch():
+    with pytest.raises(ValueError):
+        score_batch(["[3♥,3♦]"], [])
+
 ### ScoreDataset Tests
 
 def test_scoredataset_all_valid():
@@ -293,3 +331,85 @@ def test_scoredataset_asdict():
     assert isinstance(d["scores"], list)
     assert d["scores"][0]["score"] == 32
     assert d["scores"][1]["score"] == 8
+
+def test_scoredataset_lazy_scores():
+    data = {
+        "input": ["[3♥,3♦]", "[2♥,3♦]", "[2♥,3♦]"],
+        "score": [32, 8, 8],
+    }
+    ds = Dataset.from_dict(data)
+    plays = ["[3♥,3♦]", "[3♦]", "[A♠]"]
+    score_dataset = ScoreDataset(dataset=ds, plays=plays)
+    assert len(score_dataset.scores) == 3
+    assert score_dataset.scores[0] is score_dataset.scores[0]
+    assert score_dataset.scores[-1].asdict() == Score("[2♥,3♦]", "[A♠]").asdict()
+    assert [score.score for score in score_dataset.scores] == list(score_dataset.batch.score)
+    assert [score.asdict() for score in score_dataset.scores[1:]] == [Score(input, play).asdict() for input, play in zip(data["input"][1:], plays[1:])]
+
+def test_scoring_fingerprint():
+    """The fingerprint of the scoring rules is a stable short hash"""
+    fingerprint = scoring_fingerprint()
+    assert len(fingerprint) == 16
+    assert int(fingerprint, 16) >= 0
+    scoring_fingerprint.cache_clear()
+    assert scoring_fingerprint() == fingerprint
+
+@pytest.mark.parametrize("played", [
+    "[2♥,2♦]",  # Valid play
+    "[2♥,5♠,9♦]",  # No poker hand
+    "[2♥,K♠]",  # Card not available
+    "[]",  # Empty play
+    "[2♥,2♥]",  # More copies than available
+    [Pluto().to_card(), Card("2♥")],  # Played jokers are not active
+    [Pluto().to_card(), Pluto().to_card()],  # More copies of a joker than available
+])
+def test_scoring_context(played):
+    """Plays scored over a scoring context get the same scores as with Score"""
+    input = [Pluto().to_card(), Card("2♥"), Card("2♦"), Card("5♠"), Card("9♦")]
+    context = ScoringContext(input)
+    score = Score(input, played)
+    assert context.score(parse_card_list(played) if isinstance(played, str) else played) == score.score
+    assert Score(input, played, context).asdict() == score.asdict()
+
+def test_streaming_scoredataset():
+    """Streamed scores have the same statistics as ScoreDataset, which can be rebuilt from the rows sent to the sink"""
+    data = {
+        "input": ["[3♥,3♦]", "[2♥,3♦]", "[2♥,3♦]", "[2♥,3♦]"],
+        "score": [32, 8, 8, 8],
+    }
+    ds = Dataset.from_dict(data)
+    plays = ["[3♥,3♦]", "[3♦]", "[A♠]", "Not a play"]
+    expected = ScoreDataset(dataset=ds, plays=plays).asdict()
+    for dataset in [ds, ds.to_iterable_dataset()]:
+        rows = []
+        streamed = StreamingScoreDataset(dataset, iter(plays), sink=rows.append)
+        assert streamed.nrows == 4
+        assert (streamed.total_score, streamed.total_normalized_score, streamed.invalid_hands, streamed.normalized_invalid_hands) == (
+            expected["total_score"], expected["total_normalized_score"], expected["invalid_hands"], expected["normalized_invalid_hands"]
+        )
+        assert streamed_asdict(rows) == expected
+    # Rows can also be given as (input, reference score, play) tuples
+    streamed = StreamingScoreDataset(zip(data["input"], data["score"], plays))
+    assert (streamed.total_score, streamed.invalid_hands) == (expected["total_score"], expected["invalid_hands"])
+
+def test_streaming_scoredataset_length_mismatch():
+    ds = Dataset.from_dict({"input": ["[2♥]", "[3♦]"], "score": [7, 8]})
+    with pytest.raises(ValueError):
+        StreamingScoreDataset(ds, ["[2♥]"])
+    with pytest.raises(ValueError):
+        StreamingScoreDataset(ds, ["[2♥]", "[3♦]", "[3♦]"])
+
+def test_streaming_scoredataset_missing_plays():
+    """Rows of a dataset require their plays"""
+    ds = Dataset.from_dict({"input": ["[2♥]", "[3♦]"], "score": [7, 8]})
+    with pytest.raises(ValueError, match="Plays must be given"):
+        StreamingScoreDataset(ds)
+
+def test_streaming_scoredataset_empty():
+    streamed = StreamingScoreDataset([])
+    assert (streamed.nrows, streamed.total_score, streamed.total_normalized_score) == (0, 0, 0.0)
+    assert (streamed.invalid_hands, streamed.normalized_invalid_hands) == (0, 0.0)
+    assert streamed_asdict([]) == {
+        "total_score": 0, "total_normalized_score": 0.0, "invalid_hands": 0, "normalized_invalid_hands": 0.0,
+        "scores": [], "normalized_scores": [],
+    }
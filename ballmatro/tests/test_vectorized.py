@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from ballmatro.card import CARDS, Card
+from ballmatro.generators import add_jokers, random_generator
+from ballmatro.hands import HAND_TYPES, find_hand
+from ballmatro.jokers.factory import JOKERS, find_joker_card
+from ballmatro.optimizer import brute_force_optimize
+from ballmatro.score import Score
+from ballmatro.tests.helpers import RunningChipsJoker
+
+# The vectorized optimizer is only available if NumPy is installed
+np = pytest.importorskip("numpy")
+
+from ballmatro.vectorized import PAD, classify_hands, encode_plays, score_plays, vectorized_optimize  # noqa: E402
+
+
+def test_encode_plays():
+    card_ids = encode_plays([[Card("2♣"), Card("A♥")], [], [Card("3♦")]])
+    assert card_ids.shape == (3, 2)
+    assert card_ids.tolist() == [[Card("2♣").id, Card("A♥").id], [PAD, PAD], [Card("3♦").id, PAD]]
+
+def test_encode_plays_joker():
+    with pytest.raises(ValueError):
+        encode_plays([[JOKERS[0]().to_card()]])
+
+def test_classify_hands_matches_find_hand():
+    random.seed(0)
+    plays = [random.choices(CARDS, k=random.randint(0, 6)) for _ in range(5000)]
+    plays += [[Card("10♥"), Card("J♥"), Card("Q♥"), Card("K♥"), Card("A♥")], [Card("2♥"), Card("2♦"), Card("2♠"), Card("3♣"), Card("3♥")]]
+    hand_ids = classify_hands(encode_plays(plays, width=6))
+    assert [HAND_TYPES[i] for i in hand_ids] == [type(find_hand(play)) for play in plays]
+
+def test_score_plays_differential():
+    """Scores are identical to the ones of Score, for random plays and lists of jokers"""
+    random.seed(1)
+    for _ in range(100):
+        jokers = [joker_class().to_card() for joker_class in random.choices(JOKERS, k=random.randint(0, 3))]
+        plays = [random.choices(CARDS, k=random.randint(0, 6)) for _ in range(50)]
+        chips, multiplier, score, hand_ids = score_plays(encode_plays(plays), [find_joker_card(joker) for joker in jokers])
+        assert chips.dtype == multiplier.dtype == score.dtype == np.int64
+        for i, play in enumerate(plays):
+            expected = Score(jokers + play, play)
+            assert (chips[i], multiplier[i], score[i]) == (expected.chips, expected.multiplier, expected.score)
+            assert HAND_TYPES[hand_ids[i]] is type(expected.hand)
+
+def test_score_plays_unsupported_jokers():
+    with pytest.raises(ValueError):
+        score_plays(encode_plays([[Card("2♥")]]), [RunningChipsJoker()])
+
+def test_vectorized_optimize_matches_brute_force():
+    hands = add_jokers(random_generator(max_hand_size=7, n=100, seed=2), 0, 3, len(JOKERS) - 1)
+    for hand in hands:
+        assert vectorized_optimize(hand).asdict() == brute_force_optimize(hand).asdict()
@@ -0,0 +1,114 @@
+"""Vectorized scoring of batches of plays using NumPy.
+
+Plays are encoded as fixed-width arrays of card ids, padded with PAD. All the plays in a batch are scored with the same
+list of jokers, which must be compilable (see Joker.compile_card_score and Joker.compile_played_cards). All the jokers
+in ballmatro.jokers.factory.JOKERS are.
+
+The caller is responsible of checking that the played cards were available, and joker cards can't be encoded as played
+cards. Within those limits, the results are identical to the ones of Score.
+"""
+from itertools import combinations
+from typing import List, Tuple
+
+import numpy as np
+
+from ballmatro.card import CARDS, RANKS, SUITS, Card
+from ballmatro.hands import (
+    HAND_TYPES, EmptyHand, Flush, FourOfAKind, FullHouse, HighCard, NoPokerHand, Pair, Straight,
+    StraightFlush, ThreeOfAKind, TwoPair
+)
+from ballmatro.jokers.factory import find_joker_card
+from ballmatro.jokers.joker import Joker, compiled_card_scores, compiled_hand_values, compiled_played_cards
+from ballmatro.score import Score
+
+PAD = -1  # Card id used to pad plays with fewer cards than the array width
+
+_CARD_RANKS = np.array([card.rank_numeric for card in CARDS])
+_CARD_SUITS = np.array([SUITS.index(card.suit) for card in CARDS])
+_HAND_IDS = {hand_type: i for i, hand_type in enumerate(HAND_TYPES)}
+
+def encode_plays(plays: List[List[Card]], width: int = None) -> np.ndarray:
+    """Encodes a list of plays as an array of card ids of shape (len(plays), width), padded with PAD.
+
+    If width is None, the length of the longest play is used. Raises a ValueError if a play contains a joker card.
+    """
+    if width is None:
+        width = max((len(play) for play in plays), default=0)
+    card_ids = np.full((len(plays), width), PAD, dtype=np.int64)
+    for i, play in enumerate(plays):
+        for j, card in enumerate(play):
+            if card.is_joker:
+                raise ValueError(f"Joker card {card} can't be encoded as a played card")
+            card_ids[i, j] = card.id
+    return card_ids
+
+def classify_hands(card_ids: np.ndarray) -> np.ndarray:
+    """Classifies each row of card ids into a poker hand, returning the index of each poker hand in HAND_TYPES"""
+    valid = card_ids != PAD
+    safe_ids = np.where(valid, card_ids, 0)
+    ranks = _CARD_RANKS[safe_ids]
+    suits = _CARD_SUITS[safe_ids]
+    ncards = valid.sum(axis=1)
+    # Histograms of ranks and suits of each play
+    rank_counts = ((ranks[:, :, None] == np.arange(len(RANKS))) & valid[:, :, None]).sum(axis=1)
+    suit_counts = ((suits[:, :, None] == np.arange(len(SUITS))) & valid[:, :, None]).sum(axis=1)
+    distinct_ranks = (rank_counts > 0).sum(axis=1)
+    max_rank_count = rank_counts.max(axis=1, initial=0)
+    rank_span = np.where(valid, ranks, -1).max(axis=1, initial=-1) - np.where(valid, ranks, len(RANKS)).min(axis=1, initial=len(RANKS))
+
+    flush = (ncards == 5) & (suit_counts.max(axis=1, initial=0) == 5)
+    straight = (ncards == 5) & (distinct_ranks == 5) & (rank_span == 4)
+    # Conditions in the order of priority of POKER_HANDS, the first one that holds determines the hand
+    conditions = [
+        (straight & flush, StraightFlush),
+        ((ncards == 4) & (distinct_ranks == 1), FourOfAKind),
+        ((ncards == 5) & (distinct_ranks == 2) & (max_rank_count == 3), FullHouse),
+        (flush, Flush),
+        (straight, Straight),
+        ((ncards == 3) & (distinct_ranks == 1), ThreeOfAKind),
+        ((ncards == 4) & (distinct_ranks == 2) & (max_rank_count == 2), TwoPair),
+        ((ncards == 2) & (distinct_ranks == 1), Pair),
+        (ncards == 1, HighCard),
+        (ncards == 0, EmptyHand),
+    ]
+    return np.select([condition for condition, _ in conditions], [_HAND_IDS[hand] for _, hand in conditions], default=_HAND_IDS[NoPokerHand])
+
+def score_plays(card_ids: np.ndarray, jokers: List[Joker] = ()) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Scores a batch of plays encoded as card ids (see encode_plays), all of them with the same list of jokers.
+
+    Returns the arrays of chips, multiplier, score and hand id (index in HAND_TYPES) of each play. Raises a ValueError
+    if the jokers can't be compiled.
+    """
+    card_scores = compiled_card_scores(jokers)
+    kept_cards = compiled_played_cards(jokers)
+    if card_scores is None or kept_cards is None:
+        raise ValueError(f"Jokers {[joker.name for joker in jokers]} are not supported by the vectorized backend")
+    card_chips = np.array([chips for chips, _ in card_scores] + [0], dtype=np.int64)
+    card_multipliers = np.array([multiplier for _, multiplier in card_scores] + [0], dtype=np.int64)
+    # Cards removed by the jokers are replaced by padding, which is stored at the end of the tables above
+    kept = np.array(list(kept_cards) + [False])
+    card_ids = np.where(card_ids == PAD, len(CARDS), card_ids)
+    card_ids = np.where(kept[card_ids], card_ids, len(CARDS))
+
+    hand_values = compiled_hand_values(jokers)
+    hand_chips = np.array([hand_values[hand_type].chips for hand_type in HAND_TYPES], dtype=np.int64)
+    hand_multipliers = np.array([hand_values[hand_type].multiplier for hand_type in HAND_TYPES], dtype=np.int64)
+    # Jokers could change the type of the hand, so hand ids are also mapped to the type after applying them
+    hand_types = np.array([_HAND_IDS[hand_values[hand_type].hand_type] for hand_type in HAND_TYPES])
+    hand_ids = classify_hands(np.where(card_ids == len(CARDS), PAD, card_ids))
+
+    scored = hand_ids < _HAND_IDS[NoPokerHand]
+    chips = np.where(scored, hand_chips[hand_ids] + card_chips[card_ids].sum(axis=1), 0)
+    multiplier = np.where(scored, hand_multipliers[hand_ids] + card_multipliers[card_ids].sum(axis=1), 0)
+    return chips, multiplier, chips * multiplier, hand_types[hand_ids]
+
+def vectorized_optimize(cards: List[Card]) -> Score:
+    """Find the best hand in a given set of cards by scoring all the possible plays at once with score_plays.
+
+    Plays are enumerated in the same order as brute_force_optimize, so the choice among equally scoring plays is the same.
+    """
+    jokers = [find_joker_card(card) for card in cards if card.is_joker]
+    non_joker_cards = [card for card in cards if not card.is_joker]
+    plays = [play for size in range(len(non_joker_cards) + 1) for play in combinations(non_joker_cards, size)]
+    _, _, scores, _ = score_plays(encode_plays(plays, width=len(non_joker_cards)), jokers)
+    return Score(cards, list(plays[int(np.argmax(scores))]))
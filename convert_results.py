@@ -0,0 +1,19 @@
+"""Tool to convert JSON benchmark results files into a columnar results store"""
+
+import argparse
+
+from ballmatro.results_store import ResultsStore, convert_json_results
+
+
+def main(files: list, store: str):
+    """Add the given JSON results files to a results store"""
+    nruns = convert_json_results(files, ResultsStore(store))
+    print(f"Converted {nruns} runs into {store}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JSON benchmark results files into a columnar results store")
+    parser.add_argument("files", type=str, nargs="+", help="JSON results files to convert, named as level_model.json, as in the benchmarks folder.")
+    parser.add_argument("--store", type=str, help="Directory of the results store. Runs already in the store are replaced.", default="benchmarks_store")
+    args = parser.parse_args()
+    main(args.files, args.store)
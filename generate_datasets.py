@@ -1,20 +1,31 @@
 """Main function to generate datasets of Ballmatro hands and plays"""
 import argparse
+from contextlib import nullcontext
 
 from ballmatro.jokers.factory import JOKERS
-from ballmatro.generators import GENERATION_ALGORITHMS, add_jokers, add_optimal_plays, to_hf_dataset
+from ballmatro.generators import DATASET_SCHEMA, DISTRIBUTION_SCHEMA, GENERATION_ALGORITHMS, add_jokers, add_optimal_plays, expand_suit_orbits, generator_to_parquet_split, is_suit_symmetric, to_hf_dataset
+from ballmatro.optimizer import OPTIMIZERS
+from ballmatro.optimizer_cache import OptimizerCache
 
-def main(algorithm: str, hand_size: int, n: int, rng: int, min_n_jokers: int, max_n_jokers: int, jokers_max_id: int):
+def main(algorithm: str, hand_size: int, n: int, rng: int, min_n_jokers: int, max_n_jokers: int, jokers_max_id: int, optimizer: str = "brute-force", workers: int = 1, in_memory: bool = False, cache: str = None, suit_symmetry: bool = False, top_k: int = 0):
     """Main function to generate datasets of Ballmatro hands and plays"""
     # Check inputs
     if algorithm not in GENERATION_ALGORITHMS:
         raise ValueError(f"Unknown algorithm: {algorithm}. Available algorithms: {list(GENERATION_ALGORITHMS.keys())}")
     if min_n_jokers < 0 or max_n_jokers < min_n_jokers:
         raise ValueError(f"Invalid joker range: {min_n_jokers} - {max_n_jokers}")
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer: {optimizer}. Available optimizers: {list(OPTIMIZERS.keys())}")
+    if suit_symmetry and algorithm != "exhaustive":
+        raise ValueError("Suit symmetry can only be used with exhaustive generation")
+    if suit_symmetry and min_n_jokers > 0 and not is_suit_symmetric(jokers_max_id):
+        raise ValueError(f"Suit symmetry can't be used with jokers that depend on suits, found in jokers with IDs up to {jokers_max_id}")
+    if top_k < 0:
+        raise ValueError(f"Invalid number of top plays: {top_k}")
     # Adjust parameters
     if algorithm == "exhaustive":
         # For exhaustive generation, n is ignored and hand_size is used directly
-        params = {"max_hand_size": hand_size}
+        params = {"max_hand_size": hand_size, "suit_representatives": suit_symmetry}
     else:
         params = {"max_hand_size": hand_size, "n": n, "seed": rng}
     # Generate the dataset
@@ -22,15 +33,25 @@ def main(algorithm: str, hand_size: int, n: int, rng: int, min_n_jokers: int, ma
     # Add jokers if specified
     if min_n_jokers > 0:
         generator = add_jokers(generator, min_n_jokers, max_n_jokers, jokers_max_id)
-    generator = add_optimal_plays(generator)
-    dataset = to_hf_dataset(generator)
+    # Optimal plays are only cached if asked for, since hands with the same cards in another order might get another of
+    # their optimal plays from the cache than the one the optimizer would choose
+    with OptimizerCache(cache) if cache is not None else nullcontext() as optimizer_cache:
+        # If top_k is given, the best plays and the histogram of scores of each hand are stored as extra columns
+        generator = add_optimal_plays(generator, optimizer, workers=workers, cache=optimizer_cache, top_k=top_k)
+        schema = DISTRIBUTION_SCHEMA if top_k > 0 else DATASET_SCHEMA
+        if suit_symmetry:
+            # Recover the hands left out of the generation by permuting the suits of the optimized ones
+            generator = expand_suit_orbits(generator)
 
-    # Split dataset evenly into train and test sets
-    dataset = dataset.train_test_split(test_size=0.5, seed=rng)
-
-    # Save the dataset to compressed CSV files
-    dataset["train"].to_parquet("train.parquet")
-    dataset["test"].to_parquet("test.parquet")
+        if in_memory:
+            # Split dataset evenly into train and test sets
+            dataset = to_hf_dataset(generator, schema)
+            dataset = dataset.train_test_split(test_size=0.5, seed=rng)
+            dataset["train"].to_parquet("train.parquet")
+            dataset["test"].to_parquet("test.parquet")
+        else:
+            # Stream the dataset evenly into train and test parquet files
+            generator_to_parquet_split(generator, ["train.parquet", "test.parquet"], [0.5, 0.5], seed=rng, schema=schema)
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate datasets of Ballmatro hands and plays")
@@ -41,5 +62,11 @@ if __name__ == "__main__":
     parser.add_argument("--min_n_jokers", type=int, help="Minimum number of jokers to add to each hand", default=0)
     parser.add_argument("--max_n_jokers", type=int, help="Maximum number of jokers to add to each hand", default=0)
     parser.add_argument("--jokers_max_id", type=int, help="Limit range of jokers to include in the generation to include only jokers with IDs between 0 and the given number (inclusive).", default=len(JOKERS)-1)
+    parser.add_argument("--optimizer", type=str, help=f"Optimizer used to find the optimal plays, must be one of {list(OPTIMIZERS.keys())}. The cross-check optimizer checks that branch and bound agrees with brute force.", default="brute-force")
+    parser.add_argument("--workers", type=int, help="Number of processes used to find the optimal plays. The generated dataset is the same for any number of workers.", default=1)
+    parser.add_argument("--in_memory", action="store_true", help="Build the whole dataset in memory and split it with Hugging Face datasets, instead of streaming it to the output files.")
+    parser.add_argument("--cache", type=str, help="SQLite file used to cache optimal plays across runs. Hands with the same cards and jokers as a cached one are not optimized again, and might get a different optimal play than the optimizer would choose for them when there are ties. If not given, no cache is used.", default=None)
+    parser.add_argument("--suit_symmetry", action="store_true", help="For exhaustive generation, optimize only one hand for each set of hands that only differ in a permutation of the suits, and obtain the optimal plays of the rest by permuting the suits. All hands in such a set get the same jokers. Not available for jokers that depend on suits.")
+    parser.add_argument("--top_k", type=int, help="If positive, also store the given number of best plays of each hand and the histogram of the scores of all its plays as extra columns. Requires scoring every play of each hand, and the optimal play is then the best of them, so the optimizer is not used.", default=0)
     args = parser.parse_args()
-    main(args.alg, args.len, args.n, args.rng, args.min_n_jokers, args.max_n_jokers, args.jokers_max_id)
+    main(args.alg, args.len, args.n, args.rng, args.min_n_jokers, args.max_n_jokers, args.jokers_max_id, args.optimizer, args.workers, args.in_memory, args.cache, args.suit_symmetry, args.top_k)
@@ -1,14 +1,23 @@
 """Functions to try to solve a Ballmatro dataset using a GPT model."""
 
+import asyncio
+from collections import Counter, deque
+import json
 import logging
 import os
+import random
 import re
+import time
 
-from ballmatro.score import Score, ScoreDataset
+from ballmatro.card import parse_card_list
+from ballmatro.hands import InvalidPlay, NoPokerHand
+from ballmatro.jokers.factory import find_joker_card
+from ballmatro.score import Score, ScoreDataset, _play_hand, _score_cards
 
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
 from peft import LoraConfig, get_peft_model, TaskType
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
 from trl import GRPOConfig, GRPOTrainer, SFTConfig, SFTTrainer
 
 
@@ -26,38 +35,142 @@ ALTERNATIVE_CHAT_TEMPLATES = {
     "Qwen3": "gpt/chat_templates/qwen3",
 }
 
-def gpt_attempt_ballmatro_dataset(dataset: list[dict], model: str = "gpt-4o") -> list[str]:
+def gpt_attempt_ballmatro_dataset(
+        dataset: list[dict],
+        model: str = "gpt-4o",
+        concurrency: int = 8,
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        base_url: str = None,
+        api_key: str = None,
+        checkpoint: str = None,
+    ) -> ScoreDataset:
     """Use a GPT model to attempt to solve a Ballmatro dataset.
 
-    Returns a list of responses from the model for each item in the dataset.
+    Requests to the OpenAI API are sent concurrently, with at most concurrency requests in flight, and within the
+    given requests and tokens per minute budgets (unlimited if None). Requests failing with a rate limit (429),
+    server (5xx) or connection error are retried up to max_retries times, with exponential backoff starting at
+    initial_backoff seconds. base_url and api_key can be used to point the client to any OpenAI compatible endpoint.
+    If a checkpoint file is given, each response is appended to it as soon as it is received, and the items already
+    answered in the checkpoint are not requested again (see EvaluationCheckpoint).
+
+    Returns the scores of the responses from the model for each item in the dataset, in dataset order.
     """
-    openai = OpenAI()
+    with EvaluationCheckpoint(dataset, checkpoint) as evaluation:
+        asyncio.run(_gpt_attempt_ballmatro_dataset(
+            evaluation, model, concurrency, RateLimiter(requests_per_minute, tokens_per_minute), max_retries, initial_backoff,
+            AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+        ))
+    return ScoreDataset(dataset, evaluation.responses())
+
+async def _gpt_attempt_ballmatro_dataset(evaluation: "EvaluationCheckpoint", model: str, concurrency: int, limiter: "RateLimiter", max_retries: int, initial_backoff: float, client: AsyncOpenAI):
+    """Sends the requests for all the dataset items still pending in the evaluation, adding the responses as they arrive"""
     system_prompt = build_system_prompt()
-    responses = []
-    for i, data in enumerate(dataset):
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": data["input"]}
-            ]
-        )
-        content = response.choices[0].message.content
-        LOGGER.info(f"({i+1}/{len(dataset)}): {data['input']} -> {content}")
-        # Append the response content to the list
-        responses.append(content)
-    return ScoreDataset(dataset, responses)
+    semaphore = asyncio.Semaphore(concurrency)
 
-def hf_attempt_ballmatro_dataset(dataset: list[dict], model_name: str, max_new_tokens: int = 16384) -> list[str]:
+    async def attempt(i: int):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": evaluation.dataset[i]["input"]}
+        ]
+        async with semaphore:
+            content = await _chat_completion(client, limiter, model, messages, max_retries, initial_backoff)
+        evaluation.add(i, content)
+
+    try:
+        await asyncio.gather(*[attempt(i) for i in evaluation.pending()])
+    finally:
+        await client.close()
+
+async def _chat_completion(client: AsyncOpenAI, limiter: "RateLimiter", model: str, messages: list[dict], max_retries: int, initial_backoff: float) -> str:
+    """Requests a chat completion, retrying with exponential backoff on rate limit, server and connection errors"""
+    estimated_tokens = sum(len(message["content"]) for message in messages) // 4
+    for attempt in range(max_retries + 1):
+        request = await limiter.acquire(estimated_tokens)
+        try:
+            response = await client.chat.completions.create(model=model, messages=messages)
+        except (APIStatusError, APIConnectionError) as e:
+            status_code = getattr(e, "status_code", None)
+            if (status_code is not None and status_code != 429 and status_code < 500) or attempt == max_retries:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = initial_backoff * 2 ** attempt * (1 + random.random())
+            LOGGER.warning(f"Request failed with {type(e).__name__} (status {status_code}), retrying in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+        else:
+            if response.usage is not None:
+                limiter.record(request, response.usage.total_tokens)
+            return response.choices[0].message.content
+
+def _retry_after(error: Exception) -> float:
+    """Returns the delay in seconds requested by the server in the Retry-After header of an error response, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """Limits the requests and tokens sent per minute, keeping track of the requests sent in the last minute.
+
+    Tokens of a request are unknown until it is answered, so an estimate is used when acquiring the request, which can
+    be replaced by the actual amount with record. A budget of None means no limit.
+    """
+
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, window: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._requests = deque()  # [time, tokens] of each request sent in the current window
+        self._lock = None  # Created on first use, so that it belongs to the running event loop
+
+    async def acquire(self, tokens: int) -> list:
+        """Waits until a request of the given tokens fits in the budgets, and registers it"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._requests and self._requests[0][0] <= now - self.window:
+                    self._requests.popleft()
+                requests_fit = self.requests_per_minute is None or len(self._requests) < self.requests_per_minute
+                tokens_fit = (
+                    self.tokens_per_minute is None
+                    or len(self._requests) == 0  # A single request over the budget is still sent when the window is empty
+                    or sum(used for _, used in self._requests) + tokens <= self.tokens_per_minute
+                )
+                if requests_fit and tokens_fit:
+                    request = [now, tokens]
+                    self._requests.append(request)
+                    return request
+                await asyncio.sleep(self._requests[0][0] + self.window - now)
+
+    def record(self, request: list, tokens: int):
+        """Replaces the estimated tokens of a request by the tokens it actually used"""
+        request[1] = tokens
+
+def hf_attempt_ballmatro_dataset(dataset: list[dict], model_name: str, max_new_tokens: int = 16384, batch_size: int = 8, checkpoint: str = None) -> list[str]:
     """Use a Hugging Face model to attempt to solve a Ballmatro dataset.
 
+    Prompts are generated in batches of batch_size, grouping prompts of similar tokenized length to minimize padding.
+    If a checkpoint file is given, each response is appended to it as soon as it is generated, and the items already
+    answered in the checkpoint are not generated again (see EvaluationCheckpoint).
+
     Returns a list of responses from the model for each item in the dataset.
     """
     model = AutoModelForCausalLM.from_pretrained(
         model_name,
         device_map="auto",  # Automatically loads the model into the GPU, if one is available
     )
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Decoder-only models must be padded on the left for batched generation
+    tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
 
     # Load alternative chat template if it exists
     for registered_template_prefix in ALTERNATIVE_CHAT_TEMPLATES.keys():
@@ -66,36 +179,141 @@ def hf_attempt_ballmatro_dataset(dataset: list[dict], model_name: str, max_new_t
             with open(ALTERNATIVE_CHAT_TEMPLATES[registered_template_prefix], "r") as f:
                 tokenizer.template = f.read()
 
-    generation_pipeline = pipeline(
-        "text-generation",
-        model=model,
-        tokenizer=tokenizer,
-        max_new_tokens=max_new_tokens,
+    system_prompt = build_system_prompt()
+    with EvaluationCheckpoint(dataset, checkpoint) as evaluation:
+        conversations = {
+            i: [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": dataset[i]["input"]}
+            ]
+            for i in evaluation.pending()
+        }
+        # Sort the examples by prompt length, so that each batch needs as little padding as possible
+        lengths = {i: len(tokenizer(_render_prompt(tokenizer, conversation), add_special_tokens=False)["input_ids"]) for i, conversation in conversations.items()}
+        order = sorted(conversations, key=lambda i: lengths[i])
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            responses = _generate_batch(model, tokenizer, [conversations[i] for i in batch], max_new_tokens)
+            if _is_thinking_model(model_name):
+                # If chain of thought is unfinished, continue generation forcing final response, in a second batched pass
+                unfinished = [j for j, response in enumerate(responses) if not _thinking_finished(response)]
+                if unfinished:
+                    LOGGER.warning(f"Model {model_name} did not finish thinking for {len(unfinished)} examples. Forcing generation to end.")
+                    prefixes = {j: responses[j] + "\n" + _thinking_model_finisher(model_name) for j in unfinished}
+                    try:
+                        continued = _generate_batch(model, tokenizer, [conversations[batch[j]] + [{"role": "assistant", "content": prefixes[j]}] for j in unfinished], max_new_tokens)
+                        for j, continuation in zip(unfinished, continued):
+                            responses[j] = prefixes[j] + continuation
+                    except Exception as e:
+                        LOGGER.error(f"Error occurred while forcing generation to end: {e}")
+                        for j in unfinished:
+                            responses[j] = ""
+                responses = [_remove_chain_of_thought(response) for response in responses]
+            for i, response in zip(batch, responses):
+                evaluation.add(i, response)
+
+    return ScoreDataset(dataset, evaluation.responses())
+
+def _render_prompt(tokenizer: AutoTokenizer, conversation: list[dict]) -> str:
+    """Renders a conversation with the chat template. Conversations ending in an assistant message are continued from it"""
+    return tokenizer.apply_chat_template(
+        conversation,
+        tokenize=False,
+        add_generation_prompt=conversation[-1]["role"] != "assistant",
+        continue_final_message=conversation[-1]["role"] == "assistant",
     )
 
-    system_prompt = build_system_prompt()
-    responses = []
-    for i, data in enumerate(dataset):
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": data["input"]}
-        ]
-        result = generation_pipeline(messages)[0]["generated_text"][-1]["content"]
-        # If thinking model but chain of thought is unfinished, continue generation forcing final response
-        if _is_thinking_model(model_name) and not _thinking_finished(result):
+def _generate_batch(model: AutoModelForCausalLM, tokenizer: AutoTokenizer, conversations: list[list[dict]], max_new_tokens: int) -> list[str]:
+    """Generates the responses to a batch of conversations at once, returning only the generated text of each one"""
+    prompts = [_render_prompt(tokenizer, conversation) for conversation in conversations]
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, add_special_tokens=False).to(model.device)
+    with torch.no_grad():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id)
+    return tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+class EvaluationCheckpoint:
+    """Append-only JSONL file with the responses of a model to the items of a dataset, used to resume interrupted evaluations.
+
+    Each line holds the index of an item in the dataset, its input, the response of the model, and the score of the
+    response, so that partial results can be inspected while the evaluation runs. Running totals are also logged as
+    responses are added. If no path is given, responses are only kept in memory.
+    """
+
+    def __init__(self, dataset: list[dict], path: str = None):
+        self.dataset = dataset
+        self.path = path
+        self.total_score = 0
+        self.total_normalized_score = 0.0
+        self.invalid_hands = 0
+        self._responses = {}
+        self._file = None
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        """Reads the responses in the checkpoint file, dropping a last line left incomplete by an interrupted run"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        valid_length = 0
+        for n, line in enumerate(lines):
             try:
-                LOGGER.warning(f"Model {model_name} did not finish thinking. Forcing generation to end.")
-                messages.append({"role": "assistant", "content": result + "\n" + _thinking_model_finisher(model_name)})
-                result = generation_pipeline(messages)[0]["generated_text"][-1]["content"]
-            except Exception as e:
-                LOGGER.error(f"Error occurred while forcing generation to end: {e}")
-                result = ""
-        if _is_thinking_model(model_name):
-            result = _remove_chain_of_thought(result)
-        LOGGER.info(f"({i+1}/{len(dataset)}): {data['input']} -> {result}")
-        # Append the response content to the list
-        responses.append(result)
-    return ScoreDataset(dataset, responses)
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if n == len(lines) - 1:
+                    LOGGER.warning(f"Dropping incomplete last line of checkpoint {self.path}")
+                    break
+                raise ValueError(f"Invalid line {n + 1} in checkpoint {self.path}")
+            if not isinstance(entry["index"], int) or not 0 <= entry["index"] < len(self.dataset):
+                raise ValueError(f"Checkpoint {self.path} has index {entry['index']} out of the dataset, of length {len(self.dataset)}")
+            if entry["input"] != self.dataset[entry["index"]]["input"]:
+                raise ValueError(f"Checkpoint {self.path} does not match the dataset at index {entry['index']}")
+            self._register(entry["index"], entry["response"], entry["score"], entry["hand"])
+            valid_length += len(line.encode("utf-8"))
+        with open(self.path, "r+", encoding="utf-8") as f:
+            f.truncate(valid_length)
+        LOGGER.info(f"Resuming from checkpoint {self.path} with {len(self._responses)}/{len(self.dataset)} responses")
+
+    def __enter__(self):
+        if self.path is not None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def pending(self) -> list[int]:
+        """Indices of the dataset items without a response yet"""
+        return [i for i in range(len(self.dataset)) if i not in self._responses]
+
+    def add(self, index: int, response: str):
+        """Scores the response to a dataset item, and appends it to the checkpoint"""
+        data = self.dataset[index]
+        score = Score(data["input"], response)
+        self._register(index, response, score.score, score.hand.name)
+        if self._file is not None:
+            entry = {"index": index, "input": data["input"], "response": response, "score": score.score, "hand": score.hand.name}
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+        LOGGER.info(
+            f"({len(self._responses)}/{len(self.dataset)}): {data['input']} -> {response} "
+            f"[total score {self.total_score}, mean normalized score {self.total_normalized_score / len(self._responses):.4f}, invalid hands {self.invalid_hands}]"
+        )
+
+    def _register(self, index: int, response: str, score: int, hand: str):
+        """Keeps a response in memory and updates the running totals"""
+        self._responses[index] = response
+        self.total_score += score
+        self.total_normalized_score += score / self.dataset[index]["score"]
+        self.invalid_hands += hand in (NoPokerHand.name, InvalidPlay.name)
+
+    def responses(self) -> list[str]:
+        """Responses for all the dataset items, in dataset order"""
+        if len(self._responses) != len(self.dataset):
+            raise ValueError(f"Only {len(self._responses)} of {len(self.dataset)} dataset items have a response")
+        return [self._responses[i] for i in range(len(self.dataset))]
 
 def _is_thinking_model(model_name: str) -> bool:
     """Tries to identify by its name if a Hugging Face model is a thinking model. Returns False for unknown models"""
@@ -199,6 +417,68 @@ def hf_stf_ballmatro_dataset(dataset: list[dict], model_name: str, output_model_
 
     return model
 
+class BallmatroReward:
+    """Reward function for GRPO training, scoring completions against an index of the training inputs.
+
+    Every input of the dataset is parsed once, into the card ids of its non-joker cards, its jokers and its optimal score,
+    and indexed by its text, which is the content of the user message of each prompt. Completions are stripped of their
+    chain of thought and scored against the index, and the reward is the score normalized by the optimal score.
+    Identical completions to the same prompt, common within a GRPO group, are only scored once per call.
+    """
+
+    def __init__(self, dataset: list[dict]):
+        self.__name__ = "ballmatro_reward"  # Name used by the trainer for logging the reward
+        self._index = {}
+        for data in dataset:
+            if data["input"] not in self._index:
+                cards = parse_card_list(data["input"])
+                ids = Counter(card.id for card in cards if not card.is_joker)
+                jokers = [find_joker_card(card) for card in cards if card.is_joker]
+                self._index[data["input"]] = (ids, jokers, data["score"])
+
+    def __call__(self, prompts: list, completions: list, **kwargs) -> list[float]:
+        """Calculate the reward for each prompt-completion pair.
+
+        Prompts and completions can be conversations, as used in GRPO training, or plain texts.
+        """
+        keys = [
+            (_user_content(prompt), completion if isinstance(completion, str) else completion[-1]["content"])
+            for prompt, completion in zip(prompts, completions)
+        ]
+        rewards = {key: self.reward(*key) for key in set(keys)}
+        return [rewards[key] for key in keys]
+
+    def reward(self, input: str, completion: str) -> float:
+        """Score of a completion to an indexed input, normalized by the optimal score of the input"""
+        return self.score(input, completion) / self._index[input][2]
+
+    def score(self, input: str, completion: str) -> int:
+        """Score of a completion to an indexed input, the same as Score(input, completion).score.
+
+        Raises a ValueError if the input is not in the index.
+        """
+        if input not in self._index:
+            raise ValueError(f"Input {input} is not in the training dataset")
+        ids, jokers, _ = self._index[input]
+        try:
+            played = parse_card_list(_remove_chain_of_thought(completion))
+        except ValueError:
+            return 0
+        if any(card.is_joker for card in played):
+            # Playing a joker disables it, so the jokers of the input do not apply
+            return Score(input, played).score
+        if any(count > ids[id] for id, count in Counter(card.id for card in played).items()):
+            return 0
+        played, hand = _play_hand(played, jokers)
+        chips, multiplier = _score_cards(hand, played, jokers)
+        return chips * multiplier
+
+def _user_content(prompt) -> str:
+    """Content of the last user message of a conversation, or the prompt itself if it is a plain text"""
+    if isinstance(prompt, str):
+        return prompt
+    return next(message["content"] for message in reversed(prompt) if message["role"] == "user")
+
 def hf_grpo_ballmatro_dataset(dataset: list[dict], model_name: str, output_model_path: str, **training_kwargs) -> AutoModelForCausalLM:
     """Trains a Hugging Face model on a BaLLMatro dataset using Group Relative Policy Optimization.
 
@@ -223,14 +503,6 @@ def hf_grpo_ballmatro_dataset(dataset: list[dict], model_name: str, output_model
         }
     )
 
-    # Reward function
-    def ballmatro_reward(prompts, completions, score, **kwargs):
-        """Calculate the reward for each prompt-completion pair."""
-        return [
-            Score(prompt[0]["content"], _remove_chain_of_thought(completion[0]["content"])).score / s
-            for prompt, completion, s in zip(prompts, completions, score)
-        ]
-
     training_args = GRPOConfig(
         beta=0,  # Do not include a Kullback-Leibler divergence to reference model penalty. This way we reduce memory usage and promote exploration
         logging_steps=25,  # Show logs every 25 steps
@@ -245,7 +517,7 @@ def hf_grpo_ballmatro_dataset(dataset: list[dict], model_name: str, output_model
 
     trainer = GRPOTrainer(
         model=model,  # Base model to fine-tune
-        reward_funcs=ballmatro_reward,  # Reward functions
+        reward_funcs=BallmatroReward(dataset),  # Reward functions
         train_dataset=formatted_train,  # Training dataset
         args=training_args,  # GPROConfig object prepared above
     )
@@ -1,6 +1,18 @@
 """Tests for the GPT module."""
 
-from gpt.gpt import _is_thinking_model, _remove_chain_of_thought, _thinking_finished, build_system_prompt
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from datasets import Dataset
+import pytest
+
+from ballmatro.card import parse_card_list
+from ballmatro.generators import add_jokers, random_generator
+from ballmatro.score import Score
+from gpt.gpt import BallmatroReward, EvaluationCheckpoint, RateLimiter, _is_thinking_model, _remove_chain_of_thought, _thinking_finished, build_system_prompt, gpt_attempt_ballmatro_dataset, hf_attempt_ballmatro_dataset
 
 def test_build_system_prompt():
     """Test the build_system_prompt function."""
@@ -36,3 +48,247 @@ def test_remove_chain_of_thought():
     assert _remove_chain_of_thought("5") == "5"
     assert _remove_chain_of_thought("This is a test without any thinking markers") == "This is a test without any thinking markers"
     assert _remove_chain_of_thought("</think>") == ""
+
+class _StubChatCompletions(BaseHTTPRequestHandler):
+    """Stub of the OpenAI chat completions endpoint, which answers each hand with the play given in the server answers.
+
+    The first request for each hand is rejected with a 429 error, to exercise the retries.
+    """
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        hand = request["messages"][-1]["content"]
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            first_attempt = hand not in server.seen
+            server.seen.add(hand)
+            server.requests += 1
+        time.sleep(0.05)
+        with server.lock:
+            server.in_flight -= 1
+        if first_attempt:
+            self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}, {"retry-after": "0.01"})
+            return
+        self._reply(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": server.answers[hand]}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    """Runs the stub chat completions server in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubChatCompletions)
+    server.lock = threading.Lock()
+    server.in_flight = server.max_in_flight = 0
+    server.seen = set()
+    server.requests = 0
+    server.answers = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_gpt_attempt_ballmatro_dataset_stub_server(stub_server):
+    """Responses are retried after 429 errors and scored in dataset order, with bounded concurrency"""
+    dataset = Dataset.from_dict({
+        "input": ["[3♥,3♦,A♠]", "[2♥,3♦]", "[K♠,K♥,2♦]", "[4♣]", "[5♦,5♠]", "[A♥,A♦,A♣]"],
+        "score": [32, 8, 40, 9, 40, 93],
+    })
+    stub_server.answers = {
+        "[3♥,3♦,A♠]": "[3♥,3♦]",
+        "[2♥,3♦]": "[3♦]",
+        "[K♠,K♥,2♦]": "[K♠,K♥]",
+        "[4♣]": "[4♣]",
+        "[5♦,5♠]": "[5♦,5♠]",
+        "[A♥,A♦,A♣]": "[A♥,A♦,A♣]",
+    }
+    results = gpt_attempt_ballmatro_dataset(
+        dataset,
+        "gpt-stub",
+        concurrency=2,
+        initial_backoff=0.01,
+        base_url=f"http://127.0.0.1:{stub_server.server_port}/v1",
+        api_key="stub",
+    )
+    assert [score.played for score in results.scores] == [parse_card_list(stub_server.answers[input]) for input in dataset["input"]]
+    assert results.invalid_hands == 0
+    assert 1 <= stub_server.max_in_flight <= 2
+
+def test_rate_limiter_requests_per_minute():
+    """Requests over the budget wait until the window frees up"""
+    async def run():
+        limiter = RateLimiter(requests_per_minute=2, window=0.2)
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire(1)
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.2
+
+def test_rate_limiter_tokens_per_minute():
+    async def run():
+        limiter = RateLimiter(tokens_per_minute=100, window=0.2)
+        start = time.monotonic()
+        request = await limiter.acquire(10)
+        limiter.record(request, 100)  # The request used more tokens than estimated, and exhausts the budget
+        await limiter.acquire(10)
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.2
+
+def _save_tiny_model(path: str):
+    """Saves a tiny randomly initialized Llama model with a word level tokenizer, that runs quickly on CPU"""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    words = ["<unk>", "<pad>", "<s>", "</s>", "system", "user", "assistant", ":", "[", "]", ",", "</think>"]
+    words += ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A", "♣", "♦", "♠", "♥"]
+    backend = Tokenizer(models.WordLevel({word: i for i, word in enumerate(words)}, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="<unk>", pad_token="<pad>", bos_token="<s>", eos_token="</s>")
+    tokenizer.chat_template = (
+        "{% for message in messages %}{{ message['role'] }} : {{ message['content'] }}\n{% endfor %}"
+        "{% if add_generation_prompt %}assistant : {% endif %}"
+    )
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(words), hidden_size=16, intermediate_size=32, num_hidden_layers=2, num_attention_heads=2,
+        num_key_value_heads=2, max_position_embeddings=8192, pad_token_id=1, bos_token_id=2, eos_token_id=3,
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+@pytest.fixture(scope="module")
+def ballmatro_test_dataset():
+    return Dataset.from_dict({
+        "input": ["[3♥,3♦,A♠]", "[2♥]", "[K♠,K♥,2♦,10♣,J♣]", "[4♣,5♣]", "[5♦]"],
+        "score": [32, 7, 60, 9, 10],
+    })
+
+def test_hf_attempt_ballmatro_dataset_batched(tmp_path, ballmatro_test_dataset):
+    """Batched generation with left padding produces the same responses as generating one example at a time"""
+    _save_tiny_model(str(tmp_path))
+    batched = hf_attempt_ballmatro_dataset(ballmatro_test_dataset, str(tmp_path), max_new_tokens=5, batch_size=3)
+    unbatched = hf_attempt_ballmatro_dataset(ballmatro_test_dataset, str(tmp_path), max_new_tokens=5, batch_size=1)
+    assert len(batched.scores) == len(ballmatro_test_dataset)
+    assert [score.asdict() for score in batched.scores] == [score.asdict() for score in unbatched.scores]
+
+def test_hf_attempt_ballmatro_dataset_thinking_continuation(tmp_path, monkeypatch, ballmatro_test_dataset):
+    """Unfinished chains of thought of thinking models are continued in a second batched pass"""
+    path = tmp_path / "tiny-Qwen3"
+    _save_tiny_model(str(path))
+    passes = []
+    def generate_batch(model, tokenizer, conversations, max_new_tokens):
+        """First passes never finish thinking, and continuations play all the input cards"""
+        passes.append(conversations)
+        if conversations[0][-1]["role"] != "assistant":
+            return ["<think>Looking at the cards"] * len(conversations)
+        return [conversation[1]["content"] for conversation in conversations]
+    monkeypatch.setattr("gpt.gpt._generate_batch", generate_batch)
+    results = hf_attempt_ballmatro_dataset(ballmatro_test_dataset, str(path), max_new_tokens=3, batch_size=2)
+    # Each batch of 2 examples is generated once, and then continued in a second pass
+    assert [len(conversations) for conversations in passes] == [2, 2, 2, 2, 1, 1]
+    for conversations in passes[1::2]:
+        assert all(conversation[-1] == {"role": "assistant", "content": "<think>Looking at the cards\n</think>"} for conversation in conversations)
+    assert [score.played for score in results.scores] == [parse_card_list(data["input"]) for data in ballmatro_test_dataset]
+
+def test_evaluation_checkpoint_resume(tmp_path, ballmatro_test_dataset):
+    """Responses are appended to the checkpoint as they are added, and loaded back when resuming"""
+    path = str(tmp_path / "checkpoint.jsonl")
+    with EvaluationCheckpoint(ballmatro_test_dataset, path) as evaluation:
+        evaluation.add(1, "[2♥]")
+        evaluation.add(3, "[A♠]")
+        assert evaluation.pending() == [0, 2, 4]
+        assert evaluation.invalid_hands == 1
+    with open(path, "r", encoding="utf-8") as f:
+        assert [json.loads(line)["index"] for line in f] == [1, 3]
+    resumed = EvaluationCheckpoint(ballmatro_test_dataset, path)
+    assert resumed.pending() == [0, 2, 4]
+    assert resumed.total_score == 7
+    with pytest.raises(ValueError):
+        resumed.responses()
+
+def test_evaluation_checkpoint_incomplete_last_line(tmp_path, ballmatro_test_dataset):
+    """A last line cut by an interrupted run is dropped, and new responses are appended after the valid ones"""
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"index": 0, "input": "[3♥,3♦,A♠]", "response": "[3♥,3♦]", "score": 32, "hand": "Pair"}) + '\n{"index": 1, "inp', encoding="utf-8")
+    with EvaluationCheckpoint(ballmatro_test_dataset, str(path)) as evaluation:
+        assert evaluation.pending() == [1, 2, 3, 4]
+        evaluation.add(1, "[2♥]")
+    assert [json.loads(line)["index"] for line in path.read_text(encoding="utf-8").splitlines()] == [0, 1]
+
+def test_evaluation_checkpoint_other_dataset(tmp_path, ballmatro_test_dataset):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"index": 0, "input": "[2♣]", "response": "[2♣]", "score": 7, "hand": "High Card"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        EvaluationCheckpoint(ballmatro_test_dataset, str(path))
+
+@pytest.mark.parametrize("index", [5, -1])
+def test_evaluation_checkpoint_index_out_of_dataset(tmp_path, ballmatro_test_dataset, index):
+    """Checkpoints of a larger dataset are rejected, naming the checkpoint file"""
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"index": index, "input": "[5♦]", "response": "[5♦]", "score": 10, "hand": "High Card"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="checkpoint.jsonl"):
+        EvaluationCheckpoint(ballmatro_test_dataset, str(path))
+
+def test_gpt_attempt_ballmatro_dataset_resume(stub_server, tmp_path):
+    """Resuming from a checkpoint only requests the items not answered yet, and scores all of them"""
+    dataset = Dataset.from_dict({"input": ["[2♥,3♦]", "[4♣]", "[5♦,5♠]"], "score": [8, 9, 40]})
+    stub_server.answers = {"[2♥,3♦]": "[3♦]", "[4♣]": "[4♣]", "[5♦,5♠]": "[5♦,5♠]"}
+    stub_server.seen = set(stub_server.answers)  # Do not reject any request
+    path = str(tmp_path / "checkpoint.jsonl")
+    with EvaluationCheckpoint(dataset, path) as evaluation:
+        evaluation.add(1, "[4♣]")
+    results = gpt_attempt_ballmatro_dataset(dataset, "gpt-stub", base_url=f"http://127.0.0.1:{stub_server.server_port}/v1", api_key="stub", checkpoint=path)
+    assert stub_server.requests == 2
+    assert [score.score for score in results.scores] == [8, 9, 40]
+
+def test_ballmatro_reward(ballmatro_test_dataset):
+    """Rewards are computed from the user message of each prompt, after removing the chain of thought"""
+    reward = BallmatroReward(ballmatro_test_dataset)
+    prompts = [
+        [{"role": "system", "content": build_system_prompt()}, {"role": "user", "content": "[3♥,3♦,A♠]"}],
+        [{"role": "system", "content": build_system_prompt()}, {"role": "user", "content": "[3♥,3♦,A♠]"}],
+        [{"role": "system", "content": build_system_prompt()}, {"role": "user", "content": "[3♥,3♦,A♠]"}],
+        [{"role": "system", "content": build_system_prompt()}, {"role": "user", "content": "[2♥]"}],
+    ]
+    completions = [
+        [{"role": "assistant", "content": "<think>A pair is best</think>[3♥,3♦]"}],
+        [{"role": "assistant", "content": "[A♠]"}],
+        [{"role": "assistant", "content": "[2♥]"}],
+        [{"role": "assistant", "content": "not a list of cards"}],
+    ]
+    assert reward(prompts, completions, score=[32, 32, 32, 7]) == [1.0, 16 / 32, 0.0, 0.0]
+    assert reward(["[2♥]"], ["[2♥]"]) == [1.0]
+    with pytest.raises(ValueError):
+        reward(["[2♣]"], ["[2♣]"])
+
+def test_ballmatro_reward_matches_score():
+    """Scores computed from the index are the same as those of Score, for valid and invalid plays"""
+    # Jokers from 78 onwards have commas in their rules, which can't be parsed from a list of cards
+    hands = list(add_jokers(random_generator(max_hand_size=5, n=100, seed=7), 0, 2, 77))
+    other_hands = list(random_generator(max_hand_size=3, n=100, seed=8))
+    dataset = Dataset.from_dict({"input": [str(hand) for hand in hands], "score": [1] * len(hands)})
+    reward = BallmatroReward(dataset)
+    for hand, other in zip(hands, other_hands):
+        for play in [hand[:2], hand[-3:], [card for card in hand if not card.is_joker][:4], other]:
+            assert reward.score(str(hand), str(play)) == Score(str(hand), str(play)).score
@@ -0,0 +1,187 @@
+"""Performance benchmarks of card parsing, hand detection, scoring and optimization.
+
+Each benchmark is a setup function, registered in BENCHMARKS, that prepares its inputs and returns the function to time.
+Timings are compared against a stored baseline, and a benchmark regresses when it is slower than its baseline by more
+than a relative threshold. Baselines store times relative to the REFERENCE benchmark, which does pure Python work
+unrelated to ballmatro, so that a baseline saved on a machine can be compared against runs on another one.
+"""
+import json
+import timeit
+from typing import Any, Callable, Dict, List
+
+from datasets import Dataset
+
+from ballmatro.card import CARDS, Card, parse_card_list, parse_input_cards
+from ballmatro.generators import add_jokers, add_optimal_plays, int2cards, random_generator
+from ballmatro.hands import (
+    EmptyHand, Flush, FourOfAKind, FullHouse, HighCard, NoPokerHand, Pair, Straight, StraightFlush, ThreeOfAKind,
+    TwoPair, find_hand
+)
+from ballmatro.jokers.factory import JOKERS
+from ballmatro.optimizer import brute_force_optimize, polynomial_optimize
+from ballmatro.score import Score, ScoreDataset
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+def benchmark(name: str):
+    """Decorator that registers a benchmark setup function under the given name"""
+    def register(setup: Callable[[], Callable[[], Any]]):
+        if name in BENCHMARKS:
+            raise ValueError(f"Duplicate benchmark name: {name}")
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+# Benchmark used as the unit of the times stored in baselines
+REFERENCE = "reference/python"
+
+@benchmark(REFERENCE)
+def _bench_reference():
+    words = [str(i) for i in range(1000)]
+    return lambda: sorted({word: len(word) for word in words}.items(), reverse=True)
+
+# Example plays of each hand type
+HAND_EXAMPLES = {
+    StraightFlush: "[2♥,3♥,4♥,5♥,6♥]",
+    FourOfAKind: "[7♣,7♦,7♠,7♥]",
+    FullHouse: "[K♣,K♦,K♠,2♥,2♦]",
+    Flush: "[2♠,5♠,9♠,J♠,A♠]",
+    Straight: "[8♣,9♦,10♠,J♥,Q♣]",
+    ThreeOfAKind: "[5♣,5♦,5♠]",
+    TwoPair: "[3♣,3♦,9♠,9♥]",
+    Pair: "[A♣,A♦]",
+    HighCard: "[Q♥]",
+    EmptyHand: "[]",
+    NoPokerHand: "[2♣,5♦,9♠]",
+}
+
+# Jokers of each family, in the order of JOKERS
+JOKER_FAMILIES = {
+    family: [joker for joker in JOKERS if joker.__module__ == f"ballmatro.jokers.{family}"]
+    for family in ["planets", "rankboosters", "suitboosters", "playedchangers"]
+}
+
+# Input and play used to benchmark scoring
+SCORED_INPUT = parse_card_list("[2♥,2♦,2♠,5♥x,7♥,9♥+,J♥,A♣]")
+SCORED_PLAY = parse_card_list("[2♥,5♥x,7♥,9♥+,J♥]")
+
+@benchmark("card/intern")
+def _bench_card_intern():
+    texts = [card.txt for card in CARDS]
+    return lambda: [Card(txt) for txt in texts]
+
+@benchmark("card/build")
+def _bench_card_build():
+    texts = [card.txt for card in CARDS]
+
+    def build():
+        for txt in texts:
+            card = object.__new__(Card)
+            card._build(txt)
+    return build
+
+@benchmark("parse_card_list/8-cards")
+def _bench_parse_card_list():
+    txt = str(SCORED_INPUT)
+    return lambda: parse_card_list(txt)
+
+@benchmark("parse_input_cards/8-cards")
+def _bench_parse_input_cards():
+    txt = str(SCORED_INPUT)
+    return lambda: parse_input_cards(txt)
+
+@benchmark("parse_card_list/8-cards-3-jokers")
+def _bench_parse_card_list_jokers():
+    txt = str([joker().to_card() for joker in JOKERS[1:4]] + SCORED_INPUT)
+    return lambda: parse_card_list(txt)
+
+for _hand_type, _example in HAND_EXAMPLES.items():
+    @benchmark(f"find_hand/{_hand_type.name}")
+    def _bench_find_hand(cards=parse_card_list(_example)):
+        return lambda: find_hand(cards)
+
+@benchmark("score/no-jokers")
+def _bench_score():
+    return lambda: Score(SCORED_INPUT, SCORED_PLAY)
+
+for _family, _jokers in JOKER_FAMILIES.items():
+    for _njokers in range(1, 4):
+        @benchmark(f"score/{_family}-{_njokers}")
+        def _bench_score_jokers(jokers=_jokers[:_njokers]):
+            cards = [joker().to_card() for joker in jokers] + SCORED_INPUT
+            return lambda: Score(cards, SCORED_PLAY)
+
+for _ncards in [4, 8, 9]:
+    @benchmark(f"brute_force_optimize/{_ncards}-cards")
+    def _bench_brute_force(ncards=_ncards):
+        cards = SCORED_INPUT[:ncards] + [Card("K♠")] * max(0, ncards - len(SCORED_INPUT))
+        return lambda: brute_force_optimize(cards)
+
+    @benchmark(f"brute_force_optimize/{_ncards}-cards-2-jokers")
+    def _bench_brute_force_jokers(ncards=_ncards):
+        cards = [JOKER_FAMILIES["planets"][0]().to_card(), JOKER_FAMILIES["rankboosters"][0]().to_card()]
+        cards += SCORED_INPUT[:ncards] + [Card("K♠")] * max(0, ncards - len(SCORED_INPUT))
+        return lambda: brute_force_optimize(cards)
+
+for _ncards in [9, 52]:
+    @benchmark(f"polynomial_optimize/{_ncards}-cards")
+    def _bench_polynomial(ncards=_ncards):
+        cards = list(CARDS[:ncards])
+        return lambda: polynomial_optimize(cards)
+
+@benchmark("int2cards/1000")
+def _bench_int2cards():
+    numbers = [(i * 7919) ** 3 for i in range(1, 1001)]
+    return lambda: [int2cards(i) for i in numbers]
+
+@benchmark("score_dataset/1000-rows")
+def _bench_score_dataset():
+    hands = add_jokers(random_generator(max_hand_size=5, n=1000, seed=0), 0, 2, len(JOKERS) - 1)
+    rows = [(str(cards), str(score.played), score.score) for cards, score in add_optimal_plays(hands, "branch-and-bound")]
+    dataset = Dataset.from_dict({"input": [row[0] for row in rows], "score": [row[2] for row in rows]})
+    plays = [row[1] for row in rows]
+    return lambda: ScoreDataset(dataset, plays)
+
+def run_benchmarks(names: List[str] = None, repeat: int = 20) -> Dict[str, float]:
+    """Run the given benchmarks, or all of them if None, returning the best time per call of each one in seconds.
+
+    Each benchmark is timed repeat times. Each round makes a tenth of the number of calls that timeit.autorange finds to
+    take at least 0.2 seconds, so rounds take at least about 20 ms. The fastest round is kept, which is the least affected
+    by other processes running in the machine.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}. Available benchmarks: {list(BENCHMARKS)}")
+        timer = timeit.Timer(BENCHMARKS[name]())
+        # Number of calls that take at least 0.2 seconds
+        number, _ = timer.autorange()
+        number = max(1, number // 10)
+        results[name] = min(timer.repeat(repeat=repeat, number=number)) / number
+    return results
+
+def relative_times(results: Dict[str, float]) -> Dict[str, float]:
+    """Times of a run relative to the time of the REFERENCE benchmark, which must be in the results"""
+    if REFERENCE not in results:
+        raise ValueError(f"Relative times require the results of the {REFERENCE} benchmark")
+    return {name: time / results[REFERENCE] for name, time in results.items()}
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float = 0.25) -> Dict[str, float]:
+    """Benchmarks slower than their baseline by more than the threshold, with their ratio of time to the baseline.
+
+    Results and baseline must be in the same units, such as the relative times of relative_times. Benchmarks without a
+    baseline are not compared.
+    """
+    ratios = {name: time / baseline[name] for name, time in results.items() if name in baseline}
+    return {name: ratio for name, ratio in ratios.items() if ratio > 1 + threshold}
+
+def load_baseline(path: str) -> Dict[str, float]:
+    """Load the relative times per call stored in a baseline file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(results: Dict[str, float], path: str):
+    """Store the relative times per call of a run as a baseline file"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, sort_keys=True)
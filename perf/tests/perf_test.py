@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pytest
+
+from perf.benchmarks import (
+    BENCHMARKS, HAND_EXAMPLES, REFERENCE, compare, load_baseline, relative_times, run_benchmarks, save_baseline
+)
+from ballmatro.card import parse_card_list
+from ballmatro.hands import find_hand
+
+def test_benchmarks_run():
+    """All the benchmarks can be set up and called"""
+    for setup in BENCHMARKS.values():
+        setup()()
+
+def test_hand_examples():
+    """The examples used to benchmark hand detection are of the expected hand type"""
+    for hand_type, example in HAND_EXAMPLES.items():
+        assert isinstance(find_hand(parse_card_list(example)), hand_type)
+
+def test_run_benchmarks():
+    results = run_benchmarks(["find_hand/Pair", "score/no-jokers"], repeat=2)
+    assert list(results) == ["find_hand/Pair", "score/no-jokers"]
+    assert all(time > 0 for time in results.values())
+    with pytest.raises(ValueError):
+        run_benchmarks(["unknown"])
+
+def test_compare():
+    """Only benchmarks slower than the baseline by more than the threshold are regressions"""
+    baseline = {"a": 1.0, "b": 1.0, "c": 1.0}
+    results = {"a": 1.2, "b": 1.5, "c": 0.5, "d": 10.0}
+    assert compare(results, baseline, threshold=0.25) == {"b": 1.5}
+    assert compare(results, baseline, threshold=0.1) == {"a": 1.2, "b": 1.5}
+
+def test_relative_times():
+    """Times are relative to the reference benchmark, which must have been run"""
+    assert relative_times({REFERENCE: 2e-6, "a": 1e-6, "b": 4e-6}) == {REFERENCE: 1.0, "a": 0.5, "b": 2.0}
+    with pytest.raises(ValueError):
+        relative_times({"a": 1e-6})
+
+def test_baseline_roundtrip(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    save_baseline({"a": 1e-6}, path)
+    assert load_baseline(path) == {"a": 1e-6}
+
+def test_stored_baseline():
+    """The stored baseline covers all the benchmarks, in times relative to the reference benchmark"""
+    baseline = load_baseline(str(Path(__file__).parents[1] / "baseline.json"))
+    assert set(baseline) == set(BENCHMARKS)
+    assert baseline[REFERENCE] == 1.0
@@ -1,18 +1,21 @@
 """Tool to compute again the optimal plays for a given dataset"""
 
 import argparse
+from contextlib import nullcontext
 from ballmatro.generators import add_optimal_plays, to_hf_dataset
 from datasets import load_dataset
 
 from ballmatro.card import parse_card_list
+from ballmatro.optimizer_cache import OptimizerCache
 
 
-def main(dataset: str):
+def main(dataset: str, cache: str = None):
     """Run the optimizer over a dataset of results to find the optimal plays, and recompute statistics"""
     ds = load_dataset("albarji/ballmatro", dataset)
 
-    train = optimize_dataset(ds["train"])
-    test = optimize_dataset(ds["test"])
+    with OptimizerCache(cache) if cache is not None else nullcontext() as optimizer_cache:
+        train = optimize_dataset(ds["train"], optimizer_cache)
+        test = optimize_dataset(ds["test"], optimizer_cache)
 
     for dataset_orig, dataset_new in [[ds["train"], train], [ds["test"], test]]:
         for data_orig, data_new in zip(dataset_orig, dataset_new):
@@ -23,14 +26,15 @@ def main(dataset: str):
     test.to_parquet("test.parquet")
 
 
-def optimize_dataset(dataset: list[dict]) -> list[dict]:
+def optimize_dataset(dataset: list[dict], cache: OptimizerCache = None) -> list[dict]:
     """Find the optimal plays for a given Hugging Face dataset fold"""
-    generator = add_optimal_plays([parse_card_list(data["input"]) for data in dataset])
+    generator = add_optimal_plays([parse_card_list(data["input"]) for data in dataset], cache=cache)
     return to_hf_dataset(generator)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the optimizer over a dataset to recompute the optimal plays")
     parser.add_argument("dataset", type=str, help="Hugging Face name of the dataset fold to process.")
+    parser.add_argument("--cache", type=str, help="SQLite file used to cache optimal plays across runs. If not given, no cache is used.", default=None)
     args = parser.parse_args()
-    main(args.dataset)
+    main(args.dataset, args.cache)
@@ -1,54 +1,115 @@
-"""Tool to compute again the optimal plays for a given file of results"""
+"""Tool to compute again the optimal plays for a file or a folder of results"""
 
 import argparse
 import json
+import os
 
 from ballmatro.card import Card
+from ballmatro.generators import add_optimal_plays
 from ballmatro.hands import InvalidPlay
-from ballmatro.score import Score
-from ballmatro.optimizer import brute_force_optimize
+from ballmatro.optimizer import OPTIMIZERS
+from ballmatro.optimizer_cache import OptimizerCache, canonical_key
+from ballmatro.score import Score, scoring_fingerprint
 
 
-def main(dataset: str, output: str):
-    """Run the optimizer over a dataset of results to find the optimal plays, and recompute statistics"""
-    with open(dataset, "r") as f:
-        json_data = json.load(f)
+def main(results: str, output: str, cache: str = None, workers: int = 1, optimizer: str = "branch-and-bound"):
+    """Run the optimizer over results files to find the optimal plays, and recompute statistics.
 
+    If results is a folder, all the JSON files in it are processed and saved with the same names in the output folder.
+    The optimal score of each distinct input is computed once for all the files. Each processed file records the scoring
+    fingerprint of the rules and optimizers it was processed with, and files already processed with the current ones are
+    saved unchanged. Files with another fingerprint are processed whole.
+    """
+    if os.path.isdir(results):
+        names = sorted(name for name in os.listdir(results) if name.endswith(".json"))
+        paths = {os.path.join(results, name): os.path.join(output, name) for name in names}
+        os.makedirs(output, exist_ok=True)
+    else:
+        paths = {results: output}
+    fingerprint = scoring_fingerprint()
+
+    json_data = {}
+    for path in paths:
+        with open(path, "r") as f:
+            json_data[path] = json.load(f)
+    pending = [path for path in paths if json_data[path].get("scoring_fingerprint") != fingerprint]
+
+    # Find the optimal score of every distinct input of the files to process, in parallel
+    inputs = {}
+    for path in pending:
+        for score_json in json_data[path]["scores"]:
+            if isinstance(score_json["input"], list):
+                cards = [Card(card) for card in score_json["input"]]
+                inputs.setdefault(canonical_key(cards), cards)
+    with OptimizerCache(cache) as optimizer_cache:
+        optimal_scores = {
+            canonical_key(cards): score.score
+            for cards, score in add_optimal_plays(inputs.values(), optimizer, workers=workers, cache=optimizer_cache)
+        }
+
+    for path, output_path in paths.items():
+        if path in pending:
+            report = reoptimize_results(json_data[path], optimal_scores)
+            json_data[path]["scoring_fingerprint"] = fingerprint
+            print(
+                f"{path}: {report['rescored']} of {report['rows']} plays rescored, {report['normalized']} normalized scores changed, "
+                f"{report['invalid']} plays now invalid, total normalized score {report['total_normalized_score_before']:.4f} -> {json_data[path]['total_normalized_score']:.4f}"
+            )
+        else:
+            print(f"{path}: already processed with the current scoring rules and optimizers, unchanged")
+        with open(output_path, "w") as f:
+            json.dump(json_data[path], f, indent=4)
+
+
+def reoptimize_results(json_data: dict, optimal_scores: dict) -> dict:
+    """Score again the plays of a results file, normalizing them by the given optimal scores, indexed by canonical key.
+
+    Updates the results in place, and returns the number of rows, of plays whose score changed, of normalized scores that
+    changed, and of plays now invalid but stored as valid, which are left unchanged.
+    """
+    report = {"rows": len(json_data["scores"]), "rescored": 0, "normalized": 0, "invalid": 0, "total_normalized_score_before": json_data["total_normalized_score"]}
     for i, score_json in enumerate(json_data["scores"]):
         if isinstance(score_json["input"], str):  # Input was not formatted correctly
             continue
         if isinstance(score_json["played"], str):  # Input was not formatted correctly
             continue
-        input = "[" + ",".join(score_json["input"]) + "]"
+        input = [Card(card) for card in score_json["input"]]
         played = "[" + ",".join(score_json["played"]) + "]"
         score = Score(input, played)
         if isinstance(score.hand, InvalidPlay):
             if score_json["hand"] != "Invalid Play":
                 print(score)
+                report["invalid"] += 1
             continue
-        input = [Card(card) for card in score_json["input"]]
-        score_json["remaining"] = [str(card) for card in score.remaining] if score.remaining else None
-        score_json["hand"] = str(score.hand.name)
-        score_json["chips"] = score.chips
-        score_json["multiplier"] = score.multiplier
-        score_json["score"] = score.score
-        opt = brute_force_optimize(input)
-        json_data["normalized_scores"][i] = score.score / opt.score
+        rescored = {
+            "remaining": [str(card) for card in score.remaining] if score.remaining else None,
+            "hand": str(score.hand.name),
+            "chips": score.chips,
+            "multiplier": score.multiplier,
+            "score": score.score,
+        }
+        if any(score_json[key] != value for key, value in rescored.items()):
+            report["rescored"] += 1
+            score_json.update(rescored)
+        normalized_score = score.score / optimal_scores[canonical_key(input)]
+        if json_data["normalized_scores"][i] != normalized_score:
+            report["normalized"] += 1
+            json_data["normalized_scores"][i] = normalized_score
 
     # Compute statistics
     json_data["total_score"] = sum(score["score"] for score in json_data["scores"])
     json_data["total_normalized_score"] = sum(json_data["normalized_scores"]) / len(json_data["normalized_scores"])
     json_data["invalid_hands"] = sum(1 for score in json_data["scores"] if score["hand"] in ["No Poker Hand", "Invalid Play"])
     json_data["normalized_invalid_hands"] = json_data["invalid_hands"] / len(json_data["scores"])
-
-    # Save the results
-    with open(output, "w") as f:
-        json.dump(json_data, f, indent=4)
+    return report
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Run the optimizer over a dataset of results to find the optimal plays, and recompute statistics")
-    parser.add_argument("dataset", type=str, help="Name of the results file to process.")
-    parser.add_argument("output", type=str, help="File to save the processed results")
+    parser = argparse.ArgumentParser(description="Run the optimizer over results files to find the optimal plays, and recompute statistics. Each processed file records the fingerprint of the scoring rules and optimizers, and files with the current fingerprint are left unchanged in later runs.")
+    parser.add_argument("results", type=str, help="Results file to process, or folder with the results files to process.")
+    parser.add_argument("output", type=str, help="File to save the processed results, or folder to save them if processing a folder.")
+    parser.add_argument("--cache", type=str, help="SQLite file used to cache optimal plays across runs, so that results of several models over the same dataset only need to be optimized once.", default=None)
+    parser.add_argument("--workers", type=int, help="Number of processes used to find the optimal plays.", default=1)
+    parser.add_argument("--optimizer", type=str, help=f"Optimizer used to find the optimal plays, must be one of {list(OPTIMIZERS.keys())}.", default="branch-and-bound")
     args = parser.parse_args()
-    main(args.dataset, args.output)
+    main(args.results, args.output, args.cache, args.workers, args.optimizer)
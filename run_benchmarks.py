@@ -0,0 +1,54 @@
+"""Tool to run the performance benchmarks, and check them against a stored baseline"""
+
+import argparse
+import sys
+
+from perf.benchmarks import BENCHMARKS, REFERENCE, compare, load_baseline, relative_times, run_benchmarks, save_baseline
+
+
+def main(baseline: str, filter: str = None, threshold: float = 0.25, repeat: int = 20, save: bool = False) -> int:
+    """Run the benchmarks matching the filter, and compare them against the baseline. Returns the number of regressions.
+
+    The reference benchmark always runs, and times are compared relative to it. Benchmarks that seem to regress are run
+    again, and only count as regressions if they are still slow, so that a transient load in the machine does not fail
+    the comparison.
+    """
+    names = [name for name in BENCHMARKS if name == REFERENCE or filter is None or filter in name]
+    results = run_benchmarks(names, repeat)
+    if save:
+        save_baseline({**_load_or_empty(baseline), **relative_times(results)}, baseline)
+        print(f"Saved {len(results)} benchmarks to {baseline}")
+        return 0
+    reference = _load_or_empty(baseline)
+    regressions = compare(relative_times(results), reference, threshold)
+    if regressions:
+        rerun = run_benchmarks([REFERENCE] + [name for name in regressions if name != REFERENCE], repeat)
+        results.update({name: min(results[name], time) for name, time in rerun.items()})
+        regressions = compare(relative_times(results), reference, threshold)
+    relative = relative_times(results)
+    for name, time in results.items():
+        ratio = f"{relative[name] / reference[name]:.2f}x" if name in reference else "no baseline"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:50s} {time * 1e6:14.2f} us  {ratio}{flag}")
+    if regressions:
+        print(f"{len(regressions)} benchmarks slower than their baseline by more than {threshold:.0%}")
+    return len(regressions)
+
+
+def _load_or_empty(path: str) -> dict:
+    """Load a baseline file, or return an empty baseline if it does not exist"""
+    try:
+        return load_baseline(path)
+    except FileNotFoundError:
+        return {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks, and check them against a stored baseline")
+    parser.add_argument("--baseline", type=str, help="JSON file with the baseline times per call of each benchmark, relative to the reference benchmark.", default="perf/baseline.json")
+    parser.add_argument("--filter", type=str, help="Run only the benchmarks whose name contains this text.", default=None)
+    parser.add_argument("--threshold", type=float, help="Relative slowdown over the baseline that counts as a regression.", default=0.25)
+    parser.add_argument("--repeat", type=int, help="Number of timing repetitions of each benchmark, of which the best one is kept.", default=20)
+    parser.add_argument("--save", action="store_true", help="Store the times of this run in the baseline file instead of comparing against it.")
+    args = parser.parse_args()
+    sys.exit(1 if main(args.baseline, args.filter, args.threshold, args.repeat, args.save) > 0 else 0)
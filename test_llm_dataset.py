@@ -3,11 +3,12 @@
 import argparse
 import json
 
+from ballmatro.results_store import ResultsStore
 from gpt.gpt import gpt_attempt_ballmatro_dataset, hf_attempt_ballmatro_dataset
 from datasets import load_dataset
 
 
-def main(dataset: str, model: str, output: str = None):
+def main(dataset: str, model: str, output: str = None, concurrency: int = 8, requests_per_minute: int = None, tokens_per_minute: int = None, base_url: str = None, batch_size: int = 8, checkpoint: str = None, store: str = None):
     """Main function to test an LLM against a Ballmatro dataset."""
     # Download the dataset from the Hugging Face Hub
     ds = load_dataset("albarji/ballmatro", dataset)
@@ -16,15 +17,25 @@ def main(dataset: str, model: str, output: str = None):
 
     # Run the model on the test set
     if model.startswith("gpt-") or model.startswith("o3-") or model.startswith("o4-"):
-        results = gpt_attempt_ballmatro_dataset(ds["test"], model)
+        results = gpt_attempt_ballmatro_dataset(
+            ds["test"],
+            model,
+            concurrency=concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            base_url=base_url,
+            checkpoint=checkpoint,
+        )
     else:
-        results = hf_attempt_ballmatro_dataset(ds["test"], model)
+        results = hf_attempt_ballmatro_dataset(ds["test"], model, batch_size=batch_size, checkpoint=checkpoint)
 
     # Format the results in a readable way
     results = results.asdict()
     # Save the results
     with open(output, "w") as f:
         json.dump(results, f, indent=4)
+    if store is not None:
+        ResultsStore(store).write(dataset, model.split("/")[-1], results)
 
 
 if __name__ == "__main__":
@@ -32,5 +43,12 @@ if __name__ == "__main__":
     parser.add_argument("dataset", type=str, help="Name of the dataset to test against. Must be the name of a partition of the BaLLMatro dataset in the Hugging Face Hub.")
     parser.add_argument("model", type=str, help="Name of the GPT model to use for testing.")
     parser.add_argument("output", type=str, help="File to save the benchmark results to (JSON format).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of concurrent requests to the OpenAI API.")
+    parser.add_argument("--rpm", type=int, default=None, help="Maximum requests per minute sent to the OpenAI API. Unlimited by default.")
+    parser.add_argument("--tpm", type=int, default=None, help="Maximum tokens per minute sent to the OpenAI API. Unlimited by default.")
+    parser.add_argument("--base_url", type=str, default=None, help="Base URL of an OpenAI compatible API to use instead of the OpenAI one.")
+    parser.add_argument("--batch_size", type=int, default=8, help="Number of examples generated at once by Hugging Face models.")
+    parser.add_argument("--checkpoint", type=str, default=None, help="JSONL file where each response is saved as soon as it is generated. If the file exists, the evaluation resumes from it, skipping the items already answered.")
+    parser.add_argument("--store", type=str, default=None, help="Directory of a results store where the results are also added, under the dataset name as level.")
     args = parser.parse_args()
-    main(args.dataset, args.model, args.output)
+    main(args.dataset, args.model, args.output, args.concurrency, args.rpm, args.tpm, args.base_url, args.batch_size, args.checkpoint, args.store)